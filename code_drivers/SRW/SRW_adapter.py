@@ -1,14 +1,56 @@
 """
 Wrapper for glossary objects to SRW objects.
+
+The translations of electron beams and magnetic structures are cached (least recently used) by the adapter, keyed by
+the parameters of the glossary object. Changing a parameter changes the key, i.e. the next call translates again.
+Cached SRW objects are shared between calls and must not be modified. SRW writes to the electron beam of a
+wavefront, therefore wavefronts get a copy of the cached electron beam.
 """
+from collections import OrderedDict
+from copy import deepcopy
+
+import numpy as np
 from srwlib import *
 
+from optics.beam.twiss import beam_moments
+from optics.magnetic_structures.magnetic_field_map import CUBIC
+
 class SRWAdapter:
+    def __init__(self, cache_size=32):
+        """
+        Constructor.
+        :param cache_size: Number of translations kept in the cache.
+        """
+        self._cache_size = cache_size
+        self._cache = OrderedDict()
+
+    def _parameters(self, glossary_object):
+        return (type(glossary_object).__name__,) + \
+               tuple((key, value[0]) for key, value in glossary_object.to_dictionary().items())
+
+    def _cached(self, key, translate):
+        if key in self._cache:
+            self._cache[key] = self._cache.pop(key)
+            return self._cache[key]
+
+        translation = translate()
+        self._cache[key] = translation
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+        return translation
+
+    def clear_cache(self):
+        self._cache.clear()
 
     def SRW_electron_beam(self, electron_beam):
         """
-        Translate generic electron beam to srw "electron beam".
+        Translate generic electron beam to srw "electron beam". Cached.
         """
+        return self._cached(("electron_beam", self._parameters(electron_beam)),
+                            lambda: self._translate_electron_beam(electron_beam))
+
+    def _translate_electron_beam(self, electron_beam):
         srw_electron_beam = SRWLPartBeam()
         srw_electron_beam.Iavg = electron_beam._current
         srw_electron_beam.partStatMom1.x = 0.0
@@ -20,12 +62,13 @@ class SRWAdapter:
         srw_electron_beam.partStatMom1.gamma = electron_beam.gamma()
 
         #2nd order statistical moments:
-        srw_electron_beam.arStatMom2[0] = electron_beam._moment_xx   # <(x-x0)^2> [m^2]
-        srw_electron_beam.arStatMom2[1] = electron_beam._moment_xxp  # <(x-x0)*(x'-x'0)> [m]
-        srw_electron_beam.arStatMom2[2] = electron_beam._moment_xpxp # <(x'-x'0)^2>
-        srw_electron_beam.arStatMom2[3] = electron_beam._moment_yy   #<(y-y0)^2>
-        srw_electron_beam.arStatMom2[4] = electron_beam._moment_yyp  #<(y-y0)*(y'-y'0)> [m]
-        srw_electron_beam.arStatMom2[5] = electron_beam._moment_ypyp #<(y'-y'0)^2>
+        moments_x, moments_y = beam_moments(electron_beam)
+        srw_electron_beam.arStatMom2[0] = float(moments_x[0]) # <(x-x0)^2> [m^2]
+        srw_electron_beam.arStatMom2[1] = float(moments_x[1]) # <(x-x0)*(x'-x'0)> [m]
+        srw_electron_beam.arStatMom2[2] = float(moments_x[2]) # <(x'-x'0)^2>
+        srw_electron_beam.arStatMom2[3] = float(moments_y[0]) #<(y-y0)^2>
+        srw_electron_beam.arStatMom2[4] = float(moments_y[1]) #<(y-y0)*(y'-y'0)> [m]
+        srw_electron_beam.arStatMom2[5] = float(moments_y[2]) #<(y'-y'0)^2>
         srw_electron_beam.arStatMom2[10] = electron_beam._energy_spread**2 #<(E-E0)^2>/E0^2
 
         return srw_electron_beam
@@ -52,8 +95,12 @@ class SRWAdapter:
 
     def magnetic_field_from_undulator(self, undulator):
         """
-        Generate srw magnetic fields.
+        Generate srw magnetic fields. Cached.
         """
+        return self._cached(("undulator", self._parameters(undulator)),
+                            lambda: self._magnetic_field_from_undulator(undulator))
+
+    def _magnetic_field_from_undulator(self, undulator):
         srw_undulator = self.SRW_undulator(undulator)
 
         magnetic_fields = SRWLMagFldC([srw_undulator],
@@ -76,8 +123,12 @@ class SRWAdapter:
 
     def magnetic_field_from_bending_magnet(self, bending_magnet):
         """
-        Generate srw magnetic fields.
+        Generate srw magnetic fields. Cached.
         """
+        return self._cached(("bending_magnet", self._parameters(bending_magnet)),
+                            lambda: self._magnetic_field_from_bending_magnet(bending_magnet))
+
+    def _magnetic_field_from_bending_magnet(self, bending_magnet):
         srw_bending_magnet = self.SRW_bending_magnet(bending_magnet)
 
         magnetic_fields = SRWLMagFldC([srw_bending_magnet],
@@ -85,15 +136,98 @@ class SRWAdapter:
 
         return magnetic_fields
 
+    def SRW_magnetic_field_map(self, magnetic_field_map, x_range=None, y_range=None):
+        """
+        Translate generic magnetic field map to srw "arbitrary 3D magnetic field".
+        If a transverse window is given only the slab of the table within it is read and passed to SRW.
+        """
+        if x_range is not None and y_range is not None:
+            magnetic_field_map = magnetic_field_map.slab(x_range, y_range)
+
+        field_table = magnetic_field_map.field_table()
+        x = magnetic_field_map.x()
+        y = magnetic_field_map.y()
+        z = magnetic_field_map.z()
+
+        # SRW expects x running fastest and z slowest, i.e. the order of the table.
+        srw_field_map = SRWLMagFld3D(_arBx=array('d', np.ravel(field_table[..., 0])),
+                                     _arBy=array('d', np.ravel(field_table[..., 1])),
+                                     _arBz=array('d', np.ravel(field_table[..., 2])),
+                                     _nx=len(x), _ny=len(y), _nz=len(z),
+                                     _rx=x[-1] - x[0], _ry=y[-1] - y[0], _rz=z[-1] - z[0],
+                                     _nRep=1,
+                                     _interp=3 if magnetic_field_map.interpolation() == CUBIC else 1)
+
+        return srw_field_map, magnetic_field_map.center()
+
+    def magnetic_field_from_magnetic_field_map(self, magnetic_field_map, x_range=None, y_range=None):
+        """
+        Generate srw magnetic fields. Cached.
+        Maps with equal meshes may hold different tables, so the key contains the identity of the table. The cache
+        entry keeps the map alive such that the identity is not reused.
+        """
+        key = ("magnetic_field_map", self._parameters(magnetic_field_map), id(magnetic_field_map.field_table()),
+               None if x_range is None else tuple(x_range), None if y_range is None else tuple(y_range))
+
+        return self._cached(key, lambda: (magnetic_field_map,
+                                          self._magnetic_field_from_magnetic_field_map(magnetic_field_map,
+                                                                                       x_range, y_range)))[1]
+
+    def _magnetic_field_from_magnetic_field_map(self, magnetic_field_map, x_range, y_range):
+        srw_field_map, (x_center, y_center, z_center) = self.SRW_magnetic_field_map(magnetic_field_map,
+                                                                                   x_range, y_range)
+
+        magnetic_fields = SRWLMagFldC([srw_field_map],
+                                      array('d', [x_center]), array('d', [y_center]), array('d', [z_center]))
+
+        return magnetic_fields
+
+    def SRW_trajectory(self, electron_beam, magnetic_fields, ct_start, ct_end, number_of_points):
+        """
+        Trajectory of the reference electron, calculated with CalcPartTraj. Cached.
+        The electron starts on axis at z = 0 like the srw "electron beam" and is integrated in both directions from
+        there. The trajectory does not depend on the observation mesh or the photon energy, so CalcElecFieldSR can
+        reuse it for every screen and energy.
+        :param electron_beam: ElectronBeam object.
+        :param magnetic_fields: SRWLMagFldC, typically a cached translation of this adapter.
+        :param ct_start: Start of the trajectory in m (c t relative to z = 0).
+        :param ct_end: End of the trajectory in m.
+        :param number_of_points: Number of trajectory points.
+        :return: SRWLPrtTrj.
+        """
+        # The cached field translations are shared objects, so their identity identifies the field.
+        key = ("trajectory", self._parameters(electron_beam), id(magnetic_fields), ct_start, ct_end, number_of_points)
+
+        return self._cached(key, lambda: (magnetic_fields,
+                                          self._trajectory(electron_beam, magnetic_fields, ct_start, ct_end,
+                                                           number_of_points)))[1]
+
+    def _trajectory(self, electron_beam, magnetic_fields, ct_start, ct_end, number_of_points):
+        srw_trajectory = SRWLPrtTrj()
+        srw_trajectory.partInitCond = SRWLParticle()
+        srw_trajectory.partInitCond.z = 0.0
+        srw_trajectory.partInitCond.gamma = electron_beam.gamma()
+        srw_trajectory.allocate(int(number_of_points), True)
+        srw_trajectory.ctStart = float(ct_start)
+        srw_trajectory.ctEnd = float(ct_end)
+
+        srwl.CalcPartTraj(srw_trajectory, magnetic_fields, [1])
+
+        return srw_trajectory
+
     def create_rectangular_SRW_wavefront(self, grid_size, grid_length_vertical, grid_length_horizontal,
-                                      z_start, srw_electron_beam, energy_min, energy_max):
+                                      z_start, srw_electron_beam, energy_min, energy_max, wavefront_pool=None):
         """
         Generates a rectangular srw wavefront.
+        If a SRWWavefrontPool is given the wavefront is taken from the pool instead of being allocated.
+        The wavefront gets its own copy of srw_electron_beam, which may be a cached translation.
         """
-        srw_wavefront = SRWLWfr()
-
+        if wavefront_pool is None:
+            srw_wavefront = SRWLWfr()
+            srw_wavefront.allocate(1, grid_size, grid_size)
+        else:
+            srw_wavefront = wavefront_pool.acquire(1, grid_size, grid_size)
 
-        srw_wavefront.allocate(1, grid_size, grid_size)
         srw_wavefront.mesh.zStart = float(z_start)
         srw_wavefront.mesh.eStart = energy_min
         srw_wavefront.mesh.eFin   = energy_max
@@ -102,12 +236,14 @@ class SRWAdapter:
         srw_wavefront.mesh.yStart = -grid_length_horizontal
         srw_wavefront.mesh.yFin   =  grid_length_horizontal
 
-        srw_wavefront.partBeam = srw_electron_beam
+        srw_wavefront.partBeam = deepcopy(srw_electron_beam)
 
         return srw_wavefront
 
-    def create_quadratic_SRW_wavefront_single_energy(self, grid_size, grid_length, z_start, srw_electron_beam, energy):
+    def create_quadratic_SRW_wavefront_single_energy(self, grid_size, grid_length, z_start, srw_electron_beam, energy,
+                                                     wavefront_pool=None):
         """
         Generates a quadratic srw wavefront.
         """
-        return self.createRectangularSRWWavefrontSingleEnergy(grid_size, grid_length, grid_length, z_start, srw_electron_beam, energy, energy)
+        return self.create_rectangular_SRW_wavefront(grid_size, grid_length, grid_length, z_start, srw_electron_beam,
+                                                     energy, energy, wavefront_pool)
@@ -19,6 +19,8 @@ class SRWBendingMagnetSetting(SRWDriverSetting):
         self._useTermin   = 1           #Use "terminating terms" (i.e. asymptotic expansions at zStartInteg and zEndInteg) or not (1 or 0 respectively)
         self._sampFactNxNyForProp = 0.7 #sampling factor for adjusting nx, ny (effective if > 0)
 
+        self._use_precomputed_trajectory = True #Reuse the trajectory from CalcPartTraj for methods 1 and 2
+
         # TODO: check meaningfulness of these default values
         self._horizontal_acceptance_angle = 0.1
         self._vertical_acceptance_angle   = 0.01
@@ -55,6 +57,12 @@ class SRWBendingMagnetSetting(SRWDriverSetting):
     def set_sampFactNxNyForProp(self, sampFactNxNyForProp):
         self._sampFactNxNyForProp = sampFactNxNyForProp
 
+    def set_use_precomputed_trajectory(self, use_precomputed_trajectory):
+        self._use_precomputed_trajectory = use_precomputed_trajectory
+
+    def use_precomputed_trajectory(self):
+        return self._use_precomputed_trajectory
+
     def set_acceptance_angle(self, horizontal_angle, vertical_angle):
         self._horizontal_acceptance_angle = horizontal_angle
         self._vertical_acceptance_angle   = vertical_angle
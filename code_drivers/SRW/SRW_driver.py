@@ -8,8 +8,6 @@ from srwlib import *
 
 from optics.driver.abstract_driver import AbstractDriver
 
-from optics.beam.electron_beam_pencil import ElectronBeamPencil
-
 from optics.magnetic_structures.undulator import Undulator
 from optics.magnetic_structures.bending_magnet import BendingMagnet
 
@@ -17,11 +15,31 @@ from optics.beamline.optical_elements.lens.lens_ideal import LensIdeal
 from optics.beamline.optical_elements.image_plane import ImagePlane
 
 from code_drivers.SRW.SRW_adapter import SRWAdapter
+from code_drivers.SRW.SRW_result import SRWResult, SRWInputSnapshot, SRWMeshDescription, SRWPropagationSnapshot, SRWWavefrontSummary
 from code_drivers.SRW.SRW_undulator_setting import SRWUndulatorSetting
 from code_drivers.SRW.SRW_bending_magnet_setting import SRWBendingMagnetSetting
 from code_drivers.SRW.SRW_beamline_component_setting import SRWBeamlineComponentSetting
 
 class SRWDriver(AbstractDriver):
+    def __init__(self):
+        self._wavefront_pool = None
+
+        # Keeps the translations of electron beams and magnetic structures across calculations.
+        self._srw_adapter = SRWAdapter()
+
+    def set_wavefront_pool(self, wavefront_pool):
+        """
+        Sets a SRWWavefrontPool to take wavefronts from instead of allocating them for every calculation.
+        Wavefronts go back to the pool when the returned SRWResult is released.
+        :param wavefront_pool: SRWWavefrontPool or None to disable pooling.
+        """
+        self._wavefront_pool = wavefront_pool
+
+    def wavefront_pool(self):
+        return self._wavefront_pool
+
+    def srw_adapter(self):
+        return self._srw_adapter
 
     def calculate_radiation(self, electron_beam, magnetic_structure, beamline, energy_min, energy_max):
         """
@@ -32,14 +50,119 @@ class SRWDriver(AbstractDriver):
         :param beamline: beamline object
         :param energy_min: Minimal energy for the calculation
         :param energy_max: Maximal energy for the calculation
-        :return: SRW wavefront.
+        :return: SRWResult wrapping the SRW wavefront.
+        """
+        # Translated first: the beamline settings are taken as they are at the start of the run.
+        srw_beamline_sections = self._translate_beamline(beamline)
+
+        wavefront = self.calculate_source_wavefront(electron_beam, magnetic_structure, beamline, energy_min, energy_max)
+
+        self._propagate_sections(wavefront, srw_beamline_sections)
+
+        # Wrap the wavefront together with a snapshot of the inputs. Nothing is copied here.
+        input_snapshot = SRWInputSnapshot.from_inputs(electron_beam, magnetic_structure, energy_min, energy_max)
+
+        return SRWResult(wavefront, input_snapshot, self._wavefront_pool)
+
+    def propagate(self, wavefront, beamline):
+        """
+        Propagates a wavefront through the beamline.
+        Free space between two components is propagated with the drift space settings of the downstream component.
+        :param wavefront: Native SRWLWfr upstream of the beamline components, e.g. from calculate_source_wavefront.
+                          It is propagated in place.
+        :param beamline: beamline object
+        :return: The propagated SRWLWfr.
+        """
+        return self._propagate_sections(wavefront, self._translate_beamline(beamline))
+
+    def _propagate_sections(self, wavefront, srw_beamline_sections):
+        # Create the srw beamline object.
+        srw_optical_element = list()
+        srw_preferences = list()
+        for component, position, srw_component_elements, srw_component_preferences in srw_beamline_sections:
+            srw_optical_element.extend(srw_component_elements)
+            srw_preferences.extend(srw_component_preferences)
+
+        srw_beamline = SRWLOptC(srw_optical_element,
+                                srw_preferences)
+
+        # Call SRW to perform propagation.
+        print("SRW_driver calls PropagElecField...")
+        t0 = time.time()
+        srwl.PropagElecField(wavefront, srw_beamline)
+        print("done in ",round(time.time() - t0), "s")
+
+        return wavefront
+
+    def calculate_radiation_by_component(self, electron_beam, magnetic_structure, beamline, energy_min, energy_max,
+                                         intensity_sampling=0):
+        """
+        Calculates radiation like calculate_radiation but propagates the wavefront component by component.
+        After every beamline component a snapshot is yielded, i.e. intermediate planes can be monitored and the
+        calculation can be stopped early by not consuming the generator further. The last item is the SRWResult.
+        If the generator is closed or fails before the result is yielded, a pooled wavefront is given back to the pool.
+        The propagation itself costs the same as in calculate_radiation: every srw element is propagated exactly once.
+
+        :param electron_beam: ElectronBeam object
+        :param magnetic_structure: Source object
+        :param beamline: beamline object
+        :param energy_min: Minimal energy for the calculation
+        :param energy_max: Maximal energy for the calculation
+        :param intensity_sampling: If > 0 every intensity_sampling-th mesh point of the intensity is added to the
+                                   snapshots. If 0 no intensity is calculated.
+        :return: Generator of one SRWPropagationSnapshot per beamline component, followed by the SRWResult of the full
+                 propagation.
+        """
+        srw_beamline_sections = self._translate_beamline(beamline)
+
+        input_snapshot = SRWInputSnapshot.from_inputs(electron_beam, magnetic_structure, energy_min, energy_max)
+        wavefront = self.calculate_source_wavefront(electron_beam, magnetic_structure, beamline, energy_min, energy_max)
+
+        handed_out = False
+        try:
+            for component, position, srw_component_elements, srw_component_preferences in srw_beamline_sections:
+                srw_beamline = SRWLOptC(srw_component_elements,
+                                        srw_component_preferences)
+                srwl.PropagElecField(wavefront, srw_beamline)
+
+                mesh = SRWMeshDescription.from_srw_mesh(wavefront.mesh)
+
+                if intensity_sampling > 0:
+                    intensity = self._intensity(wavefront, mesh, input_snapshot.is_pencil_beam)
+                    intensity = intensity[::intensity_sampling, ::intensity_sampling]
+                else:
+                    intensity = None
+
+                yield SRWPropagationSnapshot(component_name=component.name(),
+                                             position=position,
+                                             summary=SRWWavefrontSummary(mesh=mesh, intensity=intensity))
+
+            result = SRWResult(wavefront, input_snapshot, self._wavefront_pool)
+            handed_out = True
+            yield result
+        finally:
+            # Stopped early or failed: nobody holds the wavefront anymore.
+            if not handed_out and self._wavefront_pool is not None:
+                self._wavefront_pool.release(wavefront)
+
+    def calculate_source_wavefront(self, electron_beam, magnetic_structure, beamline, energy_min, energy_max):
+        """
+        Calculates the wavefront emitted by the source at the position of the first beamline component.
+        The wavefront is not propagated through the beamline.
+
+        :param electron_beam: ElectronBeam object
+        :param magnetic_structure: Source object
+        :param beamline: beamline object
+        :param energy_min: Minimal energy for the calculation
+        :param energy_max: Maximal energy for the calculation
+        :return: Native SRWLWfr.
         """
         # Get position of the first component. We need this to know where to calculate the source radiation.
         first_component = beamline.component_by_index(0)
         position_first_component = beamline.position_of(first_component)
 
-        # Instanciate an adapter.
-        srw_adapter = SRWAdapter()
+        # The driver's adapter reuses translations of unchanged electron beams and magnetic structures.
+        srw_adapter = self._srw_adapter
 
         # Create srw electron beam from generic electron beam.
         srw_electron_beam = srw_adapter.SRW_electron_beam(electron_beam)
@@ -60,27 +183,24 @@ class SRWDriver(AbstractDriver):
                                                                             grid_length=grid_length,
                                                                             z_start=z_start,
                                                                             srw_electron_beam=srw_electron_beam,
-                                                                            energy=int(undulator.resonanceEnergy(electron_beam.gamma(),0.0,0.0)))
+                                                                            energy=int(undulator.resonanceEnergy(electron_beam.gamma(),0.0,0.0)),
+                                                                            wavefront_pool=self._wavefront_pool)
 
             # Use custom settings if present. Otherwise use default SRW settings.
-            if undulator.has_settings(self):
-                # Mind the self in the next line.
-                # It tells the DriverSettingsManager to use SRW settings.
-                undulator_settings = undulator.settings(self)
-            else:
-                undulator_settings = SRWUndulatorSetting()
+            undulator_settings = self._settings_snapshot(undulator, SRWUndulatorSetting)
             print("SRW_driver.calculate_radiation calls CalcElecFieldSR (undulator)...")
             t0 = time.time()
-            srwl.CalcElecFieldSR(wavefront, 0, srw_undulator, undulator_settings.toList())
+            # Field terminations of the srw undulator extend beyond its length.
+            trajectory = self._precomputed_trajectory(electron_beam, srw_undulator, undulator_settings,
+                                                      undulator_settings.toList(),
+                                                      0.5 * undulator.length() + 10 * undulator.periodLength())
+            srwl.CalcElecFieldSR(wavefront, trajectory, srw_undulator, undulator_settings.toList())
             print("done in ",round(time.time() - t0), "s")
         elif isinstance(magnetic_structure, BendingMagnet):
             bending_magnet = magnetic_structure
 
             # Use custom settings if present. Otherwise use default SRW settings.
-            if bending_magnet.has_settings(self):
-                bending_magnet_settings = bending_magnet.settings(self)
-            else:
-                bending_magnet_settings = SRWBendingMagnetSetting()
+            bending_magnet_settings = self._settings_snapshot(bending_magnet, SRWBendingMagnetSetting)
 
             srw_bending_magnet = srw_adapter.magnetic_field_from_bending_magnet(bending_magnet)
 
@@ -103,44 +223,85 @@ class SRWDriver(AbstractDriver):
                                                                   z_start=z_start,
                                                                   srw_electron_beam=srw_electron_beam,
                                                                   energy_min=energy_min,
-                                                                  energy_max=energy_max)
+                                                                  energy_max=energy_max,
+                                                                  wavefront_pool=self._wavefront_pool)
 
             # Calculate initial wavefront.
             print("SRW_driver.calculate_radiation calls CalcElecFieldSR (bending magnet)...")
             t0 = time.time()
-            srwl.CalcElecFieldSR(wavefront, 0, srw_bending_magnet, bending_magnet_settings.to_list())
+            # The trajectory spans the magnet, beyond it SRW continues with terminating terms.
+            trajectory = self._precomputed_trajectory(electron_beam, srw_bending_magnet, bending_magnet_settings,
+                                                      bending_magnet_settings.to_list(), 0.5 * bending_magnet.length())
+            srwl.CalcElecFieldSR(wavefront, trajectory, srw_bending_magnet, bending_magnet_settings.to_list())
             print("done in ",round(time.time() - t0), "s")
         else:
             raise NotImplementedError
 
-        # Create the srw beamline.
-        srw_optical_element = list()
-        srw_preferences = list()
+        return wavefront
+
+    def _settings_snapshot(self, settings_manager, default_settings_class):
+        """
+        Snapshot of the SRW settings of a glossary object, or of default settings if it has none.
+        Mind the self: it tells the DriverSettingsManager to use SRW settings. Modifications of the settings after the
+        snapshot do not affect the run.
+        """
+        if settings_manager.has_settings(self):
+            return settings_manager.settings(self).snapshot()
+
+        return default_settings_class().snapshot()
+
+    def _precomputed_trajectory(self, electron_beam, srw_magnetic_fields, settings, precision_parameters,
+                                half_range):
+        """
+        Trajectory for CalcElecFieldSR from the adapter's cache, or 0 to let SRW calculate it.
+        Only the automatic methods (1 and 2) accept a precomputed trajectory.
+        :param half_range: Default half length of the trajectory around the source center in m. Integration limits
+                           of the settings take precedence.
+        """
+        method, _, z_start_integration, z_end_integration, number_of_points = precision_parameters[:5]
+
+        if not settings.use_precomputed_trajectory() or method not in (1, 2):
+            return 0
+
+        if z_start_integration < z_end_integration:
+            ct_start, ct_end = z_start_integration, z_end_integration
+        else:
+            ct_start, ct_end = -half_range, half_range
+
+        return self._srw_adapter.SRW_trajectory(electron_beam, srw_magnetic_fields, ct_start, ct_end,
+                                                number_of_points)
+
+    def _translate_beamline(self, beamline):
+        """
+        Translates the beamline into srw elements.
+        Free space between two components is translated to drift space that is attributed to the downstream component.
+        :return: List of (component, position, srw elements, srw propagation parameters) per beamline component.
+        """
+        srw_beamline_sections = list()
 
-        # Iterate over all beamline components and translate them.
-        # Translate free space between two components to drift space.
         # Only lenses implemented.
-        # In the real driver this should be refactored to separate functions.
-        current_z_position = position_first_component.z()
+        current_z_position = beamline.position_of(beamline.component_by_index(0)).z()
         for component in beamline:
             position = beamline.position_of(component)
 
+            srw_optical_element = list()
+            srw_preferences = list()
+
+            # Use custom settings if present. Otherwise use default SRW settings.
+            component_settings = self._settings_snapshot(component, SRWBeamlineComponentSetting)
+
             # Add drift space between two components.
             if position.z() > current_z_position:
                 distance = position.z()-current_z_position
                 srw_optical_element.append(SRWLOptD(distance))
 
-                if component.has_settings(self):
-                    component_settings = component.settings(self)
-
-                    if component_settings.has_drift_space_settings():
-                        drift_space_settings = component_settings._drift_space_settings
-                    else:
-                        # If there are no drift space settings use default settings.
-                        drift_space_settings = SRWBeamlineComponentSetting()
+                if component_settings.has_drift_space_settings():
+                    drift_space_settings = component_settings._drift_space_settings
+                else:
+                    # If there are no drift space settings use default settings.
+                    drift_space_settings = SRWBeamlineComponentSetting().snapshot()
 
-                    #TODO: check this, it was inside else
-                    srw_preferences.append(drift_space_settings.to_list())
+                srw_preferences.append(drift_space_settings.to_list())
                 current_z_position = position.z()
 
             if isinstance(component, LensIdeal):
@@ -152,66 +313,56 @@ class SRWDriver(AbstractDriver):
             else:
                 raise NotImplementedError
 
-            # Use custom settings if present. Otherwise use default SRW settings.
-            if component.has_settings(self):
-                # Mind the self in the next line.
-                # It tells the DriverSettingsManager to use SRW settings.
-                component_settings = component.settings(self)
-            else:
-                component_settings = SRWBeamlineComponentSetting()
-
             srw_preferences.append(component_settings.to_list())
 
-        # Create the srw beamline object.
-        srw_beamline = SRWLOptC(srw_optical_element,
-                                srw_preferences)
+            srw_beamline_sections.append((component, position, srw_optical_element, srw_preferences))
 
-        # Call SRW to perform propagation.
-        print("SRW_driver calls PropagElecField...")
+        return srw_beamline_sections
+
+    def calculate_intensity(self, radiation):
+        """
+        Calculates intensity of the radiation.
+        :param radiation: SRWResult received from self.calculate_radiation
+        :return: Intensity.
+        """
+        mesh = radiation.mesh()
+
+        print("SRW_driver.calculate_intensity calls CalcIntFromElecField...")
         t0 = time.time()
-        srwl.PropagElecField(wavefront, srw_beamline)
+        intensity = self._intensity(radiation.wavefront(), mesh, radiation.inputs().is_pencil_beam)
         print("done in ",round(time.time() - t0), "s")
 
+        dim_x = np.linspace(mesh.xStart, mesh.xFin, mesh.nx)
+        dim_y = np.linspace(mesh.yStart, mesh.yFin, mesh.ny)
 
-        # TODO: Decoration of SRW wavefront with glossary object. Consider to better use a "driver results" object.
-        wavefront._electron_beam = deepcopy(electron_beam)
-
-        return wavefront
+        return [intensity, dim_x, dim_y]
 
-    def calculate_intensity(self, radiation):
+    def _intensity(self, wavefront, mesh, is_pencil_beam):
         """
-        Calculates intensity of the radiation.
-        :param radiation: Object received from self.calculateRadiation
-        :return: Intensity.
+        Extracts the intensity of the wavefront.
+        :return: Intensity as (nx, ny) array.
         """
-        wavefront = radiation
-        mesh = deepcopy(wavefront.mesh)
         intensity = array('f', [0]*mesh.nx*mesh.ny)
 
-        if isinstance(radiation._electron_beam, ElectronBeamPencil):
+        if is_pencil_beam:
             intensity_method = 0
         else:
             intensity_method = 1
 
-        print("SRW_driver.calculate_intensity calls CalcIntFromElecField...")
-        t0 = time.time()
         srwl.CalcIntFromElecField(intensity, wavefront, 6, intensity_method, 3, mesh.eStart, 0, 0)
-        print("done in ",round(time.time() - t0), "s")
 
-        dim_x = np.linspace(mesh.xStart, mesh.xFin, mesh.nx)
-        dim_y = np.linspace(mesh.yStart, mesh.yFin, mesh.ny)
         intensity = np.array(intensity).reshape((mesh.ny,mesh.nx))
 
-        return [intensity.transpose(), dim_x, dim_y]
+        return intensity.transpose()
 
     def calculate_phase(self, radiation):
         """
         Calculates intensity of the radiation.
-        :param radiation: Object received from self.calculateRadiation
+        :param radiation: SRWResult received from self.calculate_radiation
         :return: Phases.
         """
-        wavefront = radiation
-        mesh = deepcopy(wavefront.mesh)
+        wavefront = radiation.wavefront()
+        mesh = radiation.mesh()
 
         phase = array('d', [0]*mesh.nx*mesh.ny)
         print("SRW_driver.calculate_phase calls CalcIntFromElecField...")
@@ -1,7 +1,7 @@
 from optics.driver.abstract_driver_setting import AbstractDriverSetting
 
 class SRWDriverSetting(AbstractDriverSetting):
+    _driver_path = "code_drivers.SRW.SRW_driver.SRWDriver"
+
     def __init__(self):
-        from code_drivers.SRW.SRW_driver import SRWDriver
-        AbstractDriverSetting.__init__(self,
-                                       driver=SRWDriver())
+        AbstractDriverSetting.__init__(self)
@@ -0,0 +1,106 @@
+"""
+Implements the SRW driver result.
+
+Wraps the native SRW wavefront without copying it. Next to the wavefront it keeps an immutable, hashable snapshot
+of the inputs the wavefront was calculated from and a frozen description of the wavefront mesh.
+Both are plain tuples: cheap to build, cheap to compare and cheap to pickle, unlike deep copies of the
+glossary objects or of the native SRWLRadMesh.
+"""
+from collections import namedtuple
+
+from optics.beam.electron_beam_pencil import ElectronBeamPencil
+from optics.driver.abstract_driver_result import AbstractDriverResult
+
+
+class SRWMeshDescription(namedtuple("SRWMeshDescription", ["eStart", "eFin", "ne",
+                                                           "xStart", "xFin", "nx",
+                                                           "yStart", "yFin", "ny",
+                                                           "zStart"])):
+    """
+    Frozen description of a SRWLRadMesh. Field names follow SRW, i.e. it can be used where a mesh is only read.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_srw_mesh(cls, srw_mesh):
+        return cls(srw_mesh.eStart, srw_mesh.eFin, srw_mesh.ne,
+                   srw_mesh.xStart, srw_mesh.xFin, srw_mesh.nx,
+                   srw_mesh.yStart, srw_mesh.yFin, srw_mesh.ny,
+                   srw_mesh.zStart)
+
+
+class SRWInputSnapshot(namedtuple("SRWInputSnapshot", ["electron_beam", "is_pencil_beam",
+                                                       "magnetic_structure",
+                                                       "energy_min", "energy_max"])):
+    """
+    Immutable snapshot of the glossary inputs of a SRW calculation.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_inputs(cls, electron_beam, magnetic_structure, energy_min, energy_max):
+        """
+        Takes the snapshot.
+        :param electron_beam: ElectronBeam object
+        :param magnetic_structure: Source object
+        :param energy_min: Minimal energy for the calculation
+        :param energy_max: Maximal energy for the calculation
+        :return: SRWInputSnapshot.
+        """
+        return cls(electron_beam=_dictionary_values(electron_beam),
+                   is_pencil_beam=isinstance(electron_beam, ElectronBeamPencil),
+                   magnetic_structure=(type(magnetic_structure).__name__,) + _dictionary_values(magnetic_structure),
+                   energy_min=energy_min,
+                   energy_max=energy_max)
+
+
+#: Wavefront summary of a component by component propagation. intensity is downsampled or None.
+SRWWavefrontSummary = namedtuple("SRWWavefrontSummary", ["mesh", "intensity"])
+
+#: Snapshot yielded after every beamline component of a component by component propagation.
+SRWPropagationSnapshot = namedtuple("SRWPropagationSnapshot", ["component_name", "position", "summary"])
+
+
+def _dictionary_values(glossary_object):
+    return tuple((name, value[0]) for name, value in glossary_object.to_dictionary().items())
+
+
+class SRWResult(AbstractDriverResult):
+    def __init__(self, wavefront, input_snapshot, wavefront_pool=None):
+        """
+        Constructor.
+        :param wavefront: Native SRWLWfr. It is referenced, not copied.
+        :param input_snapshot: SRWInputSnapshot of the calculation inputs.
+        :param wavefront_pool: SRWWavefrontPool the wavefront was taken from, if any.
+        """
+        AbstractDriverResult.__init__(self)
+
+        self._wavefront = wavefront
+        self._input_snapshot = input_snapshot
+        self._mesh = SRWMeshDescription.from_srw_mesh(wavefront.mesh)
+        self._wavefront_pool = wavefront_pool
+
+    def wavefront(self):
+        if self._wavefront is None:
+            raise Exception("The wavefront of this result has already been released.")
+
+        return self._wavefront
+
+    def release(self):
+        """
+        Releases the wavefront. If it was taken from a pool it is given back for reuse.
+        Afterwards neither the wavefront nor arrays obtained from it must be used anymore.
+        """
+        if self._wavefront_pool is not None and self._wavefront is not None:
+            self._wavefront_pool.release(self._wavefront)
+
+        self._wavefront = None
+
+    def inputs(self):
+        return self._input_snapshot
+
+    def mesh(self):
+        """
+        :return: SRWMeshDescription of the wavefront mesh at the time the result was created.
+        """
+        return self._mesh
@@ -18,6 +18,8 @@ class SRWUndulatorSetting(SRWDriverSetting):
         self._useTermin   = 1         #Use "terminating terms" (i.e. asymptotic expansions at zStartInteg and zEndInteg) or not (1 or 0 respectively)
         self._sampFactNxNyForProp = 2 #sampling factor for adjusting nx, ny (effective if > 0)
 
+        self._use_precomputed_trajectory = True #Reuse the trajectory from CalcPartTraj for methods 1 and 2
+
     def toList(self):
         precision_parameter = [self._meth,
                                self._relPrec,
@@ -28,3 +30,9 @@ class SRWUndulatorSetting(SRWDriverSetting):
                                self._sampFactNxNyForProp]
 
         return precision_parameter
+
+    def set_use_precomputed_trajectory(self, use_precomputed_trajectory):
+        self._use_precomputed_trajectory = use_precomputed_trajectory
+
+    def use_precomputed_trajectory(self):
+        return self._use_precomputed_trajectory
@@ -0,0 +1,115 @@
+"""
+Pool of pre-allocated SRW wavefronts.
+
+Allocating a SRWLWfr for a large mesh costs tens of MB per calculation that become garbage right afterwards.
+In sweeps and multi-electron loops the same mesh dimensions are requested over and over again.
+The pool hands out wavefronts keyed by (ne, nx, ny), resets them in place and takes them back once the caller
+released the result.
+
+Note that SRW may resize a wavefront during propagation. A released wavefront is therefore stored under the
+dimensions it has at release time.
+"""
+import threading
+from array import array
+
+from srwlib import SRWLWfr, SRWLPartBeam
+
+
+class SRWWavefrontPool(object):
+    def __init__(self, max_wavefronts_per_key=4):
+        """
+        Constructor.
+        :param max_wavefronts_per_key: Maximal number of idle wavefronts kept for the same (ne, nx, ny).
+                                       Wavefronts released beyond this number are left to the garbage collector.
+        """
+        self._max_wavefronts_per_key = max_wavefronts_per_key
+        self._idle_wavefronts = {}
+        self._zeros = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, ne, nx, ny):
+        """
+        Hands out a wavefront. It is reused from the pool if possible and newly allocated otherwise.
+        :param ne: Number of energy points.
+        :param nx: Number of horizontal points.
+        :param ny: Number of vertical points.
+        :return: SRWLWfr with the given dimensions and zeroed electric fields.
+        """
+        key = (ne, nx, ny)
+
+        with self._lock:
+            idle_wavefronts = self._idle_wavefronts.get(key)
+            wavefront = idle_wavefronts.pop() if idle_wavefronts else None
+
+        if wavefront is None:
+            wavefront = SRWLWfr()
+            wavefront.allocate(ne, nx, ny)
+        else:
+            self._reset(wavefront)
+
+        return wavefront
+
+    def release(self, wavefront):
+        """
+        Gives a wavefront back to the pool. The caller must not use it afterwards.
+        :param wavefront: SRWLWfr obtained from acquire.
+        """
+        key = self._key(wavefront)
+
+        with self._lock:
+            idle_wavefronts = self._idle_wavefronts.setdefault(key, [])
+            if len(idle_wavefronts) < self._max_wavefronts_per_key:
+                idle_wavefronts.append(wavefront)
+
+    def idle_count(self, ne=None, nx=None, ny=None):
+        """
+        :return: Number of idle wavefronts, either in total or for the given dimensions.
+        """
+        with self._lock:
+            if ne is None:
+                return sum(len(idle_wavefronts) for idle_wavefronts in self._idle_wavefronts.values())
+
+            return len(self._idle_wavefronts.get((ne, nx, ny), []))
+
+    def clear(self):
+        """
+        Drops all idle wavefronts.
+        """
+        with self._lock:
+            self._idle_wavefronts.clear()
+            self._zeros.clear()
+
+    def _key(self, wavefront):
+        return (wavefront.mesh.ne, wavefront.mesh.nx, wavefront.mesh.ny)
+
+    def _zeros_like(self, srw_array):
+        # Slice assignment from a cached zero array of the same type and length is a plain memory copy.
+        key = (srw_array.typecode, len(srw_array))
+        zeros = self._zeros.get(key)
+
+        if zeros is None:
+            zeros = array(srw_array.typecode, [0]) * len(srw_array)
+            self._zeros[key] = zeros
+
+        return zeros
+
+    def _reset(self, wavefront):
+        """
+        Resets a wavefront in place to the state of a freshly allocated one.
+        """
+        for srw_array in (wavefront.arEx, wavefront.arEy,
+                          wavefront.arMomX, wavefront.arMomY,
+                          wavefront.arElecPropMatr, wavefront.arWfrAuxData):
+            srw_array[:] = self._zeros_like(srw_array)
+
+        wavefront.Rx = 0
+        wavefront.Ry = 0
+        wavefront.dRx = 0
+        wavefront.dRy = 0
+        wavefront.xc = 0
+        wavefront.yc = 0
+        wavefront.avgPhotEn = 0
+        wavefront.presCA = 0
+        wavefront.presFT = 0
+        wavefront.unitElFld = 1
+        wavefront.partBeam = SRWLPartBeam()
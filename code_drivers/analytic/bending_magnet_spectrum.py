@@ -0,0 +1,200 @@
+"""
+Analytic spectrum and vertical angular distribution of bending magnet radiation.
+
+With y = E/E_c, the critical energy E_c = 3/2 hbar c gamma^3 / rho and X = gamma psi (J. D. Jackson, Classical
+Electrodynamics, section 14.6; X-ray Data Booklet, section 2.2):
+
+    flux integrated over psi  d2F/(dtheta dE/E) = sqrt(3)/(2 pi) alpha gamma 1e-3 I/e G1(y),  G1(y) = y int_y^inf K_5/3
+    angular distribution      d3F/(dtheta dpsi dE/E) = 3 alpha/(4 pi^2) gamma^2 1e-3 I/e y^2 (1 + X^2)^2
+                                                       [K_2/3(xi)^2 + X^2/(1 + X^2) K_1/3(xi)^2],  xi = y/2 (1 + X^2)^(3/2)
+
+The first term in brackets is the sigma (horizontal), the second the pi (vertical) polarization. Flux is given in
+photons/s/0.1%bw per mrad of horizontal angle (and per mrad of vertical angle).
+
+K_1/3, K_2/3 and G1 are taken from lookup tables that are calculated once per process and interpolated in log-log
+space, i.e. grids of many thousands of (energy, psi) points take well below a millisecond.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import numpy as np
+import scipy.constants.codata
+from scipy.special import kv
+
+codata = scipy.constants.codata.physical_constants
+_FINE_STRUCTURE_CONSTANT = codata["fine-structure constant"][0]
+_ELEMENTARY_CHARGE = codata["elementary charge"][0]
+_SPEED_OF_LIGHT = codata["speed of light in vacuum"][0]
+_PLANCK_CONSTANT = codata["Planck constant"][0]
+
+# Arguments covered by the lookup tables. Below the range the functions follow power laws and are extrapolated in
+# log-log space, above they are zero within double precision (K_nu(x) ~ exp(-x)).
+_TABLE_MIN = 1e-6
+_TABLE_MAX = 60.0
+_TABLE_POINTS = 4000
+
+_TABLES = None
+
+
+def _tables():
+    """
+    Lookup tables of log K_1/3, log K_2/3 and log G1 over log x. Calculated on first use.
+    The tables are filled before they are published with one assignment, i.e. threads calling concurrently see either
+    no tables or complete ones. At worst two threads calculate them both.
+    """
+    global _TABLES
+
+    if _TABLES is None:
+        log_x = np.linspace(np.log(_TABLE_MIN), np.log(_TABLE_MAX), _TABLE_POINTS)
+        x = np.exp(log_x)
+
+        # int_x^inf K_5/3(t) dt = int K_5/3(t) t dln(t) with the trapezoidal rule on a finer grid, up to t = 100.
+        log_t = np.linspace(np.log(_TABLE_MIN), np.log(100.0), 20 * _TABLE_POINTS)
+        integrand = kv(5.0/3.0, np.exp(log_t)) * np.exp(log_t)
+        steps = 0.5 * (integrand[1:] + integrand[:-1]) * np.diff(log_t)
+        tail_integral = np.concatenate((np.cumsum(steps[::-1])[::-1], [0.0]))
+
+        _TABLES = {"log_x": log_x,
+                   "K1/3": np.log(kv(1.0/3.0, x)),
+                   "K2/3": np.log(kv(2.0/3.0, x)),
+                   "G1": np.log(x * np.interp(log_x, log_t, tail_integral))}
+
+    return _TABLES
+
+
+def _interpolate(name, x):
+    tables = _tables()
+    log_x = tables["log_x"]
+    log_f = tables[name]
+
+    x = np.asarray(x, dtype=float)
+    log_argument = np.log(np.maximum(x, 1e-300))
+
+    values = np.exp(np.interp(log_argument, log_x, log_f))
+
+    # Power law below the table.
+    slope = (log_f[1] - log_f[0]) / (log_x[1] - log_x[0])
+    below = log_argument < log_x[0]
+    values = np.where(below, np.exp(log_f[0] + slope * (log_argument - log_x[0])), values)
+
+    return np.where(log_argument > log_x[-1], 0.0, values)
+
+
+def bessel_k13(x):
+    """
+    Modified Bessel function K_1/3 from the lookup table.
+    """
+    return _interpolate("K1/3", x)
+
+
+def bessel_k23(x):
+    """
+    Modified Bessel function K_2/3 from the lookup table.
+    """
+    return _interpolate("K2/3", x)
+
+
+def universal_function_G1(y):
+    """
+    Synchrotron universal function G1(y) = y int_y^inf K_5/3(t) dt from the lookup table.
+    """
+    return _interpolate("G1", y)
+
+
+class BendingMagnetSpectrum(object):
+    def __init__(self, electron_beam, bending_magnet):
+        """
+        Constructor.
+        :param electron_beam: ElectronBeam object.
+        :param bending_magnet: BendingMagnet object. Its radius defines the critical energy.
+        """
+        self._electron_beam = electron_beam
+        self._bending_magnet = bending_magnet
+
+    def gamma(self):
+        return self._electron_beam.gamma()
+
+    def critical_energy(self):
+        """
+        :return: Critical energy in eV.
+        """
+        gamma = self.gamma()
+        hbar = _PLANCK_CONSTANT / (2.0 * np.pi)
+
+        return 1.5 * hbar * _SPEED_OF_LIGHT * gamma**3 / self._bending_magnet.radius() / _ELEMENTARY_CHARGE
+
+    def _photons_per_second(self):
+        # Photons per second in 0.1% bandwidth per electron emitting coefficient, i.e. 1e-3 I/e.
+        return 1e-3 * self._electron_beam._current / _ELEMENTARY_CHARGE
+
+    def photon_flux(self, energies):
+        """
+        Flux integrated over the vertical angle.
+        :param energies: Photon energies in eV (array).
+        :return: Flux in photons/s/0.1%bw/mrad (horizontal), with the shape of energies.
+        """
+        y = np.asarray(energies, dtype=float) / self.critical_energy()
+
+        return np.sqrt(3.0) / (2.0 * np.pi) * _FINE_STRUCTURE_CONSTANT * self.gamma() * \
+               self._photons_per_second() * universal_function_G1(y) * 1e-3
+
+    def total_flux(self, energies):
+        """
+        Flux over the full horizontal divergence of the magnet.
+        :return: Flux in photons/s/0.1%bw with the shape of energies.
+        """
+        return self.photon_flux(energies) * self._bending_magnet.horizontal_divergence() * 1e3
+
+    def angular_distribution(self, energies, psi):
+        """
+        Flux per vertical angle on an (energy, psi) grid.
+        :param energies: 1D array of photon energies in eV.
+        :param psi: 1D array of vertical angles in rad.
+        :return: (sigma, pi) polarization components, arrays (n_energies, n_psi) in photons/s/0.1%bw/mrad^2.
+        """
+        y = np.asarray(energies, dtype=float)[:, np.newaxis] / self.critical_energy()
+        X2 = (self.gamma() * np.asarray(psi, dtype=float)[np.newaxis, :])**2
+
+        xi = 0.5 * y * (1.0 + X2)**1.5
+        factor = 3.0 * _FINE_STRUCTURE_CONSTANT / (4.0 * np.pi**2) * self.gamma()**2 * self._photons_per_second() * \
+                 y**2 * (1.0 + X2)**2 * 1e-6
+
+        sigma = factor * bessel_k23(xi)**2
+        pi = factor * X2 / (1.0 + X2) * bessel_k13(xi)**2
+
+        return sigma, pi
+
+    def sample(self, number_of_rays, energies, psi, random_state=None):
+        """
+        Samples photon energies and vertical angles from the analytic distribution, e.g. for ray tracing sources.
+        The flux per 0.1% bandwidth is converted to flux per energy interval. Within grid cells the samples are
+        distributed uniformly.
+        :param number_of_rays: Number of samples.
+        :param energies: 1D array of photon energies in eV, regular.
+        :param psi: 1D array of vertical angles in rad, regular.
+        :param random_state: numpy.random.RandomState or seed.
+        :return: (energy, psi, sigma_fraction) arrays of length number_of_rays. sigma_fraction is the share of the
+                 sigma polarization at the sampled grid point.
+        """
+        if not isinstance(random_state, np.random.RandomState):
+            random_state = np.random.RandomState(random_state)
+
+        energies = np.asarray(energies, dtype=float)
+        psi = np.asarray(psi, dtype=float)
+
+        sigma, pi = self.angular_distribution(energies, psi)
+        total = sigma + pi
+        probability = (total / energies[:, np.newaxis]).ravel()
+
+        cumulative = np.cumsum(probability)
+        index = np.searchsorted(cumulative, random_state.uniform(0.0, cumulative[-1], number_of_rays), side="right")
+        index = np.minimum(index, len(probability) - 1)
+        index_energy, index_psi = np.unravel_index(index, total.shape)
+
+        step_energy = energies[1] - energies[0] if len(energies) > 1 else 0.0
+        step_psi = psi[1] - psi[0] if len(psi) > 1 else 0.0
+
+        sampled_energy = energies[index_energy] + step_energy * random_state.uniform(-0.5, 0.5, number_of_rays)
+        sampled_psi = psi[index_psi] + step_psi * random_state.uniform(-0.5, 0.5, number_of_rays)
+        sigma_fraction = sigma[index_energy, index_psi] / np.where(total > 0.0, total, 1.0)[index_energy, index_psi]
+
+        return sampled_energy, sampled_psi, sigma_fraction
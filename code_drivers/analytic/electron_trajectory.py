@@ -0,0 +1,215 @@
+"""
+Vectorized electron trajectories in insertion devices and tabulated field maps.
+
+The equations of motion in a static magnetic field are integrated with the longitudinal position z as independent
+variable, for all electrons of an ensemble at once (fourth order Runge-Kutta with a fixed step):
+
+    dx/dz = beta_x/beta_z,  d(beta_x)/dz = -e/(gamma m c) (beta_y B_z - beta_z B_y)/beta_z
+    dy/dz = beta_y/beta_z,  d(beta_y)/dz = -e/(gamma m c) (beta_z B_x - beta_x B_z)/beta_z
+    d(ct)/dz = 1/beta_z
+
+Ensembles are sampled from the second moments and the energy spread of the ElectronBeam by ElectronBeamEnsemble,
+i.e. equal seeds give the same electrons as ElectronBeamEnsemble.from_electron_beam. Trajectories are cached
+(least recently used) by the integrator, keyed by the electron beam, the ensemble and the integration limits.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import scipy.constants.codata
+
+from optics.beam.electron_beam_ensemble import ElectronBeamEnsemble
+from optics.magnetic_structures.insertion_device import InsertionDevice
+from optics.magnetic_structures.magnetic_field_map import MagneticFieldMap
+
+codata = scipy.constants.codata.physical_constants
+_ELEMENTARY_CHARGE = codata["elementary charge"][0]
+_SPEED_OF_LIGHT = codata["speed of light in vacuum"][0]
+_ELECTRON_MASS = codata["electron mass"][0]
+
+ElectronTrajectory = namedtuple("ElectronTrajectory", ["z",       # (n_z,) m
+                                                       "x",       # (n_electrons, n_z) m
+                                                       "y",
+                                                       "beta_x",  # (n_electrons, n_z)
+                                                       "beta_y",
+                                                       "beta_z",
+                                                       "ct",      # (n_electrons, n_z) m, c times the time since z[0]
+                                                       "gamma"])  # (n_electrons,)
+
+
+class TrajectoryIntegrator(object):
+    def __init__(self, magnetic_structure, z_start=None, z_end=None, n_steps=None, cache_size=16):
+        """
+        Constructor.
+        :param magnetic_structure: InsertionDevice (ideal sinusoidal field, centered at z=0) or MagneticFieldMap.
+        :param z_start: Start of the integration in m. Defaults to one period before an insertion device or to the
+                        beginning of a field map.
+        :param z_end: End of the integration in m. Defaults symmetrically.
+        :param n_steps: Number of integration steps. Defaults to 50 per period of an insertion device or 2 per
+                        mesh step of a field map.
+        :param cache_size: Number of trajectories kept in the cache.
+        """
+        if isinstance(magnetic_structure, InsertionDevice):
+            half_length = 0.5 * magnetic_structure.length() + magnetic_structure.periodLength()
+            default_range = (-half_length, half_length)
+            default_steps = 50 * (magnetic_structure.periodNumber() + 2)
+        elif isinstance(magnetic_structure, MagneticFieldMap):
+            default_range = (magnetic_structure.z()[0], magnetic_structure.z()[-1])
+            default_steps = 2 * (len(magnetic_structure.z()) - 1)
+        else:
+            raise NotImplementedError
+
+        self._magnetic_structure = magnetic_structure
+        self._z_start = default_range[0] if z_start is None else z_start
+        self._z_end = default_range[1] if z_end is None else z_end
+        self._n_steps = default_steps if n_steps is None else n_steps
+
+        self._cache_size = cache_size
+        self._cache = OrderedDict()
+
+    def z(self):
+        return np.linspace(self._z_start, self._z_end, self._n_steps + 1)
+
+    def magnetic_field(self, x, y, z):
+        """
+        :return: (B_x, B_y, B_z) in T at the given positions.
+        """
+        magnetic_structure = self._magnetic_structure
+
+        if isinstance(magnetic_structure, MagneticFieldMap):
+            return magnetic_structure.field_at(x, y, z)
+
+        # Ideal field within the device as translated to SRW: vertical field symmetric, horizontal antisymmetric.
+        # Exactly at the device ends (within rounding) the field is half of its value inside. The default integration
+        # steps hit the ends, and the half field cancels the kicks of the steps before and after to first order.
+        half_length = 0.5 * magnetic_structure.length()
+        tolerance = 1e-9 * magnetic_structure.periodLength()
+        distance = np.abs(z)
+        inside = np.where(distance < half_length - tolerance, 1.0, np.where(distance <= half_length + tolerance, 0.5, 0.0))
+
+        phase = 2.0 * np.pi * z / magnetic_structure.periodLength()
+        zeros = np.zeros(np.broadcast(x, y, z).shape)
+
+        return (zeros + inside * magnetic_structure.B_horizontal() * np.sin(phase),
+                zeros + inside * magnetic_structure.B_vertical() * np.cos(phase),
+                zeros)
+
+    def reference_trajectory(self, electron_beam):
+        """
+        Trajectory of the ideal electron entering on axis with the nominal energy.
+        :return: ElectronTrajectory with one electron.
+        """
+        key = self._cache_key(electron_beam, "reference")
+        return self._cached(key, lambda: self.integrate(0.0, 0.0, 0.0, 0.0, np.array([electron_beam.gamma()])))
+
+    def ensemble_trajectory(self, electron_beam, n_electrons, seed=0):
+        """
+        Trajectories of an ensemble sampled from the electron beam moments.
+        The moments are taken at the center of the magnetic structure, i.e. the sampled electrons are drifted back
+        to z_start before the integration.
+        :param electron_beam: ElectronBeam object.
+        :param n_electrons: Number of electrons.
+        :param seed: Integer seed of the sampling, see ElectronBeamEnsemble.from_electron_beam.
+        :return: ElectronTrajectory with n_electrons electrons.
+        """
+        def calculate():
+            ensemble = ElectronBeamEnsemble.from_electron_beam(electron_beam, n_electrons, seed)
+            return self.integrate(ensemble.x() + ensemble.xp() * self._z_start_from_center(), ensemble.xp(),
+                                  ensemble.y() + ensemble.yp() * self._z_start_from_center(), ensemble.yp(),
+                                  ensemble.gamma())
+
+        return self._cached(self._cache_key(electron_beam, "ensemble", n_electrons, seed), calculate)
+
+    def _z_start_from_center(self):
+        if isinstance(self._magnetic_structure, MagneticFieldMap):
+            return self._z_start - self._magnetic_structure.center()[2]
+        return self._z_start
+
+    def _cache_key(self, electron_beam, *ensemble):
+        magnetic_structure = self._magnetic_structure
+        structure_key = tuple((key, value[0]) for key, value in magnetic_structure.to_dictionary().items())
+        if isinstance(magnetic_structure, MagneticFieldMap):
+            # Maps with equal meshes may hold different tables.
+            structure_key += (id(magnetic_structure.field_table()),)
+
+        beam_key = tuple((key, value[0]) for key, value in electron_beam.to_dictionary().items())
+
+        return (type(magnetic_structure).__name__, structure_key, beam_key, ensemble,
+                self._z_start, self._z_end, self._n_steps)
+
+    def _cached(self, key, calculate):
+        if key in self._cache:
+            self._cache[key] = self._cache.pop(key)
+            return self._cache[key]
+
+        trajectory = calculate()
+        self._cache[key] = trajectory
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+        return trajectory
+
+    def clear_cache(self):
+        self._cache.clear()
+
+    def integrate(self, x, xp, y, yp, gamma):
+        """
+        Integrates the trajectories of electrons starting at z_start. Not cached.
+        :param x: Horizontal positions at z_start in m.
+        :param xp: Horizontal angles at z_start in rad.
+        :param y: Vertical positions at z_start in m.
+        :param yp: Vertical angles at z_start in rad.
+        :param gamma: Lorentz factors. Defines the number of electrons; the other arguments broadcast against it.
+        :return: ElectronTrajectory. Its arrays are read-only since they may be shared through the cache.
+        """
+        gamma = np.array(gamma, dtype=float, ndmin=1)
+        n_electrons = len(gamma)
+
+        beta = np.sqrt(1.0 - 1.0 / gamma**2)
+        xp = np.broadcast_to(np.asarray(xp, dtype=float), gamma.shape)
+        yp = np.broadcast_to(np.asarray(yp, dtype=float), gamma.shape)
+        beta_z = beta / np.sqrt(1.0 + xp**2 + yp**2)
+
+        # State: x, y, beta_x, beta_y, ct.
+        state = np.array([np.broadcast_to(np.asarray(x, dtype=float), gamma.shape),
+                          np.broadcast_to(np.asarray(y, dtype=float), gamma.shape),
+                          xp * beta_z,
+                          yp * beta_z,
+                          np.zeros(n_electrons)])
+
+        z = self.z()
+        step = z[1] - z[0]
+        charge_factor = -_ELEMENTARY_CHARGE / (gamma * _ELECTRON_MASS * _SPEED_OF_LIGHT)
+        beta_squared = beta**2
+
+        def derivative(z_position, state):
+            x, y, beta_x, beta_y = state[0], state[1], state[2], state[3]
+            beta_z = np.sqrt(beta_squared - beta_x**2 - beta_y**2)
+            B_x, B_y, B_z = self.magnetic_field(x, y, z_position)
+
+            return np.array([beta_x / beta_z,
+                             beta_y / beta_z,
+                             charge_factor * (beta_y * B_z - beta_z * B_y) / beta_z,
+                             charge_factor * (beta_z * B_x - beta_x * B_z) / beta_z,
+                             1.0 / beta_z])
+
+        history = np.empty((len(z), 5, n_electrons))
+        history[0] = state
+        for i in range(len(z) - 1):
+            k1 = derivative(z[i], state)
+            k2 = derivative(z[i] + 0.5 * step, state + 0.5 * step * k1)
+            k3 = derivative(z[i] + 0.5 * step, state + 0.5 * step * k2)
+            k4 = derivative(z[i] + step, state + step * k3)
+            state = state + step / 6.0 * (k1 + 2.0 * k2 + 2.0 * k3 + k4)
+            history[i + 1] = state
+
+        history = history.transpose(1, 2, 0)
+        beta_z = np.sqrt(beta_squared[:, np.newaxis] - history[2]**2 - history[3]**2)
+
+        trajectory = ElectronTrajectory(z=z, x=history[0], y=history[1], beta_x=history[2], beta_y=history[3],
+                                        beta_z=beta_z, ct=history[4], gamma=gamma)
+        for values in trajectory:
+            values.setflags(write=False)
+
+        return trajectory
@@ -0,0 +1,169 @@
+"""
+Near field emission of an electron from its trajectory (Lienard-Wiechert field in the frequency domain).
+
+For an observation point r at the distance R(t) from the electron, n = (r - r_e(t))/R and k = omega/c the field is
+(e.g. O. Chubar, Proc. EPAC 2002, 1177)
+
+    E(omega) = i e omega/(4 pi eps0 c) int [beta - n (1 + i/(k R))]/R exp(i k (c t + R)) dt
+
+which includes the near field term and holds at any distance. The integral runs over the precomputed trajectory
+with z as variable (c dt = dz/beta_z). Beyond the ends of the trajectory the electron is taken to move on a straight
+line, whose contributions are added as asymptotic terminating terms f exp(i phi)/(i phi').
+
+The field is returned in sqrt(photons/s/0.1%bw/mm^2) like SRW, i.e. |E_x|^2 + |E_y|^2 is the single electron
+intensity in photons/s/0.1%bw/mm^2 scaled by the beam current. Emittance and energy spread are not included.
+
+Observation points are processed in blocks whose temporary arrays fit into a memory budget. Blocks can be
+distributed over a process pool.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import scipy.constants.codata
+
+from code_drivers.analytic.electron_trajectory import TrajectoryIntegrator
+
+codata = scipy.constants.codata.physical_constants
+_ELEMENTARY_CHARGE = codata["elementary charge"][0]
+_SPEED_OF_LIGHT = codata["speed of light in vacuum"][0]
+_VACUUM_PERMITTIVITY = codata["electric constant"][0]
+_PLANCK_CONSTANT = codata["Planck constant"][0]
+
+# Photon energy in eV to wavenumber in 1/m.
+_WAVENUMBER_PER_EV = 2.0 * np.pi * _ELEMENTARY_CHARGE / (_PLANCK_CONSTANT * _SPEED_OF_LIGHT)
+
+# Memory in bytes that the temporary arrays of one block of observation points may use.
+DEFAULT_MAX_MEMORY = 256 * 1024**2
+
+# Float temporaries per (observation point, trajectory point) pair. Complex arrays count twice.
+_TEMPORARIES_PER_PAIR = 16
+
+
+def _field_block(arguments):
+    """
+    Field of one block of observation points. Module level function such that it can be sent to worker processes.
+    :param arguments: (trajectory, wavenumbers, X, Y, distance) with trajectory = (z, x, y, beta_x, beta_y, beta_z, ct)
+                      of a single electron and X, Y the 1D coordinates of the observation points.
+    :return: (E_x, E_y), complex arrays (n_energies, n_points) in units of e/(4 pi eps0 c).
+    """
+    (z, x, y, beta_x, beta_y, beta_z, ct), wavenumbers, X, Y, distance = arguments
+
+    delta_x = X[:, np.newaxis] - x[np.newaxis, :]
+    delta_y = Y[:, np.newaxis] - y[np.newaxis, :]
+    delta_z = distance - z
+    rho2 = delta_x**2 + delta_y**2
+    R = np.sqrt(rho2 + delta_z**2)
+    n_x = delta_x / R
+    n_y = delta_y / R
+
+    # Phase k (c t + R) without the constant k distance, written such that no large numbers cancel.
+    path = (ct - (z - z[0]))[np.newaxis, :] + rho2 / (R + delta_z)
+
+    # Trapezoidal weights of c dt = dz/beta_z.
+    weights = np.gradient(z) / beta_z
+    weights[0] *= 0.5
+    weights[-1] *= 0.5
+
+    # 1 - n.beta, the phase derivative along z is k (1 - n.beta)/beta_z.
+    retardation = 1.0 - n_x * beta_x - n_y * beta_y - delta_z / R * beta_z
+
+    fields = np.empty((2, len(wavenumbers), len(X)), dtype=complex)
+    for i_energy, k in enumerate(wavenumbers):
+        near_field = 1.0 + 1j / (k * R)
+        phase = np.exp(1j * k * path)
+
+        for i_component, (beta, n) in enumerate(((beta_x, n_x), (beta_y, n_y))):
+            integrand = (beta - n * near_field) / R * phase
+            integral = integrand.dot(weights)
+
+            # Straight line continuation beyond both ends.
+            integral += integrand[:, 0] / (1j * k * retardation[:, 0])
+            integral -= integrand[:, -1] / (1j * k * retardation[:, -1])
+
+            fields[i_component, i_energy] = 1j * k * integral
+
+    return fields[0], fields[1]
+
+
+class NearFieldEmission(object):
+    def __init__(self, electron_beam, magnetic_structure, trajectory_integrator=None,
+                 max_memory=DEFAULT_MAX_MEMORY, n_workers=1):
+        """
+        Constructor.
+        :param electron_beam: ElectronBeam object. Only its energy and current are used.
+        :param magnetic_structure: InsertionDevice or MagneticFieldMap.
+        :param trajectory_integrator: TrajectoryIntegrator of the magnetic structure. Defaults to the integrator's
+                                      default limits and steps.
+        :param max_memory: Memory budget in bytes for the temporaries of one block of observation points.
+        :param n_workers: Number of processes that evaluate blocks in parallel.
+        """
+        if trajectory_integrator is None:
+            trajectory_integrator = TrajectoryIntegrator(magnetic_structure)
+
+        self._electron_beam = electron_beam
+        self._magnetic_structure = magnetic_structure
+        self._trajectory_integrator = trajectory_integrator
+        self._max_memory = max_memory
+        self._n_workers = n_workers
+
+    def trajectory(self):
+        return self._trajectory_integrator.reference_trajectory(self._electron_beam)
+
+    def _field_units(self):
+        # e/(4 pi eps0 c) times the conversion of |E|^2 in V^2 s^2/m^2 to photons/s/0.1%bw/mm^2:
+        # (I/e) 1e-3 eps0 c/(pi hbar) 1e-6.
+        hbar = _PLANCK_CONSTANT / (2.0 * np.pi)
+        photons_per_energy = self._electron_beam._current / _ELEMENTARY_CHARGE * 1e-3 * \
+                             _VACUUM_PERMITTIVITY * _SPEED_OF_LIGHT / (np.pi * hbar) * 1e-6
+
+        return _ELEMENTARY_CHARGE / (4.0 * np.pi * _VACUUM_PERMITTIVITY * _SPEED_OF_LIGHT) * np.sqrt(photons_per_energy)
+
+    def _points_per_block(self, n_trajectory):
+        pair_memory = _TEMPORARIES_PER_PAIR * n_trajectory * np.dtype(float).itemsize
+        return max(1, int(self._max_memory // pair_memory))
+
+    def electric_field(self, position, energies, x, y):
+        """
+        Electric field on a screen perpendicular to the axis.
+        :param position: BeamlinePosition of the screen. Its z is the distance from the source center.
+        :param energies: 1D array of photon energies in eV.
+        :param x: 1D array of horizontal screen coordinates in m, relative to the screen center.
+        :param y: 1D array of vertical screen coordinates in m, relative to the screen center.
+        :return: (E_x, E_y), complex arrays (n_energies, n_x, n_y) in sqrt(photons/s/0.1%bw/mm^2).
+        """
+        energies = np.atleast_1d(np.asarray(energies, dtype=float))
+        x = np.asarray(x, dtype=float) + position.x()
+        y = np.asarray(y, dtype=float) + position.y()
+
+        trajectory = self.trajectory()
+        single_electron = (trajectory.z, trajectory.x[0], trajectory.y[0], trajectory.beta_x[0],
+                           trajectory.beta_y[0], trajectory.beta_z[0], trajectory.ct[0])
+        wavenumbers = energies * _WAVENUMBER_PER_EV
+
+        n_points = len(x) * len(y)
+        points_per_block = self._points_per_block(len(trajectory.z))
+        blocks = []
+        for start in range(0, n_points, points_per_block):
+            index = np.arange(start, min(start + points_per_block, n_points))
+            blocks.append((single_electron, wavenumbers, x[index // len(y)], y[index % len(y)], position.z()))
+
+        if self._n_workers > 1:
+            with ProcessPoolExecutor(max_workers=self._n_workers) as executor:
+                results = list(executor.map(_field_block, blocks))
+        else:
+            results = [_field_block(block) for block in blocks]
+
+        units = self._field_units()
+        shape = (len(energies), len(x), len(y))
+
+        return tuple(np.concatenate([result[i_component] for result in results], axis=1).reshape(shape) * units
+                     for i_component in range(2))
+
+    def intensity(self, position, energies, x, y):
+        """
+        :return: Intensity in photons/s/0.1%bw/mm^2, array (n_energies, n_x, n_y). Arguments as for electric_field.
+        """
+        E_x, E_y = self.electric_field(position, energies, x, y)
+        return np.abs(E_x)**2 + np.abs(E_y)**2
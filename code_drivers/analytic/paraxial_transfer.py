@@ -0,0 +1,213 @@
+"""
+Paraxial transfer matrices (ABCD) of a beamline, for quick beam size estimates before wave optics runs.
+
+Free space between the components is a drift, LensIdeal a thin lens, ImagePlane the identity. Horizontal and vertical
+planes are uncoupled. Transported are
+
+    - second moments (<x x>, <x x'>, <x' x'>) of the electron beam: S -> M S M^T,
+    - Gaussian photon beams by their complex beam parameter q: q -> (A q + B)/(C q + D),
+
+and the estimated beam size is the convolution of both.
+
+All methods broadcast over variants of the beamline: positions and focal lengths can be given as arrays of shape
+(..., n_components), wavelengths as arrays broadcasting against the leading variant axes. The beamline is walked once
+per component, the variants are NumPy arrays, so that millions of design points are screened in seconds.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import numpy as np
+
+from optics.beam.twiss import beam_moments
+from optics.beamline.optical_elements.lens.lens_ideal import LensIdeal
+from optics.beamline.optical_elements.image_plane import ImagePlane
+
+
+def drift_matrix(length):
+    """
+    :return: Drift matrices, array (..., 2, 2) with the shape of length in front.
+    """
+    length = np.asarray(length, dtype=float)
+    matrix = np.zeros(length.shape + (2, 2))
+    matrix[..., 0, 0] = 1.0
+    matrix[..., 0, 1] = length
+    matrix[..., 1, 1] = 1.0
+    return matrix
+
+
+def thin_lens_matrix(focal_length):
+    """
+    :return: Thin lens matrices, array (..., 2, 2). Infinite focal lengths give the identity.
+    """
+    focal_length = np.asarray(focal_length, dtype=float)
+    matrix = np.zeros(focal_length.shape + (2, 2))
+    matrix[..., 0, 0] = 1.0
+    matrix[..., 1, 0] = -1.0 / focal_length
+    matrix[..., 1, 1] = 1.0
+    return matrix
+
+
+def propagate_moments(matrices, moments):
+    """
+    Transports second moments S -> M S M^T.
+    :param matrices: Transfer matrices, array (..., 2, 2).
+    :param moments: (<x x>, <x x'>, <x' x'>), array (..., 3) broadcasting against the matrices.
+    :return: Moments, array (..., 3).
+    """
+    A, B, C, D = matrices[..., 0, 0], matrices[..., 0, 1], matrices[..., 1, 0], matrices[..., 1, 1]
+    xx, xxp, xpxp = moments[..., 0], moments[..., 1], moments[..., 2]
+
+    return np.stack((A**2 * xx + 2.0 * A * B * xxp + B**2 * xpxp,
+                     A * C * xx + (A * D + B * C) * xxp + B * D * xpxp,
+                     C**2 * xx + 2.0 * C * D * xxp + D**2 * xpxp), axis=-1)
+
+
+def propagate_q(matrices, q):
+    """
+    Transports complex Gaussian beam parameters q -> (A q + B)/(C q + D).
+    """
+    A, B, C, D = matrices[..., 0, 0], matrices[..., 0, 1], matrices[..., 1, 0], matrices[..., 1, 1]
+    return (A * q + B) / (C * q + D)
+
+
+def gaussian_beam_q(wavelength, waist_size, waist_position=0.0):
+    """
+    :param wavelength: Wavelength in m.
+    :param waist_size: rms size of the intensity at the waist in m.
+    :param waist_position: Longitudinal position of the waist relative to the source in m.
+    :return: Beam parameter q at the source, i.e. -waist_position + i z_R with the Rayleigh length z_R.
+    """
+    rayleigh_length = 4.0 * np.pi * np.square(waist_size) / np.asarray(wavelength, dtype=float)
+    return -np.asarray(waist_position, dtype=float) + 1j * rayleigh_length
+
+
+def gaussian_beam_moments(q, wavelength):
+    """
+    :return: Second moments (<x x>, <x x'>, <x' x'>) of the intensity of Gaussian beams, array (..., 3).
+    """
+    inverse_q = 1.0 / q
+    xx = -np.asarray(wavelength, dtype=float) / (4.0 * np.pi * inverse_q.imag)
+    # The wavefront curvature 1/R = Re(1/q) correlates position and angle: <x x'> = <x x>/R.
+    xxp = xx * inverse_q.real
+    xpxp = xxp**2 / xx + np.asarray(wavelength, dtype=float)**2 / (16.0 * np.pi**2 * xx)
+
+    return np.stack(np.broadcast_arrays(xx, xxp, xpxp), axis=-1)
+
+
+def undulator_photon_waist(wavelength, length):
+    """
+    :return: rms size in m of the diffraction limited undulator photon beam at its waist, sqrt(2 lambda L)/(4 pi).
+    """
+    return np.sqrt(2.0 * np.asarray(wavelength, dtype=float) * length) / (4.0 * np.pi)
+
+
+class ParaxialTransfer(object):
+    def __init__(self, beamline, source_z=0.0):
+        """
+        Constructor.
+        :param beamline: Beamline of LensIdeal and ImagePlane components.
+        :param source_z: Longitudinal position of the source (moments and waists are given there).
+        """
+        self._components = list(beamline)
+        self._source_z = source_z
+
+        self._z = np.array([beamline.position_of(component).z() for component in self._components], dtype=float)
+        self._focal_x = np.full(len(self._components), np.inf)
+        self._focal_y = np.full(len(self._components), np.inf)
+
+        for index, component in enumerate(self._components):
+            if isinstance(component, LensIdeal):
+                self._focal_x[index] = component.focalX()
+                self._focal_y[index] = component.focalY()
+            elif not isinstance(component, ImagePlane):
+                raise NotImplementedError
+
+    def components(self):
+        return self._components
+
+    def positions(self):
+        return self._z
+
+    def focal_lengths(self):
+        """
+        :return: (focal_x, focal_y) per component in m. Infinite for components that are no lenses.
+        """
+        return self._focal_x, self._focal_y
+
+    def transfer_matrices(self, z=None, focal_x=None, focal_y=None):
+        """
+        Transfer matrices from the source to just behind each component.
+        :param z: Component positions in m, array (..., n_components). Defaults to the beamline positions.
+        :param focal_x: Horizontal focal lengths in m, array (..., n_components). Defaults to the beamline's.
+        :param focal_y: Vertical focal lengths in m, array (..., n_components). Defaults to the beamline's.
+        :return: (M_x, M_y), arrays (..., n_components, 2, 2) with the broadcast variant axes in front.
+        """
+        z, focal_x, focal_y = np.broadcast_arrays(self._z if z is None else np.asarray(z, dtype=float),
+                                                  self._focal_x if focal_x is None else np.asarray(focal_x, dtype=float),
+                                                  self._focal_y if focal_y is None else np.asarray(focal_y, dtype=float))
+        variant_shape = z.shape[:-1]
+
+        matrices = []
+        for focal in (focal_x, focal_y):
+            # Elements of the running product, one array per matrix element over the variants.
+            A, B = np.ones(variant_shape), np.zeros(variant_shape)
+            C, D = np.zeros(variant_shape), np.ones(variant_shape)
+            previous_z = self._source_z
+
+            result = np.empty(z.shape + (2, 2))
+            for index in range(z.shape[-1]):
+                length = z[..., index] - previous_z
+                previous_z = z[..., index]
+
+                # Drift, then thin lens.
+                A, B = A + length * C, B + length * D
+                power = 1.0 / focal[..., index]
+                C, D = C - power * A, D - power * B
+
+                result[..., index, 0, 0] = A
+                result[..., index, 0, 1] = B
+                result[..., index, 1, 0] = C
+                result[..., index, 1, 1] = D
+
+            matrices.append(result)
+
+        return matrices[0], matrices[1]
+
+    def electron_beam_moments(self, electron_beam, **variants):
+        """
+        Second moments of the electron beam behind each component. The beam moments are taken at the source.
+        :param electron_beam: ElectronBeam object.
+        :param variants: z, focal_x, focal_y as for transfer_matrices.
+        :return: (moments_x, moments_y), arrays (..., n_components, 3) of (<x x>, <x x'>, <x' x'>).
+        """
+        M_x, M_y = self.transfer_matrices(**variants)
+
+        moments_x, moments_y = beam_moments(electron_beam)
+
+        return propagate_moments(M_x, moments_x), propagate_moments(M_y, moments_y)
+
+    def gaussian_beam(self, wavelength, waist_size, waist_position=0.0, **variants):
+        """
+        Gaussian photon beam behind each component.
+        :param wavelength: Wavelength in m. Scalar or array broadcasting against the variant axes.
+        :param waist_size: rms intensity size at the waist in m, same for both planes.
+        :param waist_position: Position of the waist relative to the source in m.
+        :param variants: z, focal_x, focal_y as for transfer_matrices.
+        :return: (q_x, q_y), complex arrays (..., n_components).
+        """
+        M_x, M_y = self.transfer_matrices(**variants)
+        q = np.asarray(gaussian_beam_q(wavelength, waist_size, waist_position))[..., np.newaxis]
+
+        return propagate_q(M_x, q), propagate_q(M_y, q)
+
+    def beam_sizes(self, electron_beam, wavelength, waist_size, waist_position=0.0, **variants):
+        """
+        Estimated rms sizes of the photon beam of an electron beam: electron beam and Gaussian single electron
+        emission convolved.
+        :return: (size_x, size_y) in m, arrays (..., n_components). Arguments as for the methods above.
+        """
+        moments_x, moments_y = self.electron_beam_moments(electron_beam, **variants)
+        q_x, q_y = self.gaussian_beam(wavelength, waist_size, waist_position, **variants)
+        wavelength = np.asarray(wavelength, dtype=float)[..., np.newaxis]
+
+        return (np.sqrt(moments_x[..., 0] + gaussian_beam_moments(q_x, wavelength)[..., 0]),
+                np.sqrt(moments_y[..., 0] + gaussian_beam_moments(q_y, wavelength)[..., 0]))
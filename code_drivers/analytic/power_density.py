@@ -0,0 +1,217 @@
+"""
+Total power and power density of bending magnets, undulators and wigglers.
+
+Bending magnet (X-ray Data Booklet, section 2.2): the power per horizontal angle dP/dtheta is rho times the power
+radiated per unit length (see insertion devices), distributed vertically as
+
+    d2P/(dtheta dpsi) = dP/dtheta gamma 21/32 [(1 + X^2)^(-5/2) + 5/7 X^2 (1 + X^2)^(-7/2)],  X = gamma psi.
+
+Insertion devices (planar, vertical field B(s) = B0 cos(k s)): the power is incoherently summed over the points of
+the trajectory. Each point radiates the energy e^4 gamma^2 B(s)^2 ds / (6 pi eps0 m^2 c^2) with the angular pattern
+of an electron accelerated perpendicular to its velocity (J. D. Jackson, Classical Electrodynamics, eq. 14.44),
+in small angles u, v (times gamma) relative to the instantaneous direction theta0(s) = K/gamma sin(k s):
+
+    g(u, v) = 3/pi [(1 + u^2 + v^2)^2 - 4 u^2] / (1 + u^2 + v^2)^5,   int g du dv = 1.
+
+This holds for undulators as well as for wigglers, since interference redistributes but does not change the power
+density averaged over harmonics. The total power is 0.633 E^2[GeV] B0^2[T] L[m] I[A] kW.
+
+The electron beam is treated as a filament, i.e. emittance and energy spread are neglected.
+The screen is perpendicular to the axis at the longitudinal distance of the BeamlinePosition, with its center
+shifted by the position's x (horizontal) and y (vertical). Screens are evaluated in chunks of points that fit into a
+memory budget. Chunks can be distributed over a thread pool, since NumPy releases the GIL in the heavy loops.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import scipy.constants.codata
+
+from optics.magnetic_structures.bending_magnet import BendingMagnet
+from optics.magnetic_structures.insertion_device import InsertionDevice
+
+codata = scipy.constants.codata.physical_constants
+_ELEMENTARY_CHARGE = codata["elementary charge"][0]
+_SPEED_OF_LIGHT = codata["speed of light in vacuum"][0]
+_ELECTRON_MASS = codata["electron mass"][0]
+_VACUUM_PERMITTIVITY = codata["electric constant"][0]
+
+# Energy radiated per electron, per unit length and per (T gamma)^2.
+_RADIATION_CONSTANT = _ELEMENTARY_CHARGE**4 / (6.0 * np.pi * _VACUUM_PERMITTIVITY * _ELECTRON_MASS**2 * _SPEED_OF_LIGHT**2)
+
+# Memory in bytes that the temporary arrays of the chunks of screen points evaluated at a time may use.
+DEFAULT_MAX_MEMORY = 256 * 1024**2
+
+# Float temporaries per screen point (angles, indices, bending magnet distribution) and, for insertion devices, per
+# (screen point, trajectory point) pair (angle differences, pattern and its intermediate powers).
+_TEMPORARIES_PER_POINT = 9
+_TEMPORARIES_PER_PAIR = 5
+
+
+def _point_pattern(u, v2):
+    # Normalized angular pattern g(u, v) of a single trajectory point, v2 = v^2.
+    r2 = 1.0 + u**2 + v2
+    return 3.0 / np.pi * (r2**2 - 4.0 * u**2) / r2**5
+
+
+class PowerDensity(object):
+    def __init__(self, electron_beam, magnetic_structure, max_memory=DEFAULT_MAX_MEMORY, n_workers=1):
+        """
+        Constructor.
+        :param electron_beam: ElectronBeam object.
+        :param magnetic_structure: BendingMagnet, Undulator or Wiggler. Insertion devices must be planar
+                                   (K_horizontal = 0).
+        :param max_memory: Memory budget in bytes for the temporaries of the chunks of screen points evaluated at a
+                           time, i.e. shared by the workers.
+        :param n_workers: Number of threads that evaluate chunks in parallel.
+        """
+        if isinstance(magnetic_structure, InsertionDevice) and magnetic_structure.K_horizontal() != 0.0:
+            raise Exception("Power density is implemented for planar insertion devices (K_horizontal = 0) only.")
+
+        if not isinstance(magnetic_structure, (BendingMagnet, InsertionDevice)):
+            raise NotImplementedError
+
+        self._electron_beam = electron_beam
+        self._magnetic_structure = magnetic_structure
+        self._max_memory = max_memory
+        self._n_workers = n_workers
+
+    def _electrons_per_second(self):
+        return self._electron_beam._current / _ELEMENTARY_CHARGE
+
+    def total_power(self):
+        """
+        :return: Total emitted power in W.
+        """
+        gamma = self._electron_beam.gamma()
+        magnetic_structure = self._magnetic_structure
+
+        if isinstance(magnetic_structure, BendingMagnet):
+            return self.bending_magnet_power_per_angle() * magnetic_structure.horizontal_divergence()
+
+        # <B^2> = B0^2/2 for a sinusoidal field.
+        mean_square_field = magnetic_structure.B_vertical()**2 / 2.0
+        return _RADIATION_CONSTANT * gamma**2 * mean_square_field * magnetic_structure.length() * \
+               self._electrons_per_second()
+
+    def bending_magnet_power_per_angle(self):
+        """
+        :return: Power per horizontal angle of a bending magnet in W/rad.
+        """
+        gamma = self._electron_beam.gamma()
+        # 1/rho = e B / (gamma m c), the energy per unit length is _RADIATION_CONSTANT gamma^2 B^2.
+        field = gamma * _ELECTRON_MASS * _SPEED_OF_LIGHT / (_ELEMENTARY_CHARGE * self._magnetic_structure.radius())
+
+        return _RADIATION_CONSTANT * gamma**2 * field**2 * self._magnetic_structure.radius() * \
+               self._electrons_per_second()
+
+    def _trajectory_samples(self):
+        """
+        Directions and radiated energies per electron of the trajectory samples of an insertion device.
+        theta0 = K/gamma sin(phi) and B^2 are the same at phi and pi - phi, i.e. half a period covers all
+        directions; it is weighted by 2 N.
+        """
+        gamma = self._electron_beam.gamma()
+        insertion_device = self._magnetic_structure
+        K = insertion_device.K_vertical()
+
+        # Angular steps of at most 1/(4 gamma) between samples.
+        n_samples = max(32, int(np.ceil(4.0 * np.pi * K)))
+        phi = -0.5 * np.pi + (np.arange(n_samples) + 0.5) * np.pi / n_samples
+
+        theta = K / gamma * np.sin(phi)
+        step = 0.5 * insertion_device.periodLength() / n_samples
+        energy = _RADIATION_CONSTANT * gamma**2 * (insertion_device.B_vertical() * np.cos(phi))**2 * step * \
+                 2.0 * insertion_device.periodNumber()
+
+        return theta, energy
+
+    def _points_per_chunk(self, n_samples):
+        # The budget is shared by the chunks evaluated in parallel.
+        point_memory = (_TEMPORARIES_PER_POINT + _TEMPORARIES_PER_PAIR * n_samples) * np.dtype(float).itemsize
+        return max(1, int(self._max_memory / self._n_workers // point_memory))
+
+    def _evaluate_chunk(self, theta_x, theta_y, samples):
+        # Angular power density in W/rad^2 at the angle pairs (theta_x, theta_y), 1D arrays.
+        gamma = self._electron_beam.gamma()
+        X2 = (gamma * theta_y)**2
+
+        if isinstance(self._magnetic_structure, BendingMagnet):
+            half_divergence = 0.5 * self._magnetic_structure.horizontal_divergence()
+            inside = np.abs(theta_x) <= half_divergence
+            distribution = 21.0 / 32.0 * ((1.0 + X2)**-2.5 + 5.0 / 7.0 * X2 * (1.0 + X2)**-3.5)
+            return np.where(inside, self.bending_magnet_power_per_angle() * gamma * distribution, 0.0)
+
+        theta_0, energy = samples
+        u = gamma * (theta_x[:, np.newaxis] - theta_0[np.newaxis, :])
+        pattern = _point_pattern(u, X2[:, np.newaxis])
+
+        return gamma**2 * self._electrons_per_second() * pattern.dot(energy)
+
+    def angular_power_density(self, theta_x, theta_y):
+        """
+        Power per solid angle on a grid of angles.
+        :param theta_x: 1D array of horizontal angles in rad.
+        :param theta_y: 1D array of vertical angles in rad.
+        :return: Power density in W/mrad^2, array (n_theta_x, n_theta_y).
+        """
+        theta_x = np.asarray(theta_x, dtype=float)
+        theta_y = np.asarray(theta_y, dtype=float)
+        n_points = len(theta_x) * len(theta_y)
+
+        if isinstance(self._magnetic_structure, BendingMagnet):
+            samples = None
+            points_per_chunk = self._points_per_chunk(0)
+        else:
+            samples = self._trajectory_samples()
+            points_per_chunk = self._points_per_chunk(len(samples[0]))
+
+        # Chunks are evaluated into one preallocated array.
+        density = np.empty(n_points)
+
+        def evaluate(start):
+            index = np.arange(start, min(start + points_per_chunk, n_points))
+            density[start:start + len(index)] = self._evaluate_chunk(theta_x[index // len(theta_y)],
+                                                                     theta_y[index % len(theta_y)], samples)
+
+        starts = range(0, n_points, points_per_chunk)
+        if self._n_workers > 1:
+            # Each worker evaluates every n_workers-th chunk, i.e. n_workers chunks are in memory at a time.
+            def evaluate_every(first):
+                for start in starts[first::self._n_workers]:
+                    evaluate(start)
+
+            with ThreadPoolExecutor(max_workers=self._n_workers) as executor:
+                list(executor.map(evaluate_every, range(self._n_workers)))
+        else:
+            for start in starts:
+                evaluate(start)
+
+        # Per rad^2 to per mrad^2.
+        density *= 1e-6
+        return density.reshape(len(theta_x), len(theta_y))
+
+    def power_density(self, position, x, y):
+        """
+        Power per area on a screen perpendicular to the axis.
+        :param position: BeamlinePosition of the screen. Its z is the distance from the source center.
+        :param x: 1D array of horizontal screen coordinates in m, relative to the screen center.
+        :param y: 1D array of vertical screen coordinates in m, relative to the screen center.
+        :return: Power density in W/mm^2, array (n_x, n_y).
+        """
+        distance = position.z()
+        theta_x = (np.asarray(x, dtype=float) + position.x()) / distance
+        theta_y = (np.asarray(y, dtype=float) + position.y()) / distance
+
+        # W/mrad^2 = 1e6 W/rad^2, one rad^2 covers distance^2 m^2 = 1e6 distance^2 mm^2.
+        density = self.angular_power_density(theta_x, theta_y)
+        density /= distance**2
+        return density
+
+    def screen_power(self, position, x, y):
+        """
+        :return: Power in W on the screen mesh (sum of the power density times the mesh cell area).
+        """
+        density = self.power_density(position, x, y)
+        return density.sum() * (x[1] - x[0]) * (y[1] - y[0]) * 1e6
@@ -0,0 +1,231 @@
+"""
+Tuning curves of a planar undulator from the analytic (Bessel function) expressions.
+
+For the odd harmonics n of the vertical field the flux in the central cone is (X-ray Data Booklet, section 2.1)
+
+    F_n = pi alpha N 1e-3 I/e Q_n(K)                           [photons/s/0.1%bw]
+    Q_n = n K^2 / (1 + K^2/2) [J_(n-1)/2(Y) - J_(n+1)/2(Y)]^2,  Y = n K^2 / (4 (1 + K^2/2))
+
+and the brilliance is F_n / (4 pi^2 sqrt(det Sigma_x) sqrt(det Sigma_y)), where Sigma is the second moment matrix of
+the electron beam convolved with the single electron radiation, sigma_r = sqrt(2 lambda L)/(4 pi) and
+sigma_r' = sqrt(lambda/(2 L)). The energy spread widens the natural divergence by Qa(eps) and the natural size by
+Qa(eps/4)^(2/3), eps = 2 pi n N sigma_E (Tanaka & Kitamura, J. Synchrotron Rad. 16 (2009) 380).
+
+All quantities are vectorized over K and harmonics. Tables are cached on disk keyed by a fingerprint of the electron
+beam, the undulator and the requested grid, such that interactive tools can look them up instead of recomputing.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import os
+import hashlib
+import tempfile
+from collections import namedtuple
+
+import numpy as np
+import scipy.constants.codata
+from scipy.special import jv, erf
+
+from optics.beam.twiss import beam_moments, emittance
+
+codata = scipy.constants.codata.physical_constants
+_FINE_STRUCTURE_CONSTANT = codata["fine-structure constant"][0]
+_ELEMENTARY_CHARGE = codata["elementary charge"][0]
+_SPEED_OF_LIGHT = codata["speed of light in vacuum"][0]
+_PLANCK_CONSTANT = codata["Planck constant"][0]
+
+# Increase whenever the content of the tables changes, such that stale cache files are not used.
+_TABLE_VERSION = 1
+
+TuningCurveTable = namedtuple("TuningCurveTable", ["harmonics",            # (n_harmonics,)
+                                                   "K_values",             # (n_K,)
+                                                   "magnetic_field",       # (n_K,) peak field in T
+                                                   "energy",               # (n_harmonics, n_K) eV
+                                                   "flux",                 # (n_harmonics, n_K) photons/s/0.1%bw
+                                                   "brilliance",           # (n_harmonics, n_K) photons/s/mm^2/mrad^2/0.1%bw
+                                                   "source_size_x",        # (n_harmonics, n_K) m, rms
+                                                   "source_size_y",
+                                                   "source_divergence_x",  # (n_harmonics, n_K) rad, rms
+                                                   "source_divergence_y"])
+
+
+def flux_function_Q(K, harmonic):
+    """
+    Q_n(K) of the central cone flux of a planar undulator. Zero for even harmonics.
+    :param K: Deflection parameter, broadcasts against harmonic.
+    :param harmonic: Harmonic number n.
+    """
+    K = np.asarray(K, dtype=float)
+    harmonic = np.asarray(harmonic)
+
+    deflection_term = 1.0 + K**2 / 2.0
+    Y = harmonic * K**2 / (4.0 * deflection_term)
+    bessel_term = jv((harmonic - 1) / 2.0, Y) - jv((harmonic + 1) / 2.0, Y)
+
+    return np.where(harmonic % 2 == 1, harmonic * K**2 / deflection_term * bessel_term**2, 0.0)
+
+
+def energy_spread_factor(x):
+    """
+    Qa(x) of Tanaka & Kitamura: broadening of the natural divergence by the normalized energy spread x.
+    Tends to 1 for x -> 0.
+    """
+    x = np.asarray(x, dtype=float)
+    small = np.abs(x) < 1e-5
+    x = np.where(small, 1.0, x)
+
+    Qa = np.sqrt(2.0 * x**2 / (-1.0 + np.exp(-2.0 * x**2) + np.sqrt(2.0 * np.pi) * x * erf(np.sqrt(2.0) * x)))
+
+    return np.where(small, 1.0, Qa)
+
+
+def fingerprint(electron_beam, undulator, K_values, harmonics):
+    """
+    :return: Hex digest identifying the table of the electron beam, the undulator and the grid. The K_vertical of the
+             undulator is left out: K is the variable of the table, undulators differing in K only share it.
+    """
+    description = (_TABLE_VERSION,
+                   type(undulator).__name__,
+                   tuple((key, value[0]) for key, value in electron_beam.to_dictionary().items()),
+                   tuple((key, value[0]) for key, value in undulator.to_dictionary().items() if key != "K_vertical"),
+                   tuple(np.asarray(K_values, dtype=float).tolist()),
+                   tuple(np.asarray(harmonics).tolist()))
+
+    return hashlib.sha1(repr(description).encode("utf-8")).hexdigest()
+
+
+class UndulatorTuningCurves(object):
+    def __init__(self, electron_beam, undulator, cache_directory=None):
+        """
+        Constructor.
+        :param electron_beam: ElectronBeam object.
+        :param undulator: Planar Undulator object (K_horizontal = 0). Its K_vertical is varied along the tables.
+        :param cache_directory: Directory for the table cache. None to disable the disk cache.
+        """
+        if undulator.K_horizontal() != 0.0:
+            raise Exception("Tuning curves are implemented for planar undulators (K_horizontal = 0) only.")
+
+        self._electron_beam = electron_beam
+        self._undulator = undulator
+        self._cache_directory = cache_directory
+
+    def table(self, K_values, harmonics=(1, 3, 5)):
+        """
+        Tuning curve table, loaded from the disk cache if present.
+        :param K_values: 1D array of vertical deflection parameters.
+        :param harmonics: 1D array of odd harmonics.
+        :return: TuningCurveTable.
+        """
+        if self._cache_directory is None:
+            return self.calculate_table(K_values, harmonics)
+
+        filename = self.cache_filename(K_values, harmonics)
+        if os.path.exists(filename):
+            with np.load(filename) as cached:
+                return TuningCurveTable(**{field: cached[field] for field in TuningCurveTable._fields})
+
+        table = self.calculate_table(K_values, harmonics)
+        self._write(filename, table)
+
+        return table
+
+    def cache_filename(self, K_values, harmonics):
+        return os.path.join(self._cache_directory,
+                            "tuning_curves_%s.npz" % fingerprint(self._electron_beam, self._undulator,
+                                                                 K_values, harmonics))
+
+    def _write(self, filename, table):
+        # Write to a temporary file first, such that concurrent readers never see a partial table.
+        if not os.path.isdir(self._cache_directory):
+            os.makedirs(self._cache_directory)
+
+        handle, temporary_filename = tempfile.mkstemp(suffix=".npz", dir=self._cache_directory)
+        try:
+            with os.fdopen(handle, "wb") as temporary_file:
+                np.savez(temporary_file, **table._asdict())
+            os.replace(temporary_filename, filename)
+        except Exception:
+            os.remove(temporary_filename)
+            raise
+
+    def calculate_table(self, K_values, harmonics=(1, 3, 5)):
+        """
+        Calculates the tuning curve table without using the cache. Arguments as for table.
+        :return: TuningCurveTable.
+        """
+        undulator = self._undulator
+        electron_beam = self._electron_beam
+
+        harmonics = np.asarray(harmonics)
+        K_values = np.asarray(K_values, dtype=float)
+        K_grid = K_values[np.newaxis, :]
+        harmonic_grid = harmonics[:, np.newaxis]
+
+        gamma = electron_beam.gamma()
+        energy = undulator.tuningEnergyGrid(gamma, K_values, harmonics)
+        wavelength = _PLANCK_CONSTANT * _SPEED_OF_LIGHT / (_ELEMENTARY_CHARGE * energy)
+
+        flux = np.pi * _FINE_STRUCTURE_CONSTANT * undulator.periodNumber() * 1e-3 * \
+               electron_beam._current / _ELEMENTARY_CHARGE * flux_function_Q(K_grid, harmonic_grid)
+
+        # Single electron radiation, widened by the energy spread.
+        length = undulator.length()
+        normalized_spread = 2.0 * np.pi * harmonic_grid * undulator.periodNumber() * electron_beam._energy_spread
+        natural_size = np.sqrt(2.0 * wavelength * length) / (4.0 * np.pi) * \
+                       energy_spread_factor(normalized_spread / 4.0)**(2.0 / 3.0)
+        natural_divergence = np.sqrt(wavelength / (2.0 * length)) * energy_spread_factor(normalized_spread)
+
+        sizes = []
+        divergences = []
+        phase_space_areas = []
+        for moment_xx, moment_xxp, moment_xpxp in beam_moments(electron_beam):
+            total_xx = moment_xx + natural_size**2
+            total_xpxp = moment_xpxp + natural_divergence**2
+            sizes.append(np.sqrt(total_xx))
+            divergences.append(np.sqrt(total_xpxp))
+            phase_space_areas.append(emittance(np.stack(np.broadcast_arrays(total_xx, moment_xxp, total_xpxp), axis=-1)))
+
+        # Per m^2 rad^2 to per mm^2 mrad^2.
+        brilliance = flux / (4.0 * np.pi**2 * phase_space_areas[0] * phase_space_areas[1]) * 1e-12
+
+        return TuningCurveTable(harmonics=harmonics,
+                                K_values=K_values,
+                                magnetic_field=undulator._magneticFieldStrengthFromK(K_values),
+                                energy=energy,
+                                flux=flux,
+                                brilliance=brilliance,
+                                source_size_x=sizes[0],
+                                source_size_y=sizes[1],
+                                source_divergence_x=divergences[0],
+                                source_divergence_y=divergences[1])
+
+
+def lookup(table, photon_energy, quantity="brilliance"):
+    """
+    Looks up a quantity of the tuning curves at given photon energies, interpolating along K.
+    For each energy the best harmonic, i.e. the one with the largest value, is taken.
+    :param table: TuningCurveTable.
+    :param photon_energy: Photon energies in eV (array).
+    :param quantity: Name of a (n_harmonics, n_K) field of the table.
+    :return: (value, harmonic, K) arrays with the shape of photon_energy. Energies no harmonic reaches give value 0.
+    """
+    photon_energy = np.asarray(photon_energy, dtype=float)
+    values = getattr(table, quantity)
+
+    best_value = np.zeros(photon_energy.shape)
+    best_harmonic = np.zeros(photon_energy.shape, dtype=table.harmonics.dtype)
+    best_K = np.zeros(photon_energy.shape)
+
+    for i_harmonic, harmonic in enumerate(table.harmonics):
+        # The energy falls with K. Interpolate on increasing energies.
+        order = np.argsort(table.energy[i_harmonic])
+        energies = table.energy[i_harmonic][order]
+
+        inside = (photon_energy >= energies[0]) & (photon_energy <= energies[-1])
+        value = np.where(inside, np.interp(photon_energy, energies, values[i_harmonic][order]), 0.0)
+        better = value > best_value
+
+        best_value = np.where(better, value, best_value)
+        best_harmonic = np.where(better, harmonic, best_harmonic)
+        best_K = np.where(better, np.interp(photon_energy, energies, table.K_values[order]), best_K)
+
+    return best_value, best_harmonic, best_K
@@ -0,0 +1,202 @@
+"""
+Analytic spectrum of a planar wiggler as incoherent sum over its poles.
+
+Each of the 2 N poles sweeps the horizontal angles |theta| < K/gamma once and emits like a bending magnet with the
+local radius of the trajectory, i.e. with the local critical energy (X-ray Data Booklet, section 2.1)
+
+    E_c(theta) = E_c0 sqrt(1 - (gamma theta/K)^2),   E_c0 of the peak field.
+
+Interference between the poles is neglected, which holds for K >> 1.
+
+All poles share the same field, so the angular distribution of a pole is tabulated once on an (energy, theta, psi)
+grid and kept in a cache. On a screen at finite distance the poles differ only by their longitudinal position: each
+pole interpolates the table at its own angles. The sum over poles is distributed over a thread pool, since NumPy
+releases the GIL in the heavy loops.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import scipy.constants.codata
+
+from optics.magnetic_structures.bending_magnet import BendingMagnet
+
+from code_drivers.analytic.bending_magnet_spectrum import BendingMagnetSpectrum
+
+codata = scipy.constants.codata.physical_constants
+_ELEMENTARY_CHARGE = codata["elementary charge"][0]
+_SPEED_OF_LIGHT = codata["speed of light in vacuum"][0]
+_ELECTRON_MASS = codata["electron mass"][0]
+
+
+def _linear_weights(axis, positions):
+    # Index and weight of the linear interpolation on a regular axis. Positions outside get weight zero.
+    step = axis[1] - axis[0]
+    index_float = (positions - axis[0]) / step
+    index = np.clip(np.floor(index_float).astype(int), 0, len(axis) - 2)
+    t = index_float - index
+    inside = (positions >= axis[0]) & (positions <= axis[-1])
+
+    return index, np.where(inside, 1.0 - t, 0.0), np.where(inside, t, 0.0)
+
+
+class WigglerSpectrum(object):
+    def __init__(self, electron_beam, wiggler, n_theta=201, n_psi=401, n_workers=1, cache_size=8):
+        """
+        Constructor.
+        :param electron_beam: ElectronBeam object. The beam is treated as a filament.
+        :param wiggler: Wiggler (or planar InsertionDevice with K_horizontal = 0).
+        :param n_theta: Horizontal angles of the pole table.
+        :param n_psi: Vertical angles of the pole table.
+        :param n_workers: Number of threads that sum the poles in parallel.
+        :param cache_size: Number of pole tables kept in the cache.
+        """
+        if wiggler.K_horizontal() != 0.0:
+            raise Exception("Wiggler spectra are implemented for planar devices (K_horizontal = 0) only.")
+
+        self._electron_beam = electron_beam
+        self._wiggler = wiggler
+        self._n_theta = n_theta
+        self._n_psi = n_psi
+        self._n_workers = n_workers
+
+        self._cache_size = cache_size
+        self._cache = OrderedDict()
+
+    def gamma(self):
+        return self._electron_beam.gamma()
+
+    def number_of_poles(self):
+        return 2 * self._wiggler.periodNumber()
+
+    def pole_positions(self):
+        """
+        :return: Longitudinal pole centers in m, spaced by half a period and centered at z = 0.
+        """
+        half_period = 0.5 * self._wiggler.periodLength()
+        return -0.5 * self._wiggler.length() + (np.arange(self.number_of_poles()) + 0.5) * half_period
+
+    def maximal_angle(self):
+        """
+        :return: Horizontal half opening K/gamma of the fan in rad.
+        """
+        return self._wiggler.K_vertical() / self.gamma()
+
+    def peak_bending_magnet(self):
+        """
+        :return: BendingMagnet of the peak field with the length of one pole.
+        """
+        field = self._wiggler.B_vertical()
+        radius = self.gamma() * _ELECTRON_MASS * _SPEED_OF_LIGHT / (_ELEMENTARY_CHARGE * field)
+
+        return BendingMagnet(radius=radius, magnetic_field=field, length=0.5 * self._wiggler.periodLength())
+
+    def _peak_spectrum(self):
+        return BendingMagnetSpectrum(self._electron_beam, self.peak_bending_magnet())
+
+    def _field_fraction(self, theta_x):
+        # Local field over peak field at the trajectory point with angle theta_x. Zero outside the fan.
+        u = np.asarray(theta_x, dtype=float) / self.maximal_angle()
+        return np.sqrt(np.maximum(1.0 - u**2, 0.0))
+
+    def critical_energy(self, theta_x=0.0):
+        """
+        :return: Local critical energy in eV at the horizontal angles theta_x.
+        """
+        return self._peak_spectrum().critical_energy() * self._field_fraction(theta_x)
+
+    def photon_flux(self, energies, theta_x):
+        """
+        Flux integrated over the vertical angle, summed over all poles.
+        :param energies: 1D array of photon energies in eV.
+        :param theta_x: 1D array of horizontal angles in rad.
+        :return: Flux in photons/s/0.1%bw/mrad (horizontal), array (n_energies, n_theta).
+        """
+        energies = np.asarray(energies, dtype=float)
+        fraction = self._field_fraction(theta_x)
+
+        # The bending magnet flux depends on the energy over the critical energy only.
+        scaled_energies = energies[:, np.newaxis] / np.where(fraction > 0.0, fraction, 1.0)[np.newaxis, :]
+        flux = self._peak_spectrum().photon_flux(scaled_energies)
+
+        return self.number_of_poles() * np.where(fraction > 0.0, flux, 0.0)
+
+    def total_flux(self, energies):
+        """
+        :return: Flux over the full horizontal fan in photons/s/0.1%bw, with the shape of energies.
+        """
+        theta_x = np.linspace(-1.0, 1.0, self._n_theta) * self.maximal_angle()
+        flux = self.photon_flux(np.atleast_1d(energies), theta_x)
+
+        # Trapezoidal rule over theta in mrad. The flux vanishes at the ends of the fan.
+        return (flux.sum(axis=1) * (theta_x[1] - theta_x[0]) * 1e3).reshape(np.shape(energies))
+
+    def pole_angular_distribution(self, energies, psi_max):
+        """
+        Angular distribution of a single pole, tabulated and cached.
+        :param energies: 1D array of photon energies in eV.
+        :param psi_max: Largest vertical angle of the table in rad. The distribution is symmetric in psi.
+        :return: (theta, psi, table) with the regular axes theta (n_theta,), psi (n_psi,) in rad and the sum of both
+                 polarizations, array (n_energies, n_theta, n_psi) in photons/s/0.1%bw/mrad^2.
+        """
+        energies = np.asarray(energies, dtype=float)
+        key = (energies.tobytes(), float(psi_max), self._n_theta, self._n_psi)
+
+        if key in self._cache:
+            self._cache[key] = self._cache.pop(key)
+            return self._cache[key]
+
+        theta = np.linspace(-1.0, 1.0, self._n_theta) * self.maximal_angle()
+        psi = np.linspace(0.0, psi_max, self._n_psi)
+        fraction = self._field_fraction(theta)
+
+        # One row of scaled energies per (energy, theta) pair.
+        scaled_energies = (energies[:, np.newaxis] / np.where(fraction > 0.0, fraction, 1.0)[np.newaxis, :]).ravel()
+        sigma, pi = self._peak_spectrum().angular_distribution(scaled_energies, psi)
+        table = (sigma + pi).reshape(len(energies), len(theta), len(psi))
+        table = np.where(fraction[np.newaxis, :, np.newaxis] > 0.0, table, 0.0)
+
+        self._cache[key] = (theta, psi, table)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+        return self._cache[key]
+
+    def clear_cache(self):
+        self._cache.clear()
+
+    def flux_density(self, position, energies, x, y):
+        """
+        Flux per area on a screen perpendicular to the axis, summed over the poles.
+        :param position: BeamlinePosition of the screen. Its z is the distance from the wiggler center.
+        :param energies: 1D array of photon energies in eV.
+        :param x: 1D array of horizontal screen coordinates in m, relative to the screen center.
+        :param y: 1D array of vertical screen coordinates in m, relative to the screen center.
+        :return: Flux density in photons/s/0.1%bw/mm^2, array (n_energies, n_x, n_y).
+        """
+        energies = np.atleast_1d(np.asarray(energies, dtype=float))
+        x = np.asarray(x, dtype=float) + position.x()
+        y = np.abs(np.asarray(y, dtype=float) + position.y())
+
+        distances = position.z() - self.pole_positions()
+        # The table covers the screen as seen from the closest pole, at least 1/gamma.
+        psi_max = max(y.max() / distances.min(), 1.0 / self.gamma())
+        theta, psi, table = self.pole_angular_distribution(energies, psi_max)
+
+        def pole(distance):
+            index_x, lower_x, upper_x = _linear_weights(theta, x / distance)
+            index_y, lower_y, upper_y = _linear_weights(psi, y / distance)
+
+            along_x = table[:, index_x, :] * lower_x[:, np.newaxis] + table[:, index_x + 1, :] * upper_x[:, np.newaxis]
+            density = along_x[:, :, index_y] * lower_y + along_x[:, :, index_y + 1] * upper_y
+
+            # Per mrad^2 to per mm^2: one mrad covers distance mm.
+            return density / distance**2
+
+        if self._n_workers > 1:
+            with ThreadPoolExecutor(max_workers=self._n_workers) as executor:
+                return sum(executor.map(pole, distances))
+
+        return sum(pole(distance) for distance in distances)
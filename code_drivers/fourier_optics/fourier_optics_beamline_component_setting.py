@@ -0,0 +1,73 @@
+"""
+Implements Fourier optics BeamlineComponent settings.
+
+Like for SRW the free space in front of a component is propagated with the drift space settings of the component.
+Resize factors have the SRW meaning: the range factor pads (> 1) or crops (< 1) the mesh, the resolution factor
+refines (> 1) or coarsens (< 1) it. They are applied before the component.
+"""
+from code_drivers.fourier_optics.fourier_optics_driver_setting import FourierOpticsDriverSetting
+from code_drivers.fourier_optics.fourier_optics_propagators import AUTO, PROPAGATION_MODES
+
+
+class FourierOpticsBeamlineComponentSetting(FourierOpticsDriverSetting):
+    def __init__(self):
+        FourierOpticsDriverSetting.__init__(self)
+
+        self._propagation_mode = AUTO        # one of "auto", "transfer_function", "impulse_response", "angular_spectrum"
+        self._auto_resize = True             # pad and refine the mesh automatically
+        self._max_points = 8192              # upper limit of mesh points per axis for automatic resizing
+        self._resize_factor_horizontal = 1.0
+        self._resize_resolution_horizontal = 1.0
+        self._resize_factor_vertical = 1.0
+        self._resize_resolution_vertical = 1.0
+
+        self.set_drift_space_settings(None)
+
+    def set_propagation_mode(self, propagation_mode):
+        if propagation_mode not in PROPAGATION_MODES:
+            raise Exception("Unknown propagation mode: %s" % propagation_mode)
+
+        self._propagation_mode = propagation_mode
+
+    def propagation_mode(self):
+        return self._propagation_mode
+
+    def set_auto_resize(self, auto_resize):
+        self._auto_resize = auto_resize
+
+    def auto_resize(self):
+        return self._auto_resize
+
+    def set_max_points(self, max_points):
+        self._max_points = max_points
+
+    def max_points(self):
+        return self._max_points
+
+    def set_resize_factor_horizontal(self, resize_factor_horizontal):
+        self._resize_factor_horizontal = resize_factor_horizontal
+
+    def set_resize_resolution_horizontal(self, resize_resolution_horizontal):
+        self._resize_resolution_horizontal = resize_resolution_horizontal
+
+    def set_resize_factor_vertical(self, resize_factor_vertical):
+        self._resize_factor_vertical = resize_factor_vertical
+
+    def set_resize_resolution_vertical(self, resize_resolution_vertical):
+        self._resize_resolution_vertical = resize_resolution_vertical
+
+    def resize_factors(self):
+        return self._resize_factor_horizontal, self._resize_factor_vertical
+
+    def resize_resolutions(self):
+        return self._resize_resolution_horizontal, self._resize_resolution_vertical
+
+    def set_drift_space_settings(self, drift_space_settings):
+        self._drift_space_settings = drift_space_settings
+
+    def has_drift_space_settings(self):
+        has_drift_space_settings = self._drift_space_settings is not None
+        return has_drift_space_settings
+
+    def drift_space_settings(self):
+        return self._drift_space_settings
@@ -0,0 +1,189 @@
+"""
+Fourier optics driver.
+
+Propagates a complex field on a mesh through the beamline with vectorized NumPy FFTs. Free space is propagated with
+the Fresnel transfer function, the Fresnel impulse response or the angular spectrum, chosen from the Fresnel number
+of the mesh unless set explicitly. Lenses are thin lens phase screens. The mesh is padded and refined automatically
+where needed. Polychromatic wavefronts are propagated in batches of energy slices, see set_max_memory.
+
+The driver does not calculate source radiation itself: the source must carry a FourierOpticsSourceSetting with the
+initial wavefront. Only single electron (fully coherent) propagation is implemented.
+"""
+import time
+
+from optics.driver.abstract_driver import AbstractDriver
+
+from optics.beamline.optical_elements.lens.lens_ideal import LensIdeal
+from optics.beamline.optical_elements.image_plane import ImagePlane
+
+from code_drivers.fourier_optics import fourier_optics_propagators as propagators
+from code_drivers.fourier_optics.fourier_optics_beamline_component_setting import FourierOpticsBeamlineComponentSetting
+
+
+class FourierOpticsDriver(AbstractDriver):
+    def __init__(self, max_memory=propagators.DEFAULT_MAX_MEMORY):
+        """
+        Constructor.
+        :param max_memory: Memory cap in bytes for the temporary arrays of one batch of energy slices.
+        """
+        self._max_memory = max_memory
+
+    def set_max_memory(self, max_memory):
+        self._max_memory = max_memory
+
+    def max_memory(self):
+        return self._max_memory
+
+    def calculate_radiation(self, electron_beam, magnetic_structure, beamline, energy_min, energy_max):
+        """
+        Calculates radiation.
+
+        :param electron_beam: ElectronBeam object
+        :param magnetic_structure: Source object. Must carry a FourierOpticsSourceSetting with the initial wavefront.
+        :param beamline: beamline object
+        :param energy_min: Minimal energy for the calculation
+        :param energy_max: Maximal energy for the calculation
+        :return: FourierOpticsWavefront at the last beamline component.
+        """
+        # Settings are taken as they are at the start of the run.
+        source_settings = magnetic_structure.settings(self).snapshot() if magnetic_structure.has_settings(self) else None
+        if source_settings is None or not source_settings.has_wavefront():
+            raise Exception("The Fourier optics driver needs a FourierOpticsSourceSetting with the initial wavefront.")
+
+        wavefront = source_settings.wavefront()
+
+        energies = wavefront.energies()
+        if energies.min() < energy_min or energies.max() > energy_max:
+            raise Exception("The energies of the initial wavefront are outside of [energy_min, energy_max].")
+
+        print("FourierOpticsDriver.calculate_radiation propagates...")
+        t0 = time.time()
+        wavefront = self.propagate(wavefront, beamline)
+        print("done in ",round(time.time() - t0), "s")
+
+        return wavefront
+
+    def propagate(self, wavefront, beamline):
+        """
+        Propagates a wavefront through the beamline.
+        Free space between the wavefront position and a component is propagated with the drift space settings of
+        that component. Snapshots of all settings are taken before propagating.
+        :param wavefront: FourierOpticsWavefront upstream of the beamline components.
+        :param beamline: beamline object
+        :return: FourierOpticsWavefront at the last beamline component.
+        """
+        sections = [(component, beamline.position_of(component), self._settings_snapshot(component))
+                    for component in beamline]
+
+        for component, position, component_settings in sections:
+            distance = position.z() - wavefront.z()
+            if distance > 0.0:
+                if component_settings.has_drift_space_settings():
+                    # Nested in the snapshot, i.e. a snapshot as well.
+                    drift_space_settings = component_settings.drift_space_settings()
+                else:
+                    drift_space_settings = FourierOpticsBeamlineComponentSetting().snapshot()
+
+                wavefront = self.propagate_drift(wavefront, distance, drift_space_settings)
+
+            if isinstance(component, LensIdeal):
+                wavefront = self.apply_lens(wavefront, component.focalX(), component.focalY(), component_settings)
+            elif isinstance(component, ImagePlane):
+                pass
+            else:
+                raise NotImplementedError
+
+        return wavefront
+
+    def _settings_snapshot(self, component):
+        """
+        Snapshot of the settings of a component, or of default settings if it has none.
+        """
+        if component.has_settings(self):
+            return component.settings(self).snapshot()
+
+        return FourierOpticsBeamlineComponentSetting().snapshot()
+
+    def propagate_drift(self, wavefront, distance, settings):
+        """
+        Propagates a wavefront through free space.
+        :param wavefront: FourierOpticsWavefront
+        :param distance: Drift length in m.
+        :param settings: FourierOpticsBeamlineComponentSetting of the drift space.
+        :return: FourierOpticsWavefront at z + distance.
+        """
+        field, x, y = self._resize(wavefront, settings)
+
+        if settings.auto_resize():
+            range_factors = propagators.required_range_factors(field, x, y, wavefront.wavelengths(), distance,
+                                                               max_memory=self._max_memory)
+            field, x, y = propagators.resize_range_batched(field, x, y,
+                                                           *self._limited_factors(range_factors, x, y, settings),
+                                                           max_memory=self._max_memory)
+
+        # A resized field is a copy owned by this call and is propagated in place.
+        field = propagators.propagate_batched(field, x[1] - x[0], y[1] - y[0], wavefront.wavelengths(), distance,
+                                              settings.propagation_mode(), self._max_memory,
+                                              out=None if field is wavefront.field() else field)
+
+        return wavefront.new_wavefront(field, x, y, wavefront.z() + distance)
+
+    def apply_lens(self, wavefront, focal_x, focal_y, settings):
+        """
+        Applies the phase screen of an ideal thin lens.
+        :param wavefront: FourierOpticsWavefront
+        :param focal_x: Horizontal focal length in m.
+        :param focal_y: Vertical focal length in m.
+        :param settings: FourierOpticsBeamlineComponentSetting of the lens.
+        :return: FourierOpticsWavefront behind the lens.
+        """
+        field, x, y = self._resize(wavefront, settings)
+
+        if settings.auto_resize():
+            # Refine the mesh such that the phase behind the lens is still sampled.
+            resolution_factors = propagators.required_resolution_factors(field, x, y, wavefront.wavelengths(),
+                                                                         focal_x, focal_y, max_memory=self._max_memory)
+            resolution_factors = self._limited_factors(resolution_factors, x, y, settings)
+            field, x, y = propagators.resize_resolution_batched(field, x, y, *resolution_factors,
+                                                                max_memory=self._max_memory)
+
+        field = propagators.apply_thin_lens_batched(field, x, y, wavefront.wavelengths(), focal_x, focal_y,
+                                                    self._max_memory, out=None if field is wavefront.field() else field)
+
+        return wavefront.new_wavefront(field, x, y)
+
+    def _resize(self, wavefront, settings):
+        """
+        Applies the resize factors set explicitly, chunk by chunk.
+        """
+        field, x, y = propagators.resize_range_batched(wavefront.field(), wavefront.x(), wavefront.y(),
+                                                       *settings.resize_factors(), max_memory=self._max_memory)
+        return propagators.resize_resolution_batched(field, x, y, *settings.resize_resolutions(),
+                                                     max_memory=self._max_memory)
+
+    def _limited_factors(self, factors, x, y, settings):
+        # Automatic resizing never grows the mesh beyond max_points, but does not shrink it either.
+        return tuple(min(factor, max(1.0, settings.max_points() / float(len(coordinates))))
+                     for factor, coordinates in zip(factors, (x, y)))
+
+    def calculate_intensity(self, radiation):
+        """
+        Calculates intensity of the radiation.
+        :param radiation: FourierOpticsWavefront received from self.calculate_radiation
+        :return: Intensity summed over all energies.
+        """
+        wavefront = radiation
+        intensity = propagators.intensity_batched(wavefront.field(), self._max_memory)
+
+        return [intensity, wavefront.x(), wavefront.y()]
+
+    def calculate_phase(self, radiation):
+        """
+        Calculates phases of the radiation.
+        :param radiation: FourierOpticsWavefront received from self.calculate_radiation
+        :return: Phases of the first energy.
+        """
+        wavefront = radiation
+        phase = wavefront.phase()[0]
+
+        return [phase, wavefront.x(), wavefront.y()]
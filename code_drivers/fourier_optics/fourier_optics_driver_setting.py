@@ -0,0 +1,7 @@
+from optics.driver.abstract_driver_setting import AbstractDriverSetting
+
+class FourierOpticsDriverSetting(AbstractDriverSetting):
+    _driver_path = "code_drivers.fourier_optics.fourier_optics_driver.FourierOpticsDriver"
+
+    def __init__(self):
+        AbstractDriverSetting.__init__(self)
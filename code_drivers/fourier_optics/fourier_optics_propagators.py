@@ -0,0 +1,631 @@
+"""
+Vectorized Fourier optics propagators and phase screens.
+
+All functions work on complex fields sampled on regular meshes. The transverse axes (x, y) are the last two axes
+of the field array. Any leading axes, e.g. photon energies, are propagated in the same call; the wavelength then
+has to broadcast against the leading axes.
+
+Propagation modes (see e.g. D. Voelz, Computational Fourier Optics):
+    transfer function:  Fresnel transfer function, sampled well for short distances.
+    impulse response:   Fresnel impulse response, sampled well for long distances.
+    angular spectrum:   Exact transfer function of free space, for short distances beyond the paraxial regime.
+
+Polychromatic fields are stacked as (n_energies, n_x, n_y). The batched functions process them in chunks of energy
+slices, each chunk with one FFT over the transverse axes and the transfer functions of its wavelengths, such that the
+temporary arrays stay below a memory cap. Resizing and the estimates of the resize factors are chunked the same way.
+A single slice is never split, i.e. the cap can not be kept below the temporaries of one slice.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import numpy as np
+import scipy.constants.codata
+
+codata = scipy.constants.codata.physical_constants
+_SPEED_OF_LIGHT = codata["speed of light in vacuum"][0]
+_PLANCK_CONSTANT = codata["Planck constant"][0]
+_ELEMENTARY_CHARGE = codata["elementary charge"][0]
+
+AUTO = "auto"
+TRANSFER_FUNCTION = "transfer_function"
+IMPULSE_RESPONSE = "impulse_response"
+ANGULAR_SPECTRUM = "angular_spectrum"
+
+PROPAGATION_MODES = (AUTO, TRANSFER_FUNCTION, IMPULSE_RESPONSE, ANGULAR_SPECTRUM)
+
+# Memory in bytes that the temporary arrays of one chunk of energy slices may use.
+DEFAULT_MAX_MEMORY = 512 * 1024**2
+
+# Complex temporaries per energy slice while propagating: spectrum, transfer function, product and inverse transform.
+_TEMPORARIES_PER_SLICE = 4
+
+# Complex temporaries per energy slice while resizing, on the larger of the two meshes: the spectra, their shifts and
+# the inverse transform of the Fourier resampling, not all alive at once.
+_RESIZE_TEMPORARIES_PER_SLICE = 4
+
+# Complex temporaries per energy slice while estimating the resize factors: intensity and its moments, phase gradient,
+# spectrum.
+_FACTOR_TEMPORARIES_PER_SLICE = 5
+
+
+def wavelength_from_energy(energy):
+    """
+    :param energy: Photon energy in eV. Scalar or array.
+    :return: Wavelength in m.
+    """
+    return _PLANCK_CONSTANT * _SPEED_OF_LIGHT / (_ELEMENTARY_CHARGE * np.asarray(energy, dtype=float))
+
+
+def fresnel_number(width, wavelength, distance):
+    """
+    Fresnel number of a mesh of the given full width.
+    :param width: Full width of the mesh in m.
+    :param wavelength: Wavelength in m.
+    :param distance: Propagation distance in m.
+    :return: width^2 / (wavelength * distance)
+    """
+    return width**2 / (wavelength * abs(distance))
+
+
+def choose_propagation_mode(width_x, n_x, width_y, n_y, wavelength, distance, paraxial_limit=0.1):
+    """
+    Chooses the propagator from the Fresnel number of the mesh.
+
+    The transfer function samples its chirp without aliasing if the Fresnel number N_F is at least the number of
+    mesh points n (i.e. dx >= wavelength*distance/width), the impulse response if N_F is at most n.
+    For fields that do not fill the spectrum of the mesh, n may be the space-bandwidth product
+    2*width*occupied_bandwidth instead (see occupied_bandwidth).
+    The two axes are combined by the geometric mean of N_F/n.
+    If the transfer function is chosen but the mesh is seen under an angle width/distance = N_F*wavelength/width
+    beyond the paraxial limit the angular spectrum is used instead.
+
+    :param width_x: Full horizontal width of the mesh in m.
+    :param n_x: Number of horizontal mesh points.
+    :param width_y: Full vertical width of the mesh in m.
+    :param n_y: Number of vertical mesh points.
+    :param wavelength: Wavelength in m. For multiple wavelengths pass the shortest one.
+    :param distance: Propagation distance in m.
+    :param paraxial_limit: Maximal angle in rad for which the paraxial approximation is accepted.
+    :return: One of TRANSFER_FUNCTION, IMPULSE_RESPONSE, ANGULAR_SPECTRUM.
+    """
+    sampling_ratio = np.sqrt(fresnel_number(width_x, wavelength, distance) / n_x *
+                             fresnel_number(width_y, wavelength, distance) / n_y)
+
+    if sampling_ratio < 1.0:
+        return IMPULSE_RESPONSE
+
+    if max(width_x, width_y) / abs(distance) > paraxial_limit:
+        return ANGULAR_SPECTRUM
+
+    return TRANSFER_FUNCTION
+
+
+def occupied_bandwidth(field, dx, dy, threshold=1e-4):
+    """
+    Highest spatial frequencies at which the spectrum of the field carries more than threshold of its peak.
+    :return: (f_x, f_y) in 1/m.
+    """
+    spectrum = np.abs(np.fft.fft2(field, axes=(-2, -1)))**2
+    spectrum = spectrum.reshape((-1,) + spectrum.shape[-2:]).sum(axis=0)
+    significant = spectrum > threshold * spectrum.max()
+
+    n_x, n_y = spectrum.shape
+    f_x = np.abs(np.fft.fftfreq(n_x, dx))[significant.any(axis=1)]
+    f_y = np.abs(np.fft.fftfreq(n_y, dy))[significant.any(axis=0)]
+
+    return (f_x.max() if len(f_x) else 0.0), (f_y.max() if len(f_y) else 0.0)
+
+
+def _leading(wavelength):
+    # Appends the transverse axes, i.e. wavelengths broadcast against the leading axes of the field.
+    return np.asarray(wavelength, dtype=float)[..., np.newaxis, np.newaxis]
+
+
+def _spatial_frequencies(n_x, dx, n_y, dy):
+    f_x = np.fft.fftfreq(n_x, dx)[:, np.newaxis]
+    f_y = np.fft.fftfreq(n_y, dy)[np.newaxis, :]
+    return f_x, f_y
+
+
+def _centered_coordinates(n_x, dx, n_y, dy):
+    x = ((np.arange(n_x) - n_x // 2) * dx)[:, np.newaxis]
+    y = ((np.arange(n_y) - n_y // 2) * dy)[np.newaxis, :]
+    return x, y
+
+
+def transfer_function(n_x, dx, n_y, dy, wavelength, distance):
+    """
+    Fresnel transfer function in FFT order.
+    :return: Complex array (..., n_x, n_y) with the leading axes of wavelength.
+    """
+    wavelength = _leading(wavelength)
+    f_x, f_y = _spatial_frequencies(n_x, dx, n_y, dy)
+
+    return np.exp(2j * np.pi * distance / wavelength) * \
+           np.exp(-1j * np.pi * wavelength * distance * (f_x**2 + f_y**2))
+
+
+def impulse_response_transfer_function(n_x, dx, n_y, dy, wavelength, distance):
+    """
+    Transfer function obtained from the sampled Fresnel impulse response.
+    :return: Complex array (..., n_x, n_y) with the leading axes of wavelength.
+    """
+    wavelength = _leading(wavelength)
+    x, y = _centered_coordinates(n_x, dx, n_y, dy)
+
+    impulse_response = np.exp(2j * np.pi * distance / wavelength) / (1j * wavelength * distance) * \
+                       np.exp(1j * np.pi / (wavelength * distance) * (x**2 + y**2))
+    impulse_response = np.fft.ifftshift(impulse_response, axes=(-2, -1))
+
+    return np.fft.fft2(impulse_response) * dx * dy
+
+
+def angular_spectrum_transfer_function(n_x, dx, n_y, dy, wavelength, distance):
+    """
+    Exact transfer function of free space. Evanescent waves are suppressed.
+    :return: Complex array (..., n_x, n_y) with the leading axes of wavelength.
+    """
+    wavelength = _leading(wavelength)
+    f_x, f_y = _spatial_frequencies(n_x, dx, n_y, dy)
+
+    argument = 1.0 - (wavelength * f_x)**2 - (wavelength * f_y)**2
+    propagating = argument > 0.0
+
+    return np.where(propagating,
+                    np.exp(2j * np.pi * distance / wavelength * np.sqrt(np.where(propagating, argument, 0.0))),
+                    0.0)
+
+
+_TRANSFER_FUNCTIONS = {TRANSFER_FUNCTION: transfer_function,
+                       IMPULSE_RESPONSE: impulse_response_transfer_function,
+                       ANGULAR_SPECTRUM: angular_spectrum_transfer_function}
+
+
+def propagate(field, dx, dy, wavelength, distance, mode=AUTO):
+    """
+    Propagates a field through free space. The mesh does not change.
+    :param field: Complex array (..., n_x, n_y).
+    :param dx: Horizontal mesh step in m.
+    :param dy: Vertical mesh step in m.
+    :param wavelength: Wavelength in m, scalar or broadcasting against the leading axes of field.
+    :param distance: Propagation distance in m.
+    :param mode: One of PROPAGATION_MODES.
+    :return: Propagated field with the shape of field.
+    """
+    if mode == AUTO:
+        mode = _choose_mode_for_field(field, dx, dy, wavelength, distance)
+
+    if mode not in _TRANSFER_FUNCTIONS:
+        raise Exception("Unknown propagation mode: %s" % mode)
+
+    n_x, n_y = field.shape[-2:]
+    transfer = _TRANSFER_FUNCTIONS[mode](n_x, dx, n_y, dy, wavelength, distance)
+
+    return np.fft.ifft2(np.fft.fft2(field, axes=(-2, -1)) * transfer, axes=(-2, -1))
+
+
+def _choose_mode_for_field(field, dx, dy, wavelength, distance, bandwidth=None):
+    # Compare the Fresnel number with the space-bandwidth product of the field, not of the mesh.
+    n_x, n_y = field.shape[-2:]
+    bandwidth_x, bandwidth_y = occupied_bandwidth(field, dx, dy) if bandwidth is None else bandwidth
+
+    return choose_propagation_mode(n_x * dx, max(min(n_x, 2 * n_x * dx * bandwidth_x), 1.0),
+                                   n_y * dy, max(min(n_y, 2 * n_y * dy * bandwidth_y), 1.0),
+                                   np.min(wavelength), distance)
+
+
+def slices_per_chunk(n_x, n_y, max_memory=DEFAULT_MAX_MEMORY, temporaries_per_slice=_TEMPORARIES_PER_SLICE):
+    """
+    :return: Number of energy slices whose complex temporaries fit into max_memory bytes, at least 1.
+    """
+    slice_memory = temporaries_per_slice * n_x * n_y * np.dtype(np.complex128).itemsize
+    return max(1, int(max_memory // slice_memory))
+
+
+def energy_chunks(n_energies, n_x, n_y, max_memory=DEFAULT_MAX_MEMORY, temporaries_per_slice=_TEMPORARIES_PER_SLICE):
+    """
+    Splits the energy axis into chunks that fit into max_memory bytes.
+    :return: Generator of slice objects over the energy axis.
+    """
+    chunk = slices_per_chunk(n_x, n_y, max_memory, temporaries_per_slice)
+    for start in range(0, n_energies, chunk):
+        yield slice(start, min(start + chunk, n_energies))
+
+
+def _as_stack(field, wavelengths):
+    field = np.asarray(field)
+    if field.ndim == 2:
+        field = field[np.newaxis, :, :]
+
+    wavelengths = np.broadcast_to(np.asarray(wavelengths, dtype=float), field.shape[:1])
+
+    return field, wavelengths
+
+
+def _output_stack(field, out):
+    if out is None:
+        return np.empty(field.shape, dtype=np.result_type(field.dtype, np.complex64))
+
+    if out.shape != field.shape:
+        raise Exception("Output shape %s does not match field shape %s." % (str(out.shape), str(field.shape)))
+
+    return out
+
+
+def propagate_batched(field, dx, dy, wavelengths, distance, mode=AUTO, max_memory=DEFAULT_MAX_MEMORY, out=None):
+    """
+    Propagates a stack of energy slices through free space, chunk by chunk. Each slice is propagated with the
+    transfer function of its own wavelength. With mode AUTO the propagator is chosen once for the whole stack, from
+    the shortest wavelength and the bandwidth occupied by any slice, such that all slices are treated alike.
+    :param field: Complex array (n_energies, n_x, n_y).
+    :param dx: Horizontal mesh step in m.
+    :param dy: Vertical mesh step in m.
+    :param wavelengths: Wavelengths in m, one per slice (or a scalar for all).
+    :param distance: Propagation distance in m.
+    :param mode: One of PROPAGATION_MODES.
+    :param max_memory: Memory cap in bytes for the temporaries of one chunk.
+    :param out: Optional array to write the result to. May be field itself to propagate in place.
+    :return: Propagated field (n_energies, n_x, n_y).
+    """
+    field, wavelengths = _as_stack(field, wavelengths)
+    n_energies, n_x, n_y = field.shape
+    chunks = list(energy_chunks(n_energies, n_x, n_y, max_memory))
+
+    if mode == AUTO:
+        bandwidths = np.array([occupied_bandwidth(field[chunk], dx, dy) for chunk in chunks])
+        mode = _choose_mode_for_field(field, dx, dy, wavelengths, distance, tuple(bandwidths.max(axis=0)))
+
+    out = _output_stack(field, out)
+    for chunk in chunks:
+        out[chunk] = propagate(field[chunk], dx, dy, wavelengths[chunk], distance, mode)
+
+    return out
+
+
+def apply_thin_lens_batched(field, x, y, wavelengths, focal_x, focal_y, max_memory=DEFAULT_MAX_MEMORY, out=None):
+    """
+    Multiplies a stack of energy slices with the phase screens of an ideal thin lens, chunk by chunk.
+    :param field: Complex array (n_energies, n_x, n_y).
+    :param wavelengths: Wavelengths in m, one per slice (or a scalar for all).
+    :param out: Optional array to write the result to. May be field itself.
+    :return: Field behind the lens (n_energies, n_x, n_y).
+    """
+    field, wavelengths = _as_stack(field, wavelengths)
+    n_energies, n_x, n_y = field.shape
+
+    out = _output_stack(field, out)
+    for chunk in energy_chunks(n_energies, n_x, n_y, max_memory, temporaries_per_slice=2):
+        out[chunk] = field[chunk] * thin_lens_transmission(x, y, wavelengths[chunk], focal_x, focal_y)
+
+    return out
+
+
+def intensity_batched(field, max_memory=DEFAULT_MAX_MEMORY):
+    """
+    Intensity summed over all energy slices, accumulated chunk by chunk.
+    :param field: Complex array (n_energies, n_x, n_y).
+    :return: Array (n_x, n_y).
+    """
+    field = np.asarray(field)
+    field = field.reshape((-1,) + field.shape[-2:])
+    n_energies, n_x, n_y = field.shape
+
+    intensity = np.zeros((n_x, n_y))
+    for chunk in energy_chunks(n_energies, n_x, n_y, max_memory, temporaries_per_slice=2):
+        intensity += (field[chunk].real**2 + field[chunk].imag**2).sum(axis=0)
+
+    return intensity
+
+
+def thin_lens_transmission(x, y, wavelength, focal_x, focal_y):
+    """
+    Phase screen of an ideal thin lens centered on the optical axis.
+    :param x: Horizontal coordinates in m.
+    :param y: Vertical coordinates in m.
+    :param wavelength: Wavelength in m, scalar or array over the leading axes.
+    :param focal_x: Horizontal focal length in m. Infinite for no focusing.
+    :param focal_y: Vertical focal length in m. Infinite for no focusing.
+    :return: Complex array (..., n_x, n_y).
+    """
+    wavelength = _leading(wavelength)
+    x = np.asarray(x)[:, np.newaxis]
+    y = np.asarray(y)[np.newaxis, :]
+
+    return np.exp(-1j * np.pi / wavelength * (x**2 / focal_x + y**2 / focal_y))
+
+
+def resize_range(field, x, y, factor_x, factor_y):
+    """
+    Changes the range of the mesh keeping the mesh step, i.e. zero pads (factor > 1) or crops (factor < 1)
+    symmetrically.
+    :return: (field, x, y) on the new mesh.
+    """
+    field, x = _resize_range_axis(field, x, factor_x, -2)
+    field, y = _resize_range_axis(field, y, factor_y, -1)
+    return field, x, y
+
+
+def _resized_length(n, factor):
+    return max(int(round(n * factor)), 2)
+
+
+def _resize_range_axis(field, coordinates, factor, axis):
+    n = len(coordinates)
+    n_new = _resized_length(n, factor)
+
+    if n_new == n:
+        return field, coordinates
+
+    step = coordinates[1] - coordinates[0]
+    shift = (n_new - n) // 2
+    new_coordinates = coordinates[0] + (np.arange(n_new) - shift) * step
+
+    shape = list(field.shape)
+    shape[axis] = n_new
+    new_field = np.zeros(shape, dtype=field.dtype)
+
+    if n_new > n:
+        target = [slice(None)] * field.ndim
+        target[axis] = slice(shift, shift + n)
+        new_field[tuple(target)] = field
+    else:
+        source = [slice(None)] * field.ndim
+        source[axis] = slice(-shift, -shift + n_new)
+        new_field[...] = field[tuple(source)]
+
+    return new_field, new_coordinates
+
+
+def resize_resolution(field, x, y, factor_x, factor_y):
+    """
+    Changes the number of mesh points keeping the range. The field is resampled in Fourier space (zero padding or
+    cropping of the spectrum), which is exact for fields sampled with phase steps below pi. Linear interpolation of
+    the complex values would average neighbouring phasors and lose intensity wherever the phase varies quickly,
+    e.g. for a strongly curved wavefront in front of a lens.
+    :return: (field, x, y) on the new mesh.
+    """
+    field, x = _resize_resolution_axis(field, x, factor_x, -2)
+    field, y = _resize_resolution_axis(field, y, factor_y, -1)
+    return field, x, y
+
+
+def _resize_resolution_axis(field, coordinates, factor, axis):
+    n = len(coordinates)
+    n_new = _resized_length(n, factor)
+
+    if n_new == n:
+        return field, coordinates
+
+    # The mesh covers the period n * step of the discrete Fourier transform. The new points cover the same period.
+    step = (coordinates[1] - coordinates[0]) * n / float(n_new)
+    new_coordinates = coordinates[0] + np.arange(n_new) * step
+
+    spectrum = np.fft.fftshift(np.fft.fft(field, axis=axis), axes=axis)
+
+    shape = list(field.shape)
+    shape[axis] = n_new
+    new_spectrum = np.zeros(shape, dtype=np.result_type(field.dtype, np.complex64))
+
+    common = min(n, n_new)
+    source = [slice(None)] * field.ndim
+    target = [slice(None)] * field.ndim
+    source[axis] = slice(n // 2 - common // 2, n // 2 - common // 2 + common)
+    target[axis] = slice(n_new // 2 - common // 2, n_new // 2 - common // 2 + common)
+    new_spectrum[tuple(target)] = spectrum[tuple(source)]
+
+    new_field = np.fft.ifft(np.fft.ifftshift(new_spectrum, axes=axis), axis=axis) * (n_new / float(n))
+
+    return new_field, new_coordinates
+
+
+def resize_range_batched(field, x, y, factor_x, factor_y, max_memory=DEFAULT_MAX_MEMORY):
+    """
+    Changes the range of the mesh of a stack of energy slices chunk by chunk, see resize_range.
+    :param field: Complex array (n_energies, n_x, n_y).
+    :param max_memory: Memory cap in bytes for the temporaries of one chunk.
+    :return: (field, x, y) on the new mesh. The field is a new array unless the mesh does not change.
+    """
+    return _resize_batched(resize_range, field, x, y, factor_x, factor_y, max_memory)
+
+
+def resize_resolution_batched(field, x, y, factor_x, factor_y, max_memory=DEFAULT_MAX_MEMORY):
+    """
+    Changes the number of mesh points of a stack of energy slices chunk by chunk, see resize_resolution.
+    :param field: Complex array (n_energies, n_x, n_y).
+    :param max_memory: Memory cap in bytes for the temporaries of one chunk.
+    :return: (field, x, y) on the new mesh. The field is a new array unless the mesh does not change.
+    """
+    return _resize_batched(resize_resolution, field, x, y, factor_x, factor_y, max_memory)
+
+
+def _resize_batched(resize, field, x, y, factor_x, factor_y, max_memory):
+    field = np.asarray(field)
+    if field.ndim == 2:
+        field = field[np.newaxis, :, :]
+
+    n_energies, n_x, n_y = field.shape
+    n_x_new = _resized_length(n_x, factor_x)
+    n_y_new = _resized_length(n_y, factor_y)
+
+    if (n_x_new, n_y_new) == (n_x, n_y):
+        return field, x, y
+
+    # Each chunk is resized to its own temporaries and copied into the output, which is allocated once.
+    out = np.empty((n_energies, n_x_new, n_y_new), dtype=np.result_type(field.dtype, np.complex64))
+    for chunk in energy_chunks(n_energies, max(n_x, n_x_new), max(n_y, n_y_new), max_memory,
+                               _RESIZE_TEMPORARIES_PER_SLICE):
+        resized, new_x, new_y = resize(field[chunk], x, y, factor_x, factor_y)
+        out[chunk] = resized
+        del resized
+
+    return out, new_x, new_y
+
+
+def edge_intensity_fraction(field, edge_fraction=0.05):
+    """
+    :return: Fraction of the total intensity within the outer edge_fraction of the mesh, i.e. the part that
+             wraps around in FFT based propagation.
+    """
+    intensity = np.abs(field)**2
+    intensity = intensity.reshape((-1,) + intensity.shape[-2:]).sum(axis=0)
+
+    total = intensity.sum()
+    if total == 0.0:
+        return 0.0
+
+    n_x, n_y = intensity.shape
+    edge_x = max(int(n_x * edge_fraction), 1)
+    edge_y = max(int(n_y * edge_fraction), 1)
+    inner = intensity[edge_x:n_x - edge_x, edge_y:n_y - edge_y].sum()
+
+    return (total - inner) / total
+
+
+def _factor_chunks(field, wavelength, max_memory):
+    # (field, wavelength) per chunk of energy slices, as views. The leading axes of the field are flattened into one.
+    field = np.asarray(field)
+    leading_shape = field.shape[:-2]
+    field = field.reshape((-1,) + field.shape[-2:])
+    if wavelength is not None:
+        wavelength = np.broadcast_to(np.asarray(wavelength, dtype=float), leading_shape).reshape(-1)
+
+    if max_memory is None:
+        return [(field, wavelength)]
+
+    n_energies, n_x, n_y = field.shape
+    return [(field[chunk], None if wavelength is None else wavelength[chunk])
+            for chunk in energy_chunks(n_energies, n_x, n_y, max_memory, _FACTOR_TEMPORARIES_PER_SLICE)]
+
+
+def _neighbour_product(field, axis):
+    upper = [slice(None)] * field.ndim
+    lower = [slice(None)] * field.ndim
+    upper[axis] = slice(1, None)
+    lower[axis] = slice(None, -1)
+    return field[tuple(upper)] * np.conj(field[tuple(lower)])
+
+
+def _largest_phase_step(field, coordinates, axis, wavelength, focal, threshold):
+    # Phase step of the field itself, from the product of neighbouring points.
+    neighbour_product = _neighbour_product(field, axis)
+    phase_step = np.angle(neighbour_product)
+
+    if wavelength is not None and np.isfinite(focal):
+        step = coordinates[1] - coordinates[0]
+        midpoints = 0.5 * (coordinates[1:] + coordinates[:-1])
+        shape = [1] * field.ndim
+        shape[axis] = len(midpoints)
+        lens_gradient = -2.0 * np.pi / (_leading(wavelength) * focal) * midpoints.reshape(shape)
+        phase_step = phase_step + lens_gradient * step
+
+    significant = np.abs(neighbour_product) > threshold
+    if not significant.any():
+        return 0.0
+
+    return float(np.abs(np.broadcast_to(phase_step, neighbour_product.shape)[significant]).max())
+
+
+def required_resolution_factors(field, x, y, wavelength=None, focal_x=np.inf, focal_y=np.inf, max_phase_step=0.5*np.pi,
+                                max_memory=None):
+    """
+    Estimates by how much the mesh must be refined such that the phase of the field changes by at most
+    max_phase_step between neighbouring points. If a lens is given, the phase of its screen is included, i.e. the
+    result is the refinement needed before the lens is applied.
+    Only points carrying noticeable intensity are considered.
+    :param max_memory: Memory cap in bytes for the temporaries of one chunk of energy slices. None for one chunk.
+    :return: (factor_x, factor_y), both >= 1.
+    """
+    chunks = _factor_chunks(field, wavelength, max_memory)
+
+    factors = []
+    for axis, coordinates, focal in ((-2, x, focal_x), (-1, y, focal_y)):
+        # Noticeable relative to the peak of all slices: one pass for the peak, one for the phase steps.
+        peak = max(float(np.abs(_neighbour_product(chunk, axis)).max()) for chunk, _ in chunks)
+        if peak == 0.0:
+            factors.append(1.0)
+            continue
+
+        largest_step = max(_largest_phase_step(chunk, coordinates, axis, chunk_wavelength, focal, 1e-6 * peak)
+                           for chunk, chunk_wavelength in chunks)
+        factors.append(max(1.0, float(np.ceil(largest_step / max_phase_step))))
+
+    return tuple(factors)
+
+
+def _growth_and_walk_off(field, coordinates, axis, wavelength, distance):
+    # Largest rms width growth and centroid walk-off of the slices of a (n_energies, n_x, n_y) field.
+    step = coordinates[1] - coordinates[0]
+    other_axis = -1 if axis == -2 else -2
+
+    intensity = np.abs(field)**2
+
+    shape = [1] * field.ndim
+    shape[axis] = len(coordinates)
+    position = coordinates.reshape(shape)
+
+    # Moments per slice, normalized by the intensity of the slice.
+    norm = intensity.sum(axis=(-2, -1))
+    norm = np.where(norm > 0.0, norm, 1.0)
+    mean_x = (intensity * position).sum(axis=(-2, -1)) / norm
+    variance_x = (intensity * position**2).sum(axis=(-2, -1)) / norm - mean_x**2
+    del intensity
+
+    # Angles theta = wavelength/(2 pi) dphi/dx, from the local phase gradient and from the spectrum.
+    phase_gradient = np.imag(np.conj(field) * np.gradient(field, step, axis=axis))
+    mean_theta = wavelength / (2*np.pi) * phase_gradient.sum(axis=(-2, -1)) / norm
+    covariance = wavelength / (2*np.pi) * (phase_gradient * position).sum(axis=(-2, -1)) / norm - mean_x * mean_theta
+    del phase_gradient
+
+    spectrum = np.abs(np.fft.fft(field, axis=axis))**2
+    spectrum = spectrum.sum(axis=other_axis)
+    frequencies = np.fft.fftfreq(len(coordinates), step)
+    spectrum_norm = spectrum.sum(axis=-1)
+    spectrum_norm = np.where(spectrum_norm > 0.0, spectrum_norm, 1.0)
+    mean_frequency = (spectrum * frequencies).sum(axis=-1) / spectrum_norm
+    variance_theta = wavelength**2 * ((spectrum * frequencies**2).sum(axis=-1) / spectrum_norm - mean_frequency**2)
+
+    variance_z = variance_x + 2.0 * distance * covariance + distance**2 * variance_theta
+    growth = np.sqrt(np.maximum(variance_z, 0.0) / np.where(variance_x > 0.0, variance_x, np.inf))
+
+    # The centroid may walk off as well.
+    walk_off = np.abs(mean_theta) * abs(distance)
+
+    return float(np.max(growth)), float(np.max(walk_off))
+
+
+def required_range_factors(field, x, y, wavelength, distance, margin=1.2, threshold=1e-4, max_memory=None):
+    """
+    Estimates by how much the mesh range must grow such that the field still fits after propagating the given
+    distance. The rms width after propagation follows exactly from the second moments of the field (paraxial
+    optics): sigma(z)^2 = <x^2> + 2 z <x theta> + z^2 <theta^2>. The footprint of the points carrying more than
+    threshold of the peak intensity is scaled by sigma(z)/sigma(0). Converging fields therefore do not grow the mesh.
+    :param field: Complex array (..., n_x, n_y).
+    :param wavelength: Wavelength in m, scalar or broadcasting against the leading axes of field.
+    :param max_memory: Memory cap in bytes for the temporaries of one chunk of energy slices. None for one chunk.
+    :return: (factor_x, factor_y), both >= 1.
+    """
+    chunks = _factor_chunks(field, wavelength, max_memory)
+
+    total_intensity = sum((np.abs(chunk)**2).sum(axis=0) for chunk, _ in chunks)
+    if not total_intensity.any():
+        return 1.0, 1.0
+
+    significant = total_intensity > threshold * total_intensity.max()
+
+    factors = []
+    for axis, coordinates in ((-2, x), (-1, y)):
+        step = coordinates[1] - coordinates[0]
+        other_axis = -1 if axis == -2 else -2
+
+        inside = significant.any(axis=other_axis)
+        footprint = coordinates[inside]
+        footprint_width = footprint[-1] - footprint[0] + step
+
+        spreads = [_growth_and_walk_off(chunk, coordinates, axis, chunk_wavelength, distance)
+                   for chunk, chunk_wavelength in chunks]
+        growth = max(spread[0] for spread in spreads)
+        walk_off = max(spread[1] for spread in spreads)
+
+        width_needed = margin * (footprint_width * max(growth, 1.0) + 2.0 * walk_off)
+        factors.append(max(1.0, width_needed / (len(coordinates) * step)))
+
+    return tuple(factors)
@@ -0,0 +1,23 @@
+"""
+Implements Fourier optics source settings.
+
+The Fourier optics driver propagates a given complex field. For a source it needs the initial wavefront, e.g.
+calculated by another code or from an analytic model.
+"""
+from code_drivers.fourier_optics.fourier_optics_driver_setting import FourierOpticsDriverSetting
+
+
+class FourierOpticsSourceSetting(FourierOpticsDriverSetting):
+    def __init__(self, wavefront=None):
+        FourierOpticsDriverSetting.__init__(self)
+
+        self._wavefront = wavefront
+
+    def set_wavefront(self, wavefront):
+        self._wavefront = wavefront
+
+    def wavefront(self):
+        return self._wavefront
+
+    def has_wavefront(self):
+        return self._wavefront is not None
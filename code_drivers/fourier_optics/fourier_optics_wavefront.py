@@ -0,0 +1,84 @@
+"""
+Complex field on a regular mesh. Result object of the Fourier optics driver.
+
+The field is stored as array (n_energies, n_x, n_y) together with the mesh coordinates, the photon energies and the
+longitudinal position. Propagation never modifies a wavefront but creates a new one.
+"""
+import numpy as np
+
+from optics.driver.abstract_driver_result import AbstractDriverResult
+
+from code_drivers.fourier_optics.fourier_optics_propagators import wavelength_from_energy
+
+
+class FourierOpticsWavefront(AbstractDriverResult):
+    def __init__(self, field, x, y, energies, z):
+        """
+        Constructor.
+        :param field: Complex array (n_energies, n_x, n_y) or (n_x, n_y) for a single energy.
+        :param x: Horizontal coordinates in m (regular).
+        :param y: Vertical coordinates in m (regular).
+        :param energies: Photon energies in eV, one per field slice.
+        :param z: Longitudinal position in m.
+        """
+        AbstractDriverResult.__init__(self)
+
+        field = np.asarray(field)
+        if field.ndim == 2:
+            field = field[np.newaxis, :, :]
+
+        self._field = field
+        self._x = np.asarray(x, dtype=float)
+        self._y = np.asarray(y, dtype=float)
+        self._energies = np.atleast_1d(np.asarray(energies, dtype=float))
+        self._z = z
+
+        if self._field.shape != (len(self._energies), len(self._x), len(self._y)):
+            raise Exception("Field shape %s does not match mesh (%d, %d, %d)." %
+                            (str(self._field.shape), len(self._energies), len(self._x), len(self._y)))
+
+    def field(self):
+        return self._field
+
+    def x(self):
+        return self._x
+
+    def y(self):
+        return self._y
+
+    def dx(self):
+        return self._x[1] - self._x[0]
+
+    def dy(self):
+        return self._y[1] - self._y[0]
+
+    def energies(self):
+        return self._energies
+
+    def wavelengths(self):
+        return wavelength_from_energy(self._energies)
+
+    def z(self):
+        return self._z
+
+    def intensity(self):
+        """
+        :return: Intensity per energy, array (n_energies, n_x, n_y).
+        """
+        return self._field.real**2 + self._field.imag**2
+
+    def phase(self):
+        """
+        :return: Phase per energy, array (n_energies, n_x, n_y).
+        """
+        return np.angle(self._field)
+
+    def new_wavefront(self, field, x=None, y=None, z=None):
+        """
+        Creates a wavefront with the same energies and, unless given, the same mesh and position.
+        """
+        return FourierOpticsWavefront(field,
+                                      self._x if x is None else x,
+                                      self._y if y is None else y,
+                                      self._energies,
+                                      self._z if z is None else z)
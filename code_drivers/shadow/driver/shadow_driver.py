@@ -37,11 +37,12 @@ class ShadowDriver(AbstractDriver):
         """
         if isinstance(magnetic_structure, BendingMagnet):
             # If BendingMagnet is not configured for shadow add default settings.
-            if not magnetic_structure.has_settings(ShadowDriver()):
+            if not magnetic_structure.has_settings(self):
                 magnetic_structure.add_settings(ShadowBendingMagnetSetting())
 
-            # Create a ShadowSource for shadow API.
-            shadow_source = ShadowBendingMagnet(electron_beam, magnetic_structure, energy_min, energy_max)
+            # Create a ShadowSource for shadow API. It runs on a snapshot of the settings taken now.
+            shadow_source = ShadowBendingMagnet(electron_beam, magnetic_structure, energy_min, energy_max,
+                                                magnetic_structure.settings(self).snapshot())
         else:
             raise NotImplementedError("Only Bending Magnet implemented right now")
 
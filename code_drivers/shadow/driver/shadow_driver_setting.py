@@ -2,8 +2,7 @@ from optics.driver.abstract_driver_setting import AbstractDriverSetting
 
 
 class ShadowDriverSetting(AbstractDriverSetting):
+    _driver_path = "code_drivers.shadow.driver.shadow_driver.ShadowDriver"
 
     def __init__(self):
-        from code_drivers.shadow.driver.shadow_driver import ShadowDriver
-        AbstractDriverSetting.__init__(self,
-                                       driver=ShadowDriver())
+        AbstractDriverSetting.__init__(self)
@@ -4,22 +4,36 @@ __author__ = 'labx'
 import Shadow
 import numpy
 
+from optics.beam.twiss import beam_moments, emittance
+
 from code_drivers.shadow.driver.shadow_driver_setting import ShadowDriverSetting
 from code_drivers.shadow.sources.shadow_source import ShadowSource
 
 class ShadowBendingMagnet(ShadowSource):
-    def __init__(self, electron_beam, bending_magnet, energy_min, energy_max):
+    def __init__(self, electron_beam, bending_magnet, energy_min, energy_max, settings=None):
+        """
+        :param settings: Snapshot of the ShadowBendingMagnetSetting to use. Defaults to a snapshot of the settings of
+                         the bending magnet, taken now.
+        """
         ShadowSource.__init__(self)
         self._electron_beam = electron_beam
         self._bending_magnet = bending_magnet
         self._energy_min = energy_min
         self._energy_max = energy_max
 
+        if settings is None:
+            settings = self._bending_magnet.settings(ShadowDriverSetting().driver_class()).snapshot()
+        self._settings = settings
+
     def newInstance(self):
         return ShadowBendingMagnet(self._electron_beam,
                                    self._bending_magnet,
                                    self._energy_min,
-                                   self._energy_max)
+                                   self._energy_max,
+                                   self._settings)
+
+    def settings(self):
+        return self._settings
 
     def toNativeShadowSource(self):
         src = Shadow.Source()
@@ -44,8 +58,7 @@ class ShadowBendingMagnet(ShadowSource):
         src.F_SR_TYPE = 0
 
 
-        from code_drivers.shadow.driver.shadow_driver import ShadowDriver
-        settings = self._bending_magnet.settings(ShadowDriver())
+        settings = self._settings
 
         # NOTE: photon energy is set on bending magnet.
         # Energy is sync to settings object to avoid possible side effects - if any possible.
@@ -62,10 +75,12 @@ class ShadowBendingMagnet(ShadowSource):
         src.F_POL = 1 + settings._generate_polarization
 
         #this come from electron beam
-        src.SIGMAX = 100.0*numpy.sqrt(self._electron_beam._moment_xx) #  settings._sigma_x
-        src.SIGMAZ = 100.0*numpy.sqrt(self._electron_beam._moment_yy) # settings._sigma_z
-        src.EPSI_X = 100.0*numpy.sqrt(self._electron_beam._moment_xx)*numpy.sqrt(self._electron_beam._moment_xpxp)
-        src.EPSI_Z = 100.0*numpy.sqrt(self._electron_beam._moment_yy)*numpy.sqrt(self._electron_beam._moment_ypyp)
+        moments_x, moments_y = beam_moments(self._electron_beam)
+        src.SIGMAX = 100.0*numpy.sqrt(moments_x[0]) #  settings._sigma_x
+        src.SIGMAZ = 100.0*numpy.sqrt(moments_y[0]) # settings._sigma_z
+        # Emittance including the correlation <x x'>, in cm rad.
+        src.EPSI_X = 100.0*float(emittance(moments_x))
+        src.EPSI_Z = 100.0*float(emittance(moments_y))
         src.EPSI_DX = settings._distance_from_waist_x
         src.EPSI_DZ = settings._distance_from_waist_z
 
@@ -92,8 +107,8 @@ class ShadowBendingMagnet(ShadowSource):
 
     #TODO remove this method? What's the interest? Do not set glossary objects from here...
     def fromNativeShadowSource(self, src):
-        from code_drivers.shadow.driver.shadow_driver import ShadowDriver
-        settings = self._bending_magnet.settings(ShadowDriver())
+        # The settings of the bending magnet are left alone: this source gets a new snapshot.
+        settings = self._settings.thaw()
 
         settings._number_of_rays=src.NPOINT
         settings._seed=src.ISTAR1
@@ -131,6 +146,8 @@ class ShadowBendingMagnet(ShadowSource):
         else:
             settings._max_number_of_rejected_rays = 10000000
 
+        self._settings = settings.snapshot()
+
 
 class ShadowBendingMagnetSetting(ShadowDriverSetting):
     def __init__(self):
@@ -7,6 +7,7 @@ Usually we would need to consider also the electron distribution within the beam
 """
 
 from optics.driver.driver_setting_manager import DriverSettingManager
+from optics.beam import twiss
 from collections import OrderedDict
 
 class ElectronBeam(DriverSettingManager):
@@ -37,6 +38,18 @@ class ElectronBeam(DriverSettingManager):
         #TODO: get the physical constant from a central repository
         return self._energy_in_GeV/0.51099890221e-03 # Relative Energy
 
+    def horizontal_moments(self):
+        return twiss.beam_moments(self)[0]
+
+    def vertical_moments(self):
+        return twiss.beam_moments(self)[1]
+
+    def horizontal_emittance(self):
+        return float(twiss.emittance(self.horizontal_moments()))
+
+    def vertical_emittance(self):
+        return float(twiss.emittance(self.vertical_moments()))
+
     def to_dictionary(self):
         #returns a dictionary with the variable names as keys, and a tuple with value, unit and doc string
         mytuple = [ ("energy_in_GeV"      ,( self._energy_in_GeV       ,"GeV",  "Electron beam energy"                   ) ),
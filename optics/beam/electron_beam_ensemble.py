@@ -0,0 +1,169 @@
+"""
+Ensemble of macro-electrons sampled from the moments of an ElectronBeam, stored as arrays.
+
+The phase space coordinates are kept as columns (x, x', y, y', delta) of one C-contiguous array, i.e. every
+coordinate of all electrons is contiguous in memory. delta is the relative energy deviation. The longitudinal position
+within the bunch is not sampled since ElectronBeam defines no bunch length.
+
+Each plane is sampled from its 2x2 moment matrix including the correlation <x x'>, via its Cholesky factor:
+
+    x  = sqrt(<x x>) u_1
+    x' = <x x'>/sqrt(<x x>) u_1 + sqrt(<x' x'> - <x x'>^2/<x x>) u_2
+
+with independent standard normal u_1, u_2. Degenerate planes (e.g. ElectronBeamPencil) sample zeros.
+
+Electrons are sampled in chunks, chunk k from a random state seeded with (seed, k). An ensemble is therefore the
+same whether sampled at once or chunk by chunk with iterate_chunks, and chunks can be sampled independently.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import numpy as np
+
+from optics.beam.electron_beam_pencil import ElectronBeamPencil
+from optics.beam.twiss import beam_moments
+
+COLUMNS = ("x", "xp", "y", "yp", "delta")
+
+# Electrons sampled per chunk by default.
+DEFAULT_CHUNK_SIZE = 2**20
+
+
+def _sample_plane(moment_uu, moment_uup, moment_upup, normals):
+    # Correlated Gaussian (u, u') from two standard normal rows.
+    if moment_uu > 0.0:
+        sigma = np.sqrt(moment_uu)
+        correlation = moment_uup / sigma
+        remainder = np.sqrt(max(moment_upup - correlation**2, 0.0))
+        return sigma * normals[0], correlation * normals[0] + remainder * normals[1]
+
+    return np.zeros_like(normals[0]), np.sqrt(max(moment_upup, 0.0)) * normals[1]
+
+
+def _check_moments(electron_beam):
+    for moments in beam_moments(electron_beam):
+        if moments[0] < 0.0 or moments[2] < 0.0 or moments[1]**2 > moments[0] * moments[2] * (1.0 + 1e-12):
+            raise Exception("The moments of the electron beam are no covariance matrix: %s" % str(moments))
+
+
+def _sample_chunk(electron_beam, n_electrons, seed, chunk_index):
+    random_state = np.random.RandomState([seed, chunk_index])
+    normals = random_state.standard_normal((5, n_electrons))
+
+    moments_x, moments_y = beam_moments(electron_beam)
+
+    data = np.empty((5, n_electrons))
+    data[0], data[1] = _sample_plane(*moments_x, normals=normals[0:2])
+    data[2], data[3] = _sample_plane(*moments_y, normals=normals[2:4])
+    data[4] = electron_beam._energy_spread * normals[4]
+
+    return data
+
+
+class ElectronBeamEnsemble(object):
+    def __init__(self, energy_in_GeV, current, data):
+        """
+        Constructor.
+        :param energy_in_GeV: Nominal electron energy.
+        :param current: Beam current in A, shared by all macro-electrons.
+        :param data: Array (5, n_electrons) of the columns x, x', y, y', delta. Not copied if its columns are
+                     contiguous.
+        """
+        data = np.asarray(data, dtype=float)
+        if data.ndim == 2 and data.strides[1] != data.itemsize:
+            # Columns must be contiguous; views of consecutive electrons (see chunks) already are.
+            data = np.ascontiguousarray(data)
+        if data.ndim != 2 or data.shape[0] != len(COLUMNS):
+            raise Exception("Ensemble data must have the shape (%d, n_electrons)." % len(COLUMNS))
+
+        self._energy_in_GeV = energy_in_GeV
+        self._current = current
+        self._data = data
+
+    @classmethod
+    def from_electron_beam(cls, electron_beam, n_electrons, seed=0, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Samples an ensemble.
+        :param electron_beam: ElectronBeam object.
+        :param n_electrons: Number of macro-electrons.
+        :param seed: Integer seed. Equal seeds and chunk sizes give equal ensembles.
+        :param chunk_size: Electrons per chunk of the sampling.
+        :return: ElectronBeamEnsemble.
+        """
+        data = np.empty((len(COLUMNS), n_electrons))
+        for start, chunk in _chunks(electron_beam, n_electrons, seed, chunk_size):
+            data[:, start:start + chunk.shape[1]] = chunk
+
+        return cls(electron_beam._energy_in_GeV, electron_beam._current, data)
+
+    @classmethod
+    def iterate_chunks(cls, electron_beam, n_electrons, seed=0, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Samples an ensemble lazily, chunk by chunk, without holding all electrons in memory.
+        :return: Generator of ElectronBeamEnsemble with at most chunk_size electrons each. Arguments as for
+                 from_electron_beam; the chunks concatenate to the ensemble it returns.
+        """
+        for _, chunk in _chunks(electron_beam, n_electrons, seed, chunk_size):
+            yield cls(electron_beam._energy_in_GeV, electron_beam._current, chunk)
+
+    def __len__(self):
+        return self._data.shape[1]
+
+    def data(self):
+        """
+        :return: Array (5, n_electrons) of the columns x, x', y, y', delta. Not a copy.
+        """
+        return self._data
+
+    def column(self, name):
+        return self._data[COLUMNS.index(name)]
+
+    def x(self):
+        return self._data[0]
+
+    def xp(self):
+        return self._data[1]
+
+    def y(self):
+        return self._data[2]
+
+    def yp(self):
+        return self._data[3]
+
+    def delta(self):
+        return self._data[4]
+
+    def energy_in_GeV(self):
+        return self._energy_in_GeV
+
+    def current(self):
+        return self._current
+
+    def gamma(self):
+        """
+        :return: Lorentz factors of the electrons.
+        """
+        nominal_gamma = ElectronBeamPencil(self._energy_in_GeV, 0.0, self._current).gamma()
+        return nominal_gamma * (1.0 + self._data[4])
+
+    def chunks(self, chunk_size):
+        """
+        :return: Generator of ElectronBeamEnsembles that are views of consecutive parts of this ensemble.
+        """
+        for start in range(0, len(self), chunk_size):
+            yield ElectronBeamEnsemble(self._energy_in_GeV, self._current, self._data[:, start:start + chunk_size])
+
+    def moments(self):
+        """
+        :return: Sample second moments (<x x>, <x x'>, <x' x'>, <y y>, <y y'>, <y' y'>) about zero and the rms of delta.
+        """
+        x, xp, y, yp, delta = self._data
+        return (np.mean(x * x), np.mean(x * xp), np.mean(xp * xp),
+                np.mean(y * y), np.mean(y * yp), np.mean(yp * yp),
+                np.sqrt(np.mean(delta * delta)))
+
+
+def _chunks(electron_beam, n_electrons, seed, chunk_size):
+    _check_moments(electron_beam)
+
+    for chunk_index, start in enumerate(range(0, n_electrons, chunk_size)):
+        yield start, _sample_chunk(electron_beam, min(chunk_size, n_electrons - start), seed, chunk_index)
@@ -0,0 +1,102 @@
+"""
+Emittance and Twiss parameters of electron beam moments, and their transport along drifts.
+
+The moments of one plane are (<x x>, <x x'>, <x' x'>), given as tuple or as array (..., 3). All functions broadcast
+over the leading axes, e.g. over beam variants or positions. With the rms emittance
+
+    epsilon = sqrt(<x x> <x' x'> - <x x'>^2)
+
+the Twiss parameters are beta = <x x>/epsilon, alpha = -<x x'>/epsilon and gamma = <x' x'>/epsilon.
+A drift of length d maps the moments to
+
+    <x x> + 2 d <x x'> + d^2 <x' x'>,   <x x'> + d <x' x'>,   <x' x'>.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import numpy as np
+
+
+def _split(moments):
+    moments = np.asarray(moments, dtype=float)
+    return moments[..., 0], moments[..., 1], moments[..., 2]
+
+
+def beam_moments(electron_beam):
+    """
+    :return: (moments_x, moments_y), arrays (3,) of the horizontal and vertical moments of an ElectronBeam.
+    """
+    return (np.array([electron_beam._moment_xx, electron_beam._moment_xxp, electron_beam._moment_xpxp]),
+            np.array([electron_beam._moment_yy, electron_beam._moment_yyp, electron_beam._moment_ypyp]))
+
+
+def emittance(moments):
+    """
+    :return: rms emittance in m rad. Zero for degenerate (e.g. pencil) beams.
+    """
+    xx, xxp, xpxp = _split(moments)
+    return np.sqrt(np.maximum(xx * xpxp - xxp**2, 0.0))
+
+
+def twiss_parameters(moments):
+    """
+    :return: (emittance, beta, alpha, gamma). beta in m, gamma in 1/m. Undefined (nan) for zero emittance.
+    """
+    xx, xxp, xpxp = _split(moments)
+    epsilon = emittance(moments)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return epsilon, xx / epsilon, -xxp / epsilon, xpxp / epsilon
+
+
+def moments_from_twiss(epsilon, beta, alpha):
+    """
+    :return: Moments, array (..., 3), of the emittance and the Twiss parameters beta and alpha.
+    """
+    epsilon, beta, alpha = np.broadcast_arrays(*[np.asarray(value, dtype=float) for value in (epsilon, beta, alpha)])
+    return np.stack((epsilon * beta, -epsilon * alpha, epsilon * (1.0 + alpha**2) / beta), axis=-1)
+
+
+def drift_moments(moments, distance):
+    """
+    :param moments: Moments, array (..., 3).
+    :param distance: Drift lengths in m, broadcasting against the leading axes of the moments.
+    :return: Moments after the drifts, array (..., 3).
+    """
+    xx, xxp, xpxp = _split(moments)
+    distance = np.asarray(distance, dtype=float)
+
+    return np.stack(np.broadcast_arrays(xx + 2.0 * distance * xxp + distance**2 * xpxp,
+                                        xxp + distance * xpxp,
+                                        xpxp), axis=-1)
+
+
+def beam_size(moments, distance=0.0):
+    """
+    :return: rms size in m after drifts of the given lengths.
+    """
+    return np.sqrt(drift_moments(moments, distance)[..., 0])
+
+
+def waist(moments):
+    """
+    :return: (distance, size): position of the waist relative to the moments (positive downstream) in m and the rms
+             size there. A beam without divergence has its waist at distance 0.
+    """
+    xx, xxp, xpxp = _split(moments)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        distance = np.where(xpxp > 0.0, -xxp / np.where(xpxp > 0.0, xpxp, 1.0), 0.0)
+
+    return distance, beam_size(moments, distance)
+
+
+def source_length_moments(moments, length):
+    """
+    Moments averaged over a source of the given length centered at the moments' position, i.e. over drifts
+    uniformly distributed in [-length/2, length/2]: <x x> grows by <x' x'> length^2/12.
+    :return: Moments, array (..., 3).
+    """
+    xx, xxp, xpxp = _split(moments)
+    length = np.asarray(length, dtype=float)
+
+    return np.stack(np.broadcast_arrays(xx + xpxp * length**2 / 12.0, xxp, xpxp), axis=-1)
@@ -3,23 +3,47 @@ Represents a beamline.
 
 BeamlineComponents can be attached at positions(BeamlinePosition), i.e. longitudinal, off-axis and inclined.
 We can iterate of the components, find their positions or look for a specific component.
+
+Components are kept sorted by their longitudinal position. Attaching bisects the sorted positions, components at
+equal positions keep the order of attachment. Lookups go through an index by component identity and an index by
+name, such that a pass over a beamline with thousands of components asking for positions and neighbours is linear.
+The identity index is rebuilt lazily, from the first index that an insertion shifted.
+
+For change detection the beamline keeps the fingerprints of its components (see beamline_fingerprint) together with
+the revisions they were computed at, and their chained hashes. Only components, positions or settings modified
+since are fingerprinted again. If nothing was modified at all, not even the revisions are checked.
 """
+from bisect import bisect_right
+
+from optics.driver.revision import last_revision
+from optics.beamline.beamline_fingerprint import component_fingerprint, revision_stamp, chain, EMPTY_BEAMLINE_HASH
+
 
 class Beamline(object):
     def __init__(self):
         self._components = []
         self._positions = []
 
-    def _findComponentInsertionIndex(self, beamline_position):
-        insert_index = 0
+        # Longitudinal positions, sorted, for bisection.
+        self._z = []
 
-        for position in self._positions:
-            if position.z()>beamline_position.z():
-                break
+        # id(component) -> index. Valid below self._indexed_up_to.
+        self._index_by_id = {}
+        self._indexed_up_to = 0
 
-            insert_index += 1
+        # name -> components with that name, in order of attachment.
+        self._components_by_name = {}
 
-        return insert_index
+        # (revision stamp, fingerprint) per component, None if not computed yet.
+        self._fingerprints = []
+        # Hash of the components up to and including index. Valid below self._chained_up_to.
+        self._chained_hashes = []
+        self._chained_up_to = 0
+        # Revision of the last modification of any object when the fingerprints were checked.
+        self._checked_revision = -1
+
+    def _findComponentInsertionIndex(self, beamline_position):
+        return bisect_right(self._z, beamline_position.z())
 
     def attach_component_at(self, beamline_component, beamline_position):
 
@@ -27,9 +51,34 @@ class Beamline(object):
 
         self._components.insert(insert_index,beamline_component)
         self._positions.insert(insert_index,beamline_position)
+        self._z.insert(insert_index, beamline_position.z())
+
+        # Components from insert_index on moved.
+        self._indexed_up_to = min(self._indexed_up_to, insert_index)
+
+        self._fingerprints.insert(insert_index, None)
+        self._chained_up_to = min(self._chained_up_to, insert_index)
+
+        self._components_by_name.setdefault(beamline_component.name(), []).append(beamline_component)
+
+    def _index_of(self, beamline_component):
+        """
+        :return: Index of the component. Raises ValueError if it is not attached, like list.index.
+        """
+        if self._indexed_up_to < len(self._components):
+            for index in range(self._indexed_up_to, len(self._components)):
+                self._index_by_id[id(self._components[index])] = index
+            self._indexed_up_to = len(self._components)
+
+        index = self._index_by_id.get(id(beamline_component))
+
+        if index is None or index >= len(self._components) or self._components[index] is not beamline_component:
+            raise ValueError("Component is not attached to the beamline.")
+
+        return index
 
     def position_of(self, beamline_component):
-        component_index = self._components.index(beamline_component)
+        component_index = self._index_of(beamline_component)
         position = self._positions[component_index]
 
         return position
@@ -41,14 +90,16 @@ class Beamline(object):
         return None
 
     def component_by_name(self, component_name):
-        for component in self._components:
-            if component.name() == component_name:
-                return component
+        components = self._components_by_name.get(component_name)
 
-        return None
+        if not components:
+            return None
+
+        # The first one along the beamline.
+        return min(components, key=self._index_of)
 
     def next_component(self, component):
-        component_index = self._components.index(component)
+        component_index = self._index_of(component)
 
         if len(self._components) <= component_index+1:
             next_component = None
@@ -58,7 +109,7 @@ class Beamline(object):
         return next_component
 
     def previous_component(self, component):
-        component_index = self._components.index(component)
+        component_index = self._index_of(component)
 
         if component_index == 0:
             previous_component = None
@@ -67,5 +118,77 @@ class Beamline(object):
 
         return previous_component
 
+    def _update_fingerprints(self):
+        n_components = len(self._components)
+
+        # Without any modification since the last check only components attached since need a fingerprint.
+        first_to_check = self._chained_up_to if self._checked_revision == last_revision() else 0
+        first_changed = self._chained_up_to
+
+        for index in range(first_to_check, n_components):
+            stamp = revision_stamp(self._components[index], self._positions[index])
+            cached = self._fingerprints[index]
+
+            if cached is None or cached[0] != stamp:
+                fingerprint = component_fingerprint(self._components[index], self._positions[index])
+                if cached is None or cached[1] != fingerprint:
+                    first_changed = min(first_changed, index)
+                self._fingerprints[index] = (stamp, fingerprint)
+
+        del self._chained_hashes[first_changed:]
+        previous_hash = self._chained_hashes[-1] if self._chained_hashes else EMPTY_BEAMLINE_HASH
+        for index in range(first_changed, n_components):
+            previous_hash = chain(previous_hash, self._fingerprints[index][1])
+            self._chained_hashes.append(previous_hash)
+
+        self._chained_up_to = n_components
+        self._checked_revision = last_revision()
+
+    def component_fingerprints(self):
+        """
+        :return: List of the component fingerprints along the beamline.
+        """
+        self._update_fingerprints()
+        return [fingerprint for _, fingerprint in self._fingerprints]
+
+    def fingerprint(self):
+        """
+        :return: Hex digest of all components, positions and settings, chained along the beamline.
+        """
+        self._update_fingerprints()
+
+        if not self._chained_hashes:
+            return EMPTY_BEAMLINE_HASH
+
+        return self._chained_hashes[-1]
+
+    def diff(self, other):
+        """
+        Compares with another beamline, e.g. a modified copy, to decide from where on to recompute.
+        The chained hashes agree up to the first difference, which is found by bisection.
+        :param other: Beamline to compare with.
+        :return: Index of the first component that differs (or exists in only one of the beamlines). None if equal.
+        """
+        self._update_fingerprints()
+        other._update_fingerprints()
+
+        n_common = min(len(self._chained_hashes), len(other._chained_hashes))
+
+        low, high = 0, n_common
+        while low < high:
+            middle = (low + high) // 2
+            if self._chained_hashes[middle] == other._chained_hashes[middle]:
+                low = middle + 1
+            else:
+                high = middle
+
+        if low == n_common and len(self._chained_hashes) == len(other._chained_hashes):
+            return None
+
+        return low
+
+    def __len__(self):
+        return len(self._components)
+
     def __iter__(self):
         return iter(self._components)
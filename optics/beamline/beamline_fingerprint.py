@@ -0,0 +1,110 @@
+"""
+Fingerprints of beamline components for change detection.
+
+The fingerprint of a component is a hex digest of its type, name and parameters (to_dictionary, or its attributes
+for components without), of its BeamlinePosition and of its driver settings. The fingerprint of a beamline chains
+the fingerprints of its components along the beamline, such that two beamlines share the chained hashes up to their
+first difference (see Beamline.fingerprint and Beamline.diff).
+"""
+import hashlib
+
+import numpy as np
+
+from optics.driver.revision import Revisioned
+
+# Bookkeeping attributes that do not describe the state.
+_IGNORED_ATTRIBUTES = ("_revision", "_driver_settings", "_driver_class")
+
+
+def _value_description(value):
+    if isinstance(value, np.ndarray):
+        return (value.dtype.str, value.shape, hashlib.sha1(np.ascontiguousarray(value).tobytes()).hexdigest())
+
+    if isinstance(value, (list, tuple)):
+        return tuple(_value_description(item) for item in value)
+
+    if isinstance(value, dict):
+        return tuple((key, _value_description(item)) for key, item in value.items())
+
+    if isinstance(value, Revisioned):
+        # E.g. drift space settings nested in component settings. Their repr would contain the memory address.
+        return (type(value).__name__, _attributes_description(value))
+
+    return repr(value)
+
+
+def _attributes_description(obj):
+    return tuple((name, _value_description(value)) for name, value in sorted(vars(obj).items())
+                 if name not in _IGNORED_ATTRIBUTES)
+
+
+def _parameters_description(component):
+    if hasattr(component, "to_dictionary"):
+        return tuple((key, _value_description(value[0])) for key, value in component.to_dictionary().items())
+
+    return _attributes_description(component)
+
+
+def _settings_description(driver_settings):
+    # Settings of the same driver compare by driver type, not by driver instance.
+    return (type(driver_settings).__name__,
+            driver_settings.driver_class().__name__,
+            _attributes_description(driver_settings))
+
+
+def _position_description(beamline_position):
+    return (beamline_position.z(), beamline_position.x(), beamline_position.y(),
+            beamline_position.angleRadial(), beamline_position.angleAzimuthal())
+
+
+def component_fingerprint(beamline_component, beamline_position):
+    """
+    :return: Hex digest of the component, its position and its driver settings.
+    """
+    description = (type(beamline_component).__name__,
+                   beamline_component.name(),
+                   _parameters_description(beamline_component),
+                   tuple(repr(value) for value in _position_description(beamline_position)),
+                   tuple(_settings_description(driver_settings)
+                         for driver_settings in beamline_component.all_settings()))
+
+    return hashlib.sha1(repr(description).encode("utf-8")).hexdigest()
+
+
+def _nested_revisions(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_nested_revisions(item) for item in value)
+
+    if isinstance(value, dict):
+        return tuple(_nested_revisions(item) for item in value.values())
+
+    if isinstance(value, Revisioned):
+        return _settings_revisions(value)
+
+    return None
+
+
+def _settings_revisions(driver_settings):
+    # Nested settings (e.g. drift space settings) are modified without touching the settings holding them.
+    return (id(driver_settings), driver_settings.revision(),
+            tuple(_nested_revisions(value) for name, value in sorted(vars(driver_settings).items())
+                  if name not in _IGNORED_ATTRIBUTES))
+
+
+def revision_stamp(beamline_component, beamline_position):
+    """
+    :return: Revisions of the component, its position and its settings, including nested settings. Equal stamps mean
+             unchanged fingerprints.
+    """
+    return (id(beamline_component), beamline_component.revision(), id(beamline_position), beamline_position.revision(),
+            tuple(_settings_revisions(driver_settings) for driver_settings in beamline_component.all_settings()))
+
+
+def chain(previous_hash, fingerprint):
+    """
+    :return: Hash of the beamline up to a component from the hash up to the previous one.
+    """
+    return hashlib.sha1((previous_hash + fingerprint).encode("utf-8")).hexdigest()
+
+
+EMPTY_BEAMLINE_HASH = hashlib.sha1(b"").hexdigest()
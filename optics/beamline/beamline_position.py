@@ -1,14 +1,20 @@
 """
 Position of a beamline component within a beamline.
+
+The position defines the frame of the component, see beamline_transform. Its 4x4 transforms are computed once and
+cached until the position is modified.
 """
+from optics.driver.revision import Revisioned
+from optics.beamline import beamline_transform
+
 
-class BeamlinePosition(object):
+class BeamlinePosition(Revisioned):
     def __init__(self, z, x=0.0,y=0.0, angle_radial=0.0, angle_azimuthal=0.0):
         """
 
         :param z: Longitudinal position.
-        :param x: Off-axis shift in vertical direction.
-        :param y: Off-axis shift in horizontal direction.
+        :param x: Off-axis shift in horizontal direction (first transverse axis).
+        :param y: Off-axis shift in vertical direction (second transverse axis).
         :param angle_radial: Radial inclination angle.
         :param angle_azimuthal: Azimuthal inclination angle.
         :return:
@@ -33,4 +39,64 @@ class BeamlinePosition(object):
         return self._angle_radial
 
     def angleAzimuthal(self):
-        return self._angle_azimuthal
\ No newline at end of file
+        return self._angle_azimuthal
+
+    def _transforms(self):
+        cached = self.__dict__.get("_cached_transforms")
+
+        if cached is None or cached[0] != self.revision():
+            transform = beamline_transform.placement_transform(self._z, self._x, self._y,
+                                                               self._angle_radial, self._angle_azimuthal)
+            transform.setflags(write=False)
+            inverse = beamline_transform.inverse_transform(transform)
+            inverse.setflags(write=False)
+
+            # Not an attribute assignment: the cache must not count as modification.
+            cached = (self.revision(), transform, inverse)
+            self.__dict__["_cached_transforms"] = cached
+
+        return cached
+
+    def transform(self):
+        """
+        :return: Read-only 4x4 transform from the component frame to the global frame.
+        """
+        return self._transforms()[1]
+
+    def inverse_transform(self):
+        """
+        :return: Read-only 4x4 transform from the global frame to the component frame.
+        """
+        return self._transforms()[2]
+
+    def to_component_frame(self, points, directions=None):
+        """
+        :param points: Global positions, array (..., 3), e.g. of rays.
+        :param directions: Global directions, array (..., 3), optional.
+        :return: Positions in the component frame, or (positions, directions) if directions are given.
+        """
+        inverse = self.inverse_transform()
+        points = beamline_transform.transform_points(inverse, points)
+
+        if directions is None:
+            return points
+
+        return points, beamline_transform.transform_directions(inverse, directions)
+
+    def to_global_frame(self, points, directions=None):
+        """
+        Inverse of to_component_frame.
+        """
+        transform = self.transform()
+        points = beamline_transform.transform_points(transform, points)
+
+        if directions is None:
+            return points
+
+        return points, beamline_transform.transform_directions(transform, directions)
+
+    def mesh_points(self, x, y):
+        """
+        :return: Global positions of a transverse mesh of the component, array (n_x, n_y, 3).
+        """
+        return beamline_transform.mesh_points(self.transform(), x, y)
@@ -0,0 +1,90 @@
+"""
+Homogeneous transforms between the global beamline frame and the frames of placed components.
+
+Axes: x is horizontal (the first transverse axis, also of meshes), y is vertical, z is longitudinal along the beam.
+The angle_azimuthal 0 inclines towards x, pi/2 towards y.
+
+The frame of a component at BeamlinePosition(z, x, y, angle_radial, angle_azimuthal) has its origin at (x, y, z) of
+the global frame. Its longitudinal axis is inclined by angle_radial from the global z axis, towards the transverse
+direction (cos(angle_azimuthal), sin(angle_azimuthal)). The rotation is the one about the axis perpendicular to both,
+i.e. R = R_z(angle_azimuthal) R_y(angle_radial) R_z(-angle_azimuthal), such that an inclination leaves the
+transverse axes as little rotated as possible.
+
+Transforms are 4x4 matrices acting on column vectors (x, y, z, 1). Points and directions are arrays (..., 3); all of
+them are transformed in one matrix product.
+"""
+import numpy as np
+
+
+def rotation_matrix(angle_radial, angle_azimuthal):
+    """
+    :return: 3x3 rotation from component to global frame.
+    """
+    cos_radial, sin_radial = np.cos(angle_radial), np.sin(angle_radial)
+    cos_azimuthal, sin_azimuthal = np.cos(angle_azimuthal), np.sin(angle_azimuthal)
+
+    rotation_z = np.array([[cos_azimuthal, -sin_azimuthal, 0.0],
+                           [sin_azimuthal,  cos_azimuthal, 0.0],
+                           [0.0,            0.0,           1.0]])
+    rotation_y = np.array([[ cos_radial, 0.0, sin_radial],
+                           [ 0.0,        1.0, 0.0],
+                           [-sin_radial, 0.0, cos_radial]])
+
+    return rotation_z.dot(rotation_y).dot(rotation_z.T)
+
+
+def placement_transform(z, x=0.0, y=0.0, angle_radial=0.0, angle_azimuthal=0.0):
+    """
+    :return: 4x4 transform from component to global frame.
+    """
+    transform = np.identity(4)
+    transform[:3, :3] = rotation_matrix(angle_radial, angle_azimuthal)
+    transform[:3, 3] = (x, y, z)
+    return transform
+
+
+def inverse_transform(transform):
+    """
+    :return: Inverse of a rigid 4x4 transform, without a general matrix inversion.
+    """
+    inverse = np.identity(4)
+    inverse[:3, :3] = transform[:3, :3].T
+    inverse[:3, 3] = -transform[:3, :3].T.dot(transform[:3, 3])
+    return inverse
+
+
+def transform_points(transform, points):
+    """
+    :param transform: 4x4 transform.
+    :param points: Array (..., 3).
+    :return: Transformed points, array (..., 3).
+    """
+    points = np.asarray(points, dtype=float)
+    return points.dot(transform[:3, :3].T) + transform[:3, 3]
+
+
+def transform_directions(transform, directions):
+    """
+    Transforms directions (or any vectors that are not positions): rotation only.
+    :param transform: 4x4 transform.
+    :param directions: Array (..., 3).
+    :return: Transformed directions, array (..., 3).
+    """
+    return np.asarray(directions, dtype=float).dot(transform[:3, :3].T)
+
+
+def mesh_points(transform, x, y):
+    """
+    Positions of the points of a transverse mesh of a component.
+    :param transform: 4x4 transform from component to global frame.
+    :param x: 1D array of horizontal mesh coordinates in the component frame.
+    :param y: 1D array of vertical mesh coordinates in the component frame.
+    :return: Global positions, array (n_x, n_y, 3).
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # The points are x e_x + y e_y + origin: a sum of two outer products, no matrix product per point.
+    return (x[:, np.newaxis, np.newaxis] * transform[:3, 0] +
+            y[np.newaxis, :, np.newaxis] * transform[:3, 1] +
+            transform[:3, 3])
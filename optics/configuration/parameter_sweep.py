@@ -0,0 +1,267 @@
+"""
+Parameter sweeps over simulation configurations.
+
+A sweep is a table: one column of values per swept parameter, one row per simulation. The parameters are addressed
+by paths into a base configuration (see simulation_configuration):
+
+    electron_beam.energy_in_GeV                       constructor parameter
+    magnetic_structure.settings[SRWBendingMagnetSetting].relPrec
+    beamline[focus lens].focal_x                       component by name
+    beamline[Image screen].position.z
+    calculation.energy_min
+
+Rows are turned into configuration dictionaries, and into Simulation objects, only when they are needed. Running a
+sweep loads every distinct row once and hands it to a driver; rows with equal values share the result. The rows are
+distributed over a thread or process pool. Process workers receive the rows as JSON text together with the schema of
+the sweep.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import copy
+import itertools
+import json
+import re
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import numpy as np
+
+from optics.configuration.simulation_configuration import default_schema
+
+_PATH_ITEM = re.compile(r"([^.\[\]]+)(?:\[([^\]]+)\])?")
+
+# Keys of an object description that are no parameters.
+_DESCRIPTION_KEYS = ("type", "name", "position", "settings", "list")
+
+
+def _split_path(path):
+    items = []
+    position = 0
+    while position < len(path):
+        match = _PATH_ITEM.match(path, position)
+        if match is None:
+            raise Exception("Invalid parameter path: %s" % path)
+        items.append((match.group(1), match.group(2)))
+        position = match.end() + 1
+
+    return items
+
+
+def _find(descriptions, selector, path):
+    for description in descriptions:
+        if selector in (description.get("name"), description.get("type")):
+            return description
+
+    if selector.isdigit() and int(selector) < len(descriptions):
+        return descriptions[int(selector)]
+
+    raise Exception("%s: no entry %s." % (path, selector))
+
+
+def set_parameter(configuration, path, value):
+    """
+    Sets a parameter of a configuration dictionary in place.
+    :param configuration: Configuration dictionary.
+    :param path: Parameter path, see module documentation.
+    :param value: New value.
+    """
+    items = _split_path(path)
+    current = configuration
+
+    for index, (key, selector) in enumerate(items):
+        last = index == len(items) - 1
+
+        if selector is not None:
+            if key not in current:
+                raise Exception("%s: no %s in the configuration." % (path, key))
+            current = _find(current[key], selector, path)
+            if last:
+                raise Exception("%s: the path must end with a parameter." % path)
+            continue
+
+        if last:
+            # Parameters of objects live in their "parameters" dictionary.
+            if "type" in current and key not in _DESCRIPTION_KEYS:
+                current = current.setdefault("parameters", {})
+            current[key] = value
+        else:
+            current = current.setdefault(key, {})
+
+
+def _plain_value(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _evaluate_text(arguments):
+    # Worker of process pools: module level such that it can be pickled.
+    driver, evaluate, schema, text = arguments
+    return evaluate(driver, schema.load(json.loads(text)))
+
+
+def calculate_intensity(driver, simulation):
+    """
+    Default evaluation of a row: radiation through the beamline for the energies in the calculation section
+    (energy_min, energy_max), then its intensity.
+    """
+    calculation = simulation.calculation
+    radiation = driver.calculate_radiation(simulation.electron_beam, simulation.magnetic_structure,
+                                           simulation.beamline, calculation["energy_min"], calculation["energy_max"])
+    return driver.calculate_intensity(radiation)
+
+
+class ParameterSweep(object):
+    def __init__(self, base_configuration, columns, schema=None):
+        """
+        Constructor for given rows ("list" mode).
+        :param base_configuration: Configuration dictionary that the rows modify. It is not modified.
+        :param columns: Dictionary parameter path -> sequence of values, all of the same length.
+        :param schema: ConfigurationSchema. Defaults to the shared default schema.
+        """
+        self._base_configuration = base_configuration
+        self._columns = OrderedDict((path, np.asarray(values)) for path, values in columns.items())
+        self._results = OrderedDict()
+        self._schema = default_schema() if schema is None else schema
+
+        lengths = set(len(values) for values in self._columns.values())
+        if len(lengths) > 1:
+            raise Exception("All columns of a sweep must have the same length.")
+
+        self._n_rows = lengths.pop() if lengths else 0
+
+        # Validate the paths once on the base configuration.
+        for path in self._columns:
+            set_parameter(copy.deepcopy(base_configuration), path, None)
+
+    @classmethod
+    def from_rows(cls, base_configuration, rows, schema=None):
+        """
+        :param rows: Sequence of dictionaries parameter path -> value, all with the same paths.
+        """
+        paths = list(rows[0].keys()) if rows else []
+        return cls(base_configuration, OrderedDict((path, [row[path] for row in rows]) for path in paths), schema)
+
+    @classmethod
+    def cartesian(cls, base_configuration, parameters, schema=None):
+        """
+        All combinations of the given values. The last parameter varies fastest.
+        :param parameters: Dictionary parameter path -> sequence of values.
+        """
+        paths = list(parameters.keys())
+        grids = np.meshgrid(*[np.asarray(parameters[path]) for path in paths], indexing="ij")
+
+        return cls(base_configuration, OrderedDict((path, grid.ravel()) for path, grid in zip(paths, grids)), schema)
+
+    @classmethod
+    def latin_hypercube(cls, base_configuration, ranges, n_rows, seed=0, schema=None):
+        """
+        Latin hypercube sample: every parameter range is divided into n_rows strata, each hit once.
+        :param ranges: Dictionary parameter path -> (minimum, maximum).
+        :param n_rows: Number of rows.
+        :param seed: Seed of the sample.
+        """
+        random_state = np.random.RandomState(seed)
+
+        columns = OrderedDict()
+        for path, (minimum, maximum) in ranges.items():
+            strata = (random_state.permutation(n_rows) + random_state.uniform(size=n_rows)) / n_rows
+            columns[path] = minimum + strata * (maximum - minimum)
+
+        return cls(base_configuration, columns, schema)
+
+    def __len__(self):
+        return self._n_rows
+
+    def parameters(self):
+        return list(self._columns.keys())
+
+    def column(self, name):
+        """
+        :return: Values of a parameter column or of a result column.
+        """
+        if name in self._columns:
+            return self._columns[name]
+        return self._results[name]
+
+    def result_names(self):
+        return list(self._results.keys())
+
+    def row(self, index):
+        """
+        :return: Dictionary parameter path -> value of a row.
+        """
+        return OrderedDict((path, _plain_value(values[index])) for path, values in self._columns.items())
+
+    def configuration(self, index):
+        """
+        :return: Configuration dictionary of a row.
+        """
+        configuration = copy.deepcopy(self._base_configuration)
+        for path, value in self.row(index).items():
+            set_parameter(configuration, path, value)
+
+        return configuration
+
+    def simulation(self, index):
+        """
+        :return: Simulation of a row, created on request.
+        """
+        return self._schema.load(self.configuration(index))
+
+    def simulations(self):
+        """
+        :return: Generator of the Simulations of all rows.
+        """
+        for index in range(len(self)):
+            yield self.simulation(index)
+
+    def unique_rows(self):
+        """
+        :return: (indices, inverse): the first row of every distinct set of values, and for every row the position
+                 of its distinct row in indices.
+        """
+        first_rows = OrderedDict()
+        inverse = np.empty(len(self), dtype=int)
+
+        keys = zip(*[values.tolist() for values in self._columns.values()]) if self._columns \
+            else itertools.repeat((), len(self))
+        for index, key in enumerate(keys):
+            inverse[index] = first_rows.setdefault(key, len(first_rows))
+
+        # Assigned in reverse, the first row of every distinct set of values is written last.
+        indices = np.empty(len(first_rows), dtype=int)
+        indices[inverse[::-1]] = np.arange(len(self))[::-1]
+
+        return indices, inverse
+
+    def run(self, driver, evaluate=calculate_intensity, result_name="result", n_workers=1, use_processes=False):
+        """
+        Evaluates every distinct row once and stores the results as column.
+        :param driver: AbstractDriver. Process workers receive a pickled copy. Threads share the driver, i.e. its caches
+                       must be thread safe.
+        :param evaluate: Function (driver, simulation) -> result. Module level function for process pools.
+        :param result_name: Name of the result column.
+        :param n_workers: Number of workers. 1 evaluates in the calling thread.
+        :param use_processes: Process pool instead of thread pool.
+        :return: List of the results of all rows.
+        """
+        indices, inverse = self.unique_rows()
+
+        if use_processes and n_workers > 1:
+            texts = [json.dumps(self.configuration(index)) for index in indices]
+            with ProcessPoolExecutor(max_workers=n_workers) as executor:
+                unique_results = list(executor.map(_evaluate_text,
+                                                   [(driver, evaluate, self._schema, text) for text in texts]))
+        else:
+            def evaluate_row(index):
+                return evaluate(driver, self.simulation(index))
+
+            if n_workers > 1:
+                with ThreadPoolExecutor(max_workers=n_workers) as executor:
+                    unique_results = list(executor.map(evaluate_row, indices))
+            else:
+                unique_results = [evaluate_row(index) for index in indices]
+
+        results = [unique_results[position] for position in inverse]
+        self._results[result_name] = results
+
+        return results
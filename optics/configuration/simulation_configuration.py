@@ -0,0 +1,436 @@
+"""
+Declarative description of a simulation: electron beam, magnetic structure, beamline and driver settings.
+
+A configuration is a plain dictionary, stored as JSON or TOML:
+
+    {"electron_beam":      {"type": "ElectronBeam", "parameters": {"energy_in_GeV": 6.0, ...}},
+     "magnetic_structure": {"type": "BendingMagnet", "parameters": {...},
+                            "settings": [{"type": "SRWBendingMagnetSetting", "parameters": {"relPrec": 0.003}}]},
+     "beamline": [{"type": "LensIdeal", "name": "focus lens", "parameters": {"focal_x": 12.5, "focal_y": 12.5},
+                   "position": {"z": 25.0},
+                   "settings": [{"type": "SRWBeamlineComponentSetting", "list": [0, 0, 1.0, 0, 0, 1.0, 5.0, 1.0, 8.0]}]}],
+     "calculation": {"energy_min": 15000.0, "energy_max": 15000.0}}
+
+Parameters of beams, structures and components are constructor arguments. Parameters of settings are the names of
+their attributes without the leading underscore. They are applied with the set_<name> method if there is one, such
+that the setters validate them, otherwise they are assigned. Settings with from_list accept a "list" instead. A
+parameter value with a "type" is itself a settings object, e.g. the drift space settings of a component. The
+"calculation" section is not interpreted.
+
+Types are given by class name (see TYPES) or by their full dotted path. The schema compiles every type on first use:
+it imports the class, reads the constructor arguments and the default settings, and keeps them for all further
+configurations. Driver settings are only imported when a configuration uses them.
+
+Saving writes constructor arguments from the attributes of the objects and only those settings that differ from
+their defaults, so that a run can be shipped to a worker process as a small text blob.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import importlib
+import inspect
+import json
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from optics.beamline.beamline import Beamline
+from optics.beamline.beamline_position import BeamlinePosition
+from optics.driver.abstract_driver_setting import AbstractDriverSetting
+
+JSON = "json"
+TOML = "toml"
+
+# Class name -> module of the known types.
+TYPES = {"ElectronBeam":                          "optics.beam.electron_beam",
+         "ElectronBeamPencil":                    "optics.beam.electron_beam_pencil",
+         "BendingMagnet":                         "optics.magnetic_structures.bending_magnet",
+         "InsertionDevice":                       "optics.magnetic_structures.insertion_device",
+         "Undulator":                             "optics.magnetic_structures.undulator",
+         "UndulatorVertical":                     "optics.magnetic_structures.undulator_vertical",
+         "Wiggler":                               "optics.magnetic_structures.wiggler",
+         "LensIdeal":                             "optics.beamline.optical_elements.lens.lens_ideal",
+         "ImagePlane":                            "optics.beamline.optical_elements.image_plane",
+         "ElectronBeamSetting":                   "code_drivers.SRW.SRW_electron_beam_setting",
+         "SRWBendingMagnetSetting":               "code_drivers.SRW.SRW_bending_magnet_setting",
+         "SRWUndulatorSetting":                   "code_drivers.SRW.SRW_undulator_setting",
+         "SRWBeamlineComponentSetting":           "code_drivers.SRW.SRW_beamline_component_setting",
+         "FourierOpticsBeamlineComponentSetting": "code_drivers.fourier_optics.fourier_optics_beamline_component_setting",
+         "FourierOpticsSourceSetting":            "code_drivers.fourier_optics.fourier_optics_source_setting",
+         "ShadowBendingMagnetSetting":            "code_drivers.shadow.sources.shadow_bending_magnet"}
+
+# Constructor arguments that are stored under another attribute name.
+_ARGUMENT_ATTRIBUTES = {"K": "_K_vertical"}
+
+# Attributes of settings that are not parameters.
+_SETTINGS_BOOKKEEPING = ("_driver_class", "_revision")
+
+_POSITION_DEFAULTS = OrderedDict([("z", None), ("x", 0.0), ("y", 0.0), ("angle_radial", 0.0), ("angle_azimuthal", 0.0)])
+
+Simulation = namedtuple("Simulation", ["electron_beam", "magnetic_structure", "beamline", "calculation"])
+
+
+class ConfigurationError(Exception):
+    pass
+
+
+def _plain(value, path):
+    # Converts a value to JSON/TOML types.
+    if isinstance(value, (bool, str)) or value is None:
+        return value
+
+    if isinstance(value, (int, float)):
+        return value
+
+    if isinstance(value, np.generic):
+        return value.item()
+
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_plain(item, path) for item in list(value)]
+
+    raise ConfigurationError("%s: can not save values of type %s." % (path, type(value).__name__))
+
+
+class _CompiledType(object):
+    def __init__(self, cls):
+        self.cls = cls
+        self.name = cls.__name__
+
+        # Constructor arguments in order with their defaults.
+        signature = inspect.signature(cls.__init__)
+        self.arguments = OrderedDict((argument.name, argument.default)
+                                     for argument in list(signature.parameters.values())[1:])
+
+        self.is_settings = issubclass(cls, AbstractDriverSetting)
+
+        if self.is_settings:
+            prototype = cls()
+            self.defaults = OrderedDict((name[1:], value) for name, value in sorted(vars(prototype).items())
+                                        if name not in _SETTINGS_BOOKKEEPING)
+            self.setters = dict((name, getattr(cls, "set_" + name, None)) for name in self.defaults)
+            self.from_list = getattr(cls, "from_list", None)
+
+    def create(self, parameters, path):
+        unknown = set(parameters) - set(self.arguments)
+        if unknown:
+            raise ConfigurationError("%s: unknown parameters %s of %s." % (path, sorted(unknown), self.name))
+
+        missing = [name for name, default in self.arguments.items()
+                   if default is inspect.Parameter.empty and name not in parameters]
+        if missing:
+            raise ConfigurationError("%s: missing parameters %s of %s." % (path, missing, self.name))
+
+        return self.cls(**parameters)
+
+    def constructor_parameters(self, obj, path):
+        parameters = OrderedDict()
+        for name in self.arguments:
+            attribute = "_" + name if hasattr(obj, "_" + name) else _ARGUMENT_ATTRIBUTES.get(name)
+            if attribute is None or not hasattr(obj, attribute):
+                raise ConfigurationError("%s: can not find the parameter %s of %s." % (path, name, self.name))
+            parameters[name] = _plain(getattr(obj, attribute), path + "." + name)
+
+        return parameters
+
+
+class ConfigurationSchema(object):
+    def __init__(self, types=None):
+        """
+        Constructor.
+        :param types: Dictionary class name -> module of additional types.
+        """
+        self._types = dict(TYPES)
+        if types is not None:
+            self._types.update(types)
+
+        self._compiled = {}
+
+    def __getstate__(self):
+        # Compiled types are rebuilt on demand, e.g. by the process workers of parameter sweeps.
+        state = self.__dict__.copy()
+        state["_compiled"] = {}
+        return state
+
+    def compiled_type(self, type_name):
+        """
+        :param type_name: Class name or full dotted path of the class.
+        :return: Compiled type, cached.
+        """
+        if type_name not in self._compiled:
+            if type_name in self._types:
+                module_name, class_name = self._types[type_name], type_name
+            elif "." in type_name:
+                module_name, class_name = type_name.rsplit(".", 1)
+            else:
+                raise ConfigurationError("Unknown type: %s" % type_name)
+
+            self._compiled[type_name] = _CompiledType(getattr(importlib.import_module(module_name), class_name))
+
+        return self._compiled[type_name]
+
+    def _type_name(self, obj):
+        cls = type(obj)
+        if self._types.get(cls.__name__) == cls.__module__:
+            return cls.__name__
+        return cls.__module__ + "." + cls.__name__
+
+    @staticmethod
+    def _check_keys(description, allowed, path):
+        unknown = set(description) - set(allowed)
+        if unknown:
+            raise ConfigurationError("%s: unknown keys %s." % (path, sorted(unknown)))
+
+        if "type" not in description:
+            raise ConfigurationError("%s: missing type." % path)
+
+    #
+    # loading
+    #
+    def _create_settings(self, description, path):
+        self._check_keys(description, ("type", "parameters", "list"), path)
+        compiled = self.compiled_type(description["type"])
+
+        if not compiled.is_settings:
+            raise ConfigurationError("%s: %s are no driver settings." % (path, compiled.name))
+
+        settings = compiled.cls()
+
+        if "list" in description:
+            if compiled.from_list is None:
+                raise ConfigurationError("%s: %s can not be set from a list." % (path, compiled.name))
+            settings.from_list(description["list"])
+
+        for name, value in description.get("parameters", {}).items():
+            if name not in compiled.defaults:
+                raise ConfigurationError("%s: unknown parameter %s of %s." % (path, name, compiled.name))
+
+            if isinstance(value, dict):
+                value = self._create_settings(value, path + "." + name)
+
+            setter = compiled.setters[name]
+            if setter is not None:
+                setter(settings, value)
+            else:
+                setattr(settings, "_" + name, value)
+
+        return settings
+
+    def _create(self, description, path, keys=("type", "parameters", "settings")):
+        self._check_keys(description, keys, path)
+        compiled = self.compiled_type(description["type"])
+        parameters = dict(description.get("parameters", {}))
+
+        if "name" in description:
+            parameters["name"] = description["name"]
+
+        obj = compiled.create(parameters, path)
+
+        for index, settings in enumerate(description.get("settings", [])):
+            obj.add_settings(self._create_settings(settings, "%s.settings[%d]" % (path, index)))
+
+        return obj
+
+    def _create_position(self, description, path):
+        unknown = set(description) - set(_POSITION_DEFAULTS)
+        if unknown or "z" not in description:
+            raise ConfigurationError("%s: a position has z and optionally %s." % (path, list(_POSITION_DEFAULTS)[1:]))
+
+        return BeamlinePosition(**description)
+
+    def load(self, configuration):
+        """
+        :param configuration: Configuration dictionary.
+        :return: Simulation (electron_beam, magnetic_structure, beamline, calculation). Sections that are not
+                 given are None, the beamline is empty.
+        """
+        unknown = set(configuration) - set(Simulation._fields)
+        if unknown:
+            raise ConfigurationError("Unknown sections %s." % sorted(unknown))
+
+        electron_beam = None
+        if "electron_beam" in configuration:
+            electron_beam = self._create(configuration["electron_beam"], "electron_beam")
+
+        magnetic_structure = None
+        if "magnetic_structure" in configuration:
+            magnetic_structure = self._create(configuration["magnetic_structure"], "magnetic_structure")
+
+        beamline = Beamline()
+        for index, description in enumerate(configuration.get("beamline", [])):
+            path = "beamline[%d]" % index
+            if "position" not in description:
+                raise ConfigurationError("%s: missing position." % path)
+
+            component = self._create(description, path, keys=("type", "name", "parameters", "position", "settings"))
+            beamline.attach_component_at(component, self._create_position(description["position"], path + ".position"))
+
+        return Simulation(electron_beam, magnetic_structure, beamline, configuration.get("calculation"))
+
+    #
+    # saving
+    #
+    def _describe_settings(self, settings, path):
+        compiled = self.compiled_type(self._type_name(settings))
+
+        parameters = OrderedDict()
+        for name, default in compiled.defaults.items():
+            value = getattr(settings, "_" + name)
+
+            if isinstance(value, AbstractDriverSetting):
+                parameters[name] = self._describe_settings(value, path + "." + name)
+            elif not (type(value) is type(default) and value == default):
+                parameters[name] = _plain(value, path + "." + name)
+
+        description = OrderedDict([("type", self._type_name(settings))])
+        if parameters:
+            description["parameters"] = parameters
+
+        return description
+
+    def _describe(self, obj, path, named=False):
+        compiled = self.compiled_type(self._type_name(obj))
+        parameters = compiled.constructor_parameters(obj, path)
+
+        description = OrderedDict([("type", self._type_name(obj))])
+        if named:
+            description["name"] = parameters.pop("name")
+        if parameters:
+            description["parameters"] = parameters
+
+        settings = [self._describe_settings(driver_settings, "%s.settings[%d]" % (path, index))
+                    for index, driver_settings in enumerate(obj.all_settings())]
+        if settings:
+            description["settings"] = settings
+
+        return description
+
+    def dump(self, simulation):
+        """
+        :param simulation: Simulation, or any tuple (electron_beam, magnetic_structure, beamline, calculation).
+        :return: Configuration dictionary.
+        """
+        electron_beam, magnetic_structure, beamline, calculation = simulation
+
+        configuration = OrderedDict()
+        if electron_beam is not None:
+            configuration["electron_beam"] = self._describe(electron_beam, "electron_beam")
+        if magnetic_structure is not None:
+            configuration["magnetic_structure"] = self._describe(magnetic_structure, "magnetic_structure")
+
+        if beamline is not None and len(beamline) > 0:
+            components = []
+            for index, component in enumerate(beamline):
+                path = "beamline[%d]" % index
+                description = self._describe(component, path, named=True)
+
+                beamline_position = beamline.position_of(component)
+                values = (beamline_position.z(), beamline_position.x(), beamline_position.y(),
+                          beamline_position.angleRadial(), beamline_position.angleAzimuthal())
+                position = OrderedDict()
+                for (name, default), value in zip(_POSITION_DEFAULTS.items(), values):
+                    if default is None or value != default:
+                        position[name] = _plain(value, path + ".position." + name)
+
+                # Position after the name for readability.
+                description = OrderedDict([(key, description[key]) for key in ("type", "name", "parameters")
+                                           if key in description] +
+                                          [("position", position)] +
+                                          [(key, description[key]) for key in ("settings",) if key in description])
+                components.append(description)
+
+            configuration["beamline"] = components
+
+        if calculation is not None:
+            configuration["calculation"] = calculation
+
+        return configuration
+
+
+_DEFAULT_SCHEMA = ConfigurationSchema()
+
+
+def default_schema():
+    return _DEFAULT_SCHEMA
+
+
+def _toml_reader():
+    try:
+        import tomllib
+    except ImportError:
+        try:
+            import tomli as tomllib
+        except ImportError:
+            raise ConfigurationError("Reading TOML needs Python 3.11 or the tomli package.")
+    return tomllib
+
+
+def _toml_writer():
+    try:
+        import tomli_w
+    except ImportError:
+        raise ConfigurationError("Writing TOML needs the tomli_w package.")
+    return tomli_w
+
+
+def loads(text, format=JSON, schema=None):
+    """
+    :param text: Configuration as JSON or TOML text.
+    :param format: JSON or TOML.
+    :param schema: ConfigurationSchema. Defaults to the shared default schema.
+    :return: Simulation.
+    """
+    if schema is None:
+        schema = _DEFAULT_SCHEMA
+
+    if format == JSON:
+        configuration = json.loads(text)
+    elif format == TOML:
+        configuration = _toml_reader().loads(text)
+    else:
+        raise ConfigurationError("Unknown format: %s" % format)
+
+    return schema.load(configuration)
+
+
+def dumps(simulation, format=JSON, schema=None):
+    """
+    :return: Configuration of the simulation as JSON (compact) or TOML text. Arguments as for loads.
+    """
+    if schema is None:
+        schema = _DEFAULT_SCHEMA
+
+    configuration = schema.dump(simulation)
+
+    if format == JSON:
+        return json.dumps(configuration, separators=(",", ":"))
+    elif format == TOML:
+        return _toml_writer().dumps(configuration)
+
+    raise ConfigurationError("Unknown format: %s" % format)
+
+
+def _format_of(filename):
+    return TOML if filename.endswith(".toml") else JSON
+
+
+def load_configuration(filename, schema=None):
+    """
+    Loads a .json or .toml configuration file.
+    :return: Simulation.
+    """
+    format = _format_of(filename)
+    with open(filename, "rb" if format == TOML else "r") as configuration_file:
+        text = configuration_file.read()
+
+    if format == TOML:
+        text = text.decode("utf-8")
+
+    return loads(text, format, schema)
+
+
+def save_configuration(filename, simulation, schema=None):
+    """
+    Saves a simulation as .json or .toml configuration file.
+    """
+    text = dumps(simulation, _format_of(filename), schema)
+    with open(filename, "w") as configuration_file:
+        configuration_file.write(text)
@@ -1,19 +1,69 @@
 """
 Abstract base class for driver settings.
+
+Settings belong to a driver class. Settings classes of a driver name it by its dotted path in _driver_path; the path
+is resolved on first use and kept on the class. Settings therefore neither create driver instances nor import the
+driver module, which usually imports the settings modules itself.
+
+snapshot() returns an immutable, hashable copy of the settings, see settings_snapshot.
 """
+import importlib
+
+from optics.driver.revision import Revisioned
+from optics.driver.settings_snapshot import SettingsSnapshot
+
+
+def driver_class_of(driver):
+    """
+    :param driver: Driver instance or driver class.
+    :return: The driver class.
+    """
+    return driver if isinstance(driver, type) else type(driver)
+
 
-class AbstractDriverSetting(object):
-    def __init__(self, driver):
-        self._driver = driver
+class AbstractDriverSetting(Revisioned):
+    # Dotted path of the driver class, e.g. "code_drivers.SRW.SRW_driver.SRWDriver".
+    _driver_path = None
+
+    def __init__(self, driver=None):
+        """
+        Constructor.
+        :param driver: Driver instance or class. Defaults to the driver named by _driver_path.
+        """
+        if driver is not None:
+            self._driver_class = driver_class_of(driver)
+
+    @classmethod
+    def _resolved_driver_class(cls):
+        # Cached per settings class, not inherited by subclasses naming another driver.
+        resolved = cls.__dict__.get("_resolved_driver")
+        if resolved is None or resolved[0] != cls._driver_path:
+            if cls._driver_path is None:
+                raise Exception("%s does not name its driver." % cls.__name__)
+
+            module_name, class_name = cls._driver_path.rsplit(".", 1)
+            resolved = (cls._driver_path, getattr(importlib.import_module(module_name), class_name))
+            type.__setattr__(cls, "_resolved_driver", resolved)
+
+        return resolved[1]
+
+    def driver_class(self):
+        driver_class = self.__dict__.get("_driver_class")
+        if driver_class is None:
+            driver_class = self._resolved_driver_class()
+        return driver_class
 
     def driver(self):
-        return self._driver
+        """
+        :return: The driver class. Accepted wherever a driver is expected for settings lookups.
+        """
+        return self.driver_class()
 
     def is_driver(self, driver):
+        return self.driver_class() is driver_class_of(driver)
 
-        try:
-            is_driver = type(self._driver) is type(driver)
-        except:
-            is_driver = False
-
-        return is_driver
\ No newline at end of file
+    def snapshot(self):
+        """
+        :return: Immutable, hashable SettingsSnapshot of the current settings.
+        """
+        return SettingsSnapshot(self)
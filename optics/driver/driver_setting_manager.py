@@ -3,62 +3,73 @@ Manages driver settings.
 
 Can store multiple settings for different drivers.
 Every ElectronBeam,Source and BeamlineComponent is/has a DriverSettingsManager, i.e. can store driver depended settings.
+Settings are stored by driver class: lookups are dictionary accesses and accept driver instances or classes.
+Changes of the settings (adding, removing) count as modification of the manager, see Revisioned.
 """
+from collections import OrderedDict
 
-class DriverSettingManager(object):
+from optics.driver.revision import Revisioned
+from optics.driver.abstract_driver_setting import driver_class_of
+
+
+class DriverSettingManager(Revisioned):
     def __init__(self):
         """
         Constructor
         """
-        self._driver_settings = []
+        # driver class -> settings, in the order they were added.
+        self._driver_settings = OrderedDict()
 
     def add_settings(self, driver_settings):
         """
         Adds some settings
         :param driver_settings: Settings to set.
         """
-        if self.has_settings(driver_settings.driver()):
+        driver_class = driver_settings.driver_class()
+        if driver_class in self._driver_settings:
             raise Exception("For the given driver, some settings have already been stored.")
 
-        self._driver_settings.append(driver_settings)
+        self._driver_settings[driver_class] = driver_settings
+        self.touch()
 
     def remove_settings(self, driver):
         """
         Removes settings for a given driver.
-        :param driver: The driver to remove settings for.
+        :param driver: The driver (instance or class) to remove settings for.
         """
         if not self.has_settings(driver):
             raise Exception("Can not remove settings for the given driver, because none have been stored.")
 
-        driver_settings = self.settings(driver)
-        self._driver_settings.remove(driver_settings)
+        del self._driver_settings[driver_class_of(driver)]
+        self.touch()
 
     def set_settings(self, driver_settings):
         """
         Sets the given settings. Possible previously set settings for the same driver will be overwritten.
         :param driver_settings: Settings to set.
         """
-        if self.has_settings(driver_settings.driver()):
-            self.remove_settings(driver_settings.driver())
+        if self.has_settings(driver_settings.driver_class()):
+            self.remove_settings(driver_settings.driver_class())
         self.add_settings(driver_settings)
 
     def settings(self, driver):
         """
         Returns the settings for a given driver.
-        :param driver: driver to look for settings.
-        :return: Returns the first settings stored for the given driver. Or None if there are no settings for the given driver.
+        :param driver: driver (instance or class) to look for settings.
+        :return: Returns the settings stored for the given driver. Or None if there are no settings for the given driver.
         """
-        for driver_settings in self._driver_settings:
-            if driver_settings.is_driver(driver):
-                return driver_settings
-
-        return None
+        return self._driver_settings.get(driver_class_of(driver))
 
     def has_settings(self, driver):
         """
         Checks if there are settings for the given driver.
-        :param driver: driver to check for attached settings.
+        :param driver: driver (instance or class) to check for attached settings.
         :return: True if there are settings for the given driver. False otherwise.
         """
-        has_driver = self.settings(driver) is not None
-        return has_driver
\ No newline at end of file
+        return driver_class_of(driver) in self._driver_settings
+
+    def all_settings(self):
+        """
+        :return: Tuple of all stored settings in the order they were added.
+        """
+        return tuple(self._driver_settings.values())
@@ -0,0 +1,39 @@
+"""
+Revision stamps for change detection.
+
+Every attribute assignment stamps the object with a new revision from a global counter. Objects that compare equal
+by revision have not been assigned to since, which is cheaper to check than comparing their state. Mutations of
+mutable attribute values in place (e.g. appending to a list) are not seen unless the object calls touch().
+"""
+from itertools import count
+
+_revisions = count(1)
+
+# Revision of the last modification of any object.
+_last_revision = [0]
+
+
+def last_revision():
+    """
+    :return: Revision of the latest modification of any revisioned object.
+    """
+    return _last_revision[0]
+
+
+class Revisioned(object):
+    _revision = 0
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        self.touch()
+
+    def touch(self):
+        """
+        Marks the object as modified.
+        """
+        revision = next(_revisions)
+        object.__setattr__(self, "_revision", revision)
+        _last_revision[0] = revision
+
+    def revision(self):
+        return self._revision
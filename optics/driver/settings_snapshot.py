@@ -0,0 +1,168 @@
+"""
+Immutable snapshots of driver settings.
+
+A snapshot copies the attributes of a settings object at the time it is taken. It is hashable with the hash computed
+once, compares equal to snapshots of settings of the same class with equal attributes and can be shared between
+threads or used as cache key. Drivers take snapshots at the start of a run, so that modifying the settings during a
+run has no effect on it.
+
+Snapshots read like the settings they were taken of: attributes (settings._relPrec) and the methods of the settings
+class that only read attributes (settings.to_list()) work the same. Assignments raise.
+
+Attribute values are frozen: nested settings become snapshots, lists and tuples tuples, dictionaries tuples of
+(key, value) pairs sorted by key, sets frozensets. Other values must be hashable. The attribute names are kept once
+per settings class and set of attributes, a snapshot holds its values only.
+"""
+import inspect
+import types
+
+# Attributes of settings objects that are no settings.
+_BOOKKEEPING = ("_revision", "_driver_class")
+
+# (settings class, attribute names) -> (attribute names, name -> index). Shared by all snapshots of the same layout.
+_layouts = {}
+
+
+def _layout(settings_class, names):
+    key = (settings_class, names)
+    layout = _layouts.get(key)
+    if layout is None:
+        layout = _layouts.setdefault(key, (names, dict((name, index) for index, name in enumerate(names))))
+
+    return layout
+
+
+def _freeze(name, value):
+    if isinstance(value, SettingsSnapshot):
+        return value
+    if hasattr(value, "snapshot") and hasattr(value, "driver_class"):
+        return value.snapshot()
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(name, item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(name, item)) for key, item in value.items()))
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(name, item) for item in value)
+
+    try:
+        hash(value)
+    except TypeError:
+        raise Exception("Can not snapshot attribute %s: %s values are not hashable." % (name, type(value).__name__))
+
+    return value
+
+
+def _thaw(value):
+    if isinstance(value, SettingsSnapshot):
+        return value.thaw()
+    if isinstance(value, tuple):
+        return tuple(_thaw(item) for item in value)
+
+    return value
+
+
+def _restore(settings_class, driver_class, names, values):
+    snapshot = object.__new__(SettingsSnapshot)
+    snapshot._initialize(settings_class, driver_class, names, values)
+    return snapshot
+
+
+class SettingsSnapshot(object):
+    __slots__ = ("_settings_class", "_driver_class", "_layout", "_values", "_hash")
+
+    def __init__(self, settings):
+        """
+        Constructor.
+        :param settings: AbstractDriverSetting to take the snapshot of.
+        """
+        attributes = vars(settings)
+        names = tuple(sorted(name for name in attributes if name not in _BOOKKEEPING))
+
+        self._initialize(type(settings), settings.driver_class(), names,
+                         tuple(_freeze(name, attributes[name]) for name in names))
+
+    def _initialize(self, settings_class, driver_class, names, values):
+        layout = _layout(settings_class, names)
+
+        object.__setattr__(self, "_settings_class", settings_class)
+        object.__setattr__(self, "_driver_class", driver_class)
+        object.__setattr__(self, "_layout", layout)
+        object.__setattr__(self, "_values", values)
+        object.__setattr__(self, "_hash", hash((settings_class, layout[0], values)))
+
+    def __getattr__(self, name):
+        if name in SettingsSnapshot.__slots__:
+            # Not initialized (yet).
+            raise AttributeError(name)
+
+        index = self._layout[1].get(name)
+        if index is not None:
+            return self._values[index]
+
+        attribute = getattr(self._settings_class, name)
+        if inspect.isfunction(attribute):
+            return types.MethodType(attribute, self)
+
+        return attribute
+
+    def __setattr__(self, name, value):
+        raise Exception("Settings snapshots are immutable.")
+
+    def __delattr__(self, name):
+        raise Exception("Settings snapshots are immutable.")
+
+    def __reduce__(self):
+        return _restore, (self._settings_class, self._driver_class, self._layout[0], self._values)
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, SettingsSnapshot) or self._hash != other._hash:
+            return False
+
+        return (self._settings_class is other._settings_class and self._layout is other._layout and
+                self._values == other._values)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return "%s(%s)" % (self._settings_class.__name__,
+                           ", ".join("%s=%r" % (name, value) for name, value in self.items()))
+
+    def settings_class(self):
+        return self._settings_class
+
+    def driver_class(self):
+        return self._driver_class
+
+    def driver(self):
+        return self._driver_class
+
+    def is_driver(self, driver):
+        return self._driver_class is (driver if isinstance(driver, type) else type(driver))
+
+    def items(self):
+        """
+        :return: Tuple of (attribute name, frozen value) pairs, sorted by name.
+        """
+        return tuple(zip(self._layout[0], self._values))
+
+    def snapshot(self):
+        return self
+
+    def thaw(self):
+        """
+        :return: New, mutable settings object with the attributes of the snapshot. Frozen lists and dictionaries stay
+                 tuples.
+        """
+        settings = self._settings_class.__new__(self._settings_class)
+        object.__setattr__(settings, "_driver_class", self._driver_class)
+        for name, value in self.items():
+            object.__setattr__(settings, name, _thaw(value))
+        settings.touch()
+
+        return settings
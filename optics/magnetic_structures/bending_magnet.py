@@ -19,6 +19,15 @@ class BendingMagnet(MagneticStructure):
         self._magnetic_field = magnetic_field
         self._length         = length
 
+    def radius(self):
+        return self._radius
+
+    def magnetic_field(self):
+        return self._magnetic_field
+
+    def length(self):
+        return self._length
+
     #
     #methods for practical calculations
     #
@@ -5,9 +5,15 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 from numpy import pi
 import scipy.constants.codata
+from collections import OrderedDict
 
 from optics.magnetic_structures.magnetic_structure import MagneticStructure
 
+codata = scipy.constants.codata.physical_constants
+_SPEED_OF_LIGHT = codata["speed of light in vacuum"][0]
+_ELECTRON_MASS = codata["electron mass"][0]
+_ELEMENTARY_CHARGE = codata["elementary charge"][0]
+
 
 class InsertionDevice(MagneticStructure):
     def __init__(self, K_vertical, K_horizontal, period_length, periods_number):
@@ -34,12 +40,7 @@ class InsertionDevice(MagneticStructure):
         return self._K_horizontal
 
     def _magneticFieldStrengthFromK(self, K):
-        codata = scipy.constants.codata.physical_constants
-        speed_of_light = codata["speed of light in vacuum"][0]
-        mass_electron = codata["electron mass"][0]
-        elementary_charge=codata["elementary charge"][0]
-
-        B = K * 2 * pi * mass_electron * speed_of_light / (elementary_charge * self.periodLength())
+        B = K * 2 * pi * _ELECTRON_MASS * _SPEED_OF_LIGHT / (_ELEMENTARY_CHARGE * self.periodLength())
 
         return B
 
@@ -48,3 +49,11 @@ class InsertionDevice(MagneticStructure):
 
     def B_horizontal(self):
         return self._magneticFieldStrengthFromK(self.K_horizontal())
+
+    def to_dictionary(self):
+        #returns a dictionary with the variable names as keys, and a tuple with value, unit and doc string
+        mytuple = [ ("K_vertical"          ,( self._K_vertical          ,"" ,  "Deflection parameter (vertical field)"   ) ),
+                    ("K_horizontal"        ,( self._K_horizontal        ,"" ,  "Deflection parameter (horizontal field)" ) ),
+                    ("period_length"       ,( self._period_length       ,"m",  "Period length"                           ) ),
+                    ("periods_number"      ,( self._periods_number      ,"" ,  "Number of periods"                       ) )]
+        return(OrderedDict(mytuple))
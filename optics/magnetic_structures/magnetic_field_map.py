@@ -0,0 +1,209 @@
+"""
+Implements a magnetic structure given by a tabulated 3D field map, e.g. a measured insertion device.
+
+The table has the shape (n_z, n_y, n_x, 3) with the components (B_x, B_y, B_z) in T on a regular mesh, i.e. x runs
+fastest like in SRW field files. Measured maps are large, so the table is usually a read-only np.memmap of a .npy
+file (see open_magnetic_field_map). Interpolation only reads the block of the table around the requested points,
+i.e. for an electron trajectory the operating system pages in the slab near the axis, not the whole file.
+"""
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from collections import OrderedDict
+
+import numpy as np
+
+from optics.magnetic_structures.magnetic_structure import MagneticStructure
+
+LINEAR = "linear"
+CUBIC = "cubic"
+
+# Points interpolated at once. Bounds the temporary stencil arrays (64 x 3 values per point for cubic).
+_POINTS_PER_CHUNK = 65536
+
+
+def open_magnetic_field_map(filename, x, y, z, interpolation=LINEAR):
+    """
+    Opens a field map stored as .npy file of shape (n_z, n_y, n_x, 3) without reading it.
+    :param filename: Name of the .npy file.
+    :param x: Horizontal mesh coordinates in m (regular).
+    :param y: Vertical mesh coordinates in m (regular).
+    :param z: Longitudinal mesh coordinates in m (regular).
+    :param interpolation: LINEAR or CUBIC.
+    :return: MagneticFieldMap backed by a read-only memory map.
+    """
+    return MagneticFieldMap(np.load(filename, mmap_mode="r"), x, y, z, interpolation)
+
+
+def save_magnetic_field_map(filename, field_table):
+    """
+    Saves a field table of shape (n_z, n_y, n_x, 3) such that open_magnetic_field_map can map it.
+    """
+    np.save(filename, np.ascontiguousarray(field_table, dtype=float))
+
+
+def _cubic_weights(t):
+    # Catmull-Rom weights of the points -1, 0, 1, 2 for 0 <= t < 1.
+    t2 = t**2
+    t3 = t2 * t
+    return np.stack((0.5 * (-t3 + 2.0 * t2 - t),
+                     0.5 * (3.0 * t3 - 5.0 * t2 + 2.0),
+                     0.5 * (-3.0 * t3 + 4.0 * t2 + t),
+                     0.5 * (t3 - t2)), axis=-1)
+
+
+def _linear_weights(t):
+    return np.stack((1.0 - t, t), axis=-1)
+
+
+class MagneticFieldMap(MagneticStructure):
+    def __init__(self, field_table, x, y, z, interpolation=LINEAR):
+        """
+        Constructor.
+        :param field_table: Array (n_z, n_y, n_x, 3) of (B_x, B_y, B_z) in T, typically a np.memmap.
+        :param x: Horizontal mesh coordinates in m (regular).
+        :param y: Vertical mesh coordinates in m (regular).
+        :param z: Longitudinal mesh coordinates in m (regular).
+        :param interpolation: LINEAR (trilinear) or CUBIC (tricubic Catmull-Rom).
+        """
+        MagneticStructure.__init__(self)
+
+        self._x = np.asarray(x, dtype=float)
+        self._y = np.asarray(y, dtype=float)
+        self._z = np.asarray(z, dtype=float)
+
+        if field_table.shape != (len(self._z), len(self._y), len(self._x), 3):
+            raise Exception("Field table shape %s does not match mesh (%d, %d, %d, 3)." %
+                            (str(field_table.shape), len(self._z), len(self._y), len(self._x)))
+
+        if interpolation not in (LINEAR, CUBIC):
+            raise Exception("Unknown interpolation: %s" % interpolation)
+
+        self._field_table = field_table
+        self._interpolation = interpolation
+
+    def field_table(self):
+        return self._field_table
+
+    def x(self):
+        return self._x
+
+    def y(self):
+        return self._y
+
+    def z(self):
+        return self._z
+
+    def interpolation(self):
+        return self._interpolation
+
+    def length(self):
+        return self._z[-1] - self._z[0]
+
+    def center(self):
+        """
+        :return: (x, y, z) of the mesh center in m.
+        """
+        return tuple(0.5 * (coordinates[0] + coordinates[-1]) for coordinates in (self._x, self._y, self._z))
+
+    def _axes(self):
+        return (self._z, self._y, self._x)
+
+    def _stencil(self, coordinates, position, n_stencil):
+        """
+        First stencil index and weights of the points along one axis. Axes with a single point have weight 1.
+        """
+        n = len(coordinates)
+        if n == 1:
+            return np.zeros(position.shape, dtype=int), np.ones(position.shape + (1,))
+
+        step = coordinates[1] - coordinates[0]
+        index_float = (position - coordinates[0]) / step
+        index = np.clip(np.floor(index_float).astype(int), 0, n - 2)
+        t = index_float - index
+
+        if n_stencil == 4:
+            return index - 1, _cubic_weights(t)
+
+        return index, _linear_weights(t)
+
+    def field_at(self, x, y, z):
+        """
+        Interpolates the field. Arguments broadcast against each other.
+        Points outside the mesh have zero field. Along axes with a single mesh point (e.g. a map measured on axis
+        only) the field is taken as constant.
+        :param x: Horizontal positions in m.
+        :param y: Vertical positions in m.
+        :param z: Longitudinal positions in m.
+        :return: (B_x, B_y, B_z) in T, each with the broadcast shape of the positions.
+        """
+        x, y, z = np.broadcast_arrays(*[np.asarray(coordinate, dtype=float) for coordinate in (x, y, z)])
+        shape = x.shape
+        points = (z.ravel(), y.ravel(), x.ravel())
+
+        field = np.empty((points[0].size, 3))
+        for start in range(0, points[0].size, _POINTS_PER_CHUNK):
+            chunk = slice(start, start + _POINTS_PER_CHUNK)
+            field[chunk] = self._interpolate(*[position[chunk] for position in points])
+
+        return tuple(field[:, component].reshape(shape) for component in range(3))
+
+    def _interpolate(self, z, y, x):
+        n_stencil = 4 if self._interpolation == CUBIC else 2
+
+        inside = np.ones(z.shape, dtype=bool)
+        stencils = []
+        for coordinates, position in zip(self._axes(), (z, y, x)):
+            if len(coordinates) > 1:
+                inside &= (position >= coordinates[0]) & (position <= coordinates[-1])
+            stencils.append(self._stencil(coordinates, position, n_stencil))
+
+        # Read only the block of the table that the stencils touch.
+        block_slices = []
+        for coordinates, (index, weights) in zip(self._axes(), stencils):
+            width = weights.shape[-1]
+            first = max(int(index.min()), 0) if index.size else 0
+            last = min(int(index.max()) + width, len(coordinates)) if index.size else 1
+            block_slices.append(slice(first, max(last, first + 1)))
+        block = np.asarray(self._field_table[tuple(block_slices)])
+
+        # Sum over the stencil axis by axis: z, then y, then x.
+        (index_z, weights_z), (index_y, weights_y), (index_x, weights_x) = stencils
+        offsets = [np.arange(weights.shape[-1]) for weights in (weights_z, weights_y, weights_x)]
+
+        iz = np.clip(index_z[:, np.newaxis] + offsets[0] - block_slices[0].start, 0, block.shape[0] - 1)
+        iy = np.clip(index_y[:, np.newaxis] + offsets[1] - block_slices[1].start, 0, block.shape[1] - 1)
+        ix = np.clip(index_x[:, np.newaxis] + offsets[2] - block_slices[2].start, 0, block.shape[2] - 1)
+
+        values = block[iz[:, :, np.newaxis, np.newaxis], iy[:, np.newaxis, :, np.newaxis], ix[:, np.newaxis, np.newaxis, :]]
+        weights = weights_z[:, :, np.newaxis, np.newaxis] * weights_y[:, np.newaxis, :, np.newaxis] * \
+                  weights_x[:, np.newaxis, np.newaxis, :]
+
+        field = np.einsum("nijkc,nijk->nc", values, weights)
+
+        return np.where(inside[:, np.newaxis], field, 0.0)
+
+    def slab(self, x_range, y_range, margin=2):
+        """
+        Copies the part of the table within a transverse window into memory, e.g. around the electron trajectory.
+        :param x_range: (x_min, x_max) in m.
+        :param y_range: (y_min, y_max) in m.
+        :param margin: Additional mesh points on each side, for the interpolation stencil.
+        :return: MagneticFieldMap with an in-memory table.
+        """
+        slices = []
+        for coordinates, (low, high) in ((self._y, y_range), (self._x, x_range)):
+            first = max(int(np.searchsorted(coordinates, low, side="right")) - 1 - margin, 0)
+            last = min(int(np.searchsorted(coordinates, high, side="left")) + 1 + margin, len(coordinates))
+            slices.append(slice(first, max(last, first + 1)))
+
+        table = np.array(self._field_table[:, slices[0], slices[1], :])
+
+        return MagneticFieldMap(table, self._x[slices[1]], self._y[slices[0]], self._z, self._interpolation)
+
+    def to_dictionary(self):
+        #returns a dictionary with the variable names as keys, and a tuple with value, unit and doc string
+        mytuple = [ ("x_range"             ,( (self._x[0], self._x[-1], len(self._x)), "m", "Horizontal mesh (start, end, points)"   ) ),
+                    ("y_range"             ,( (self._y[0], self._y[-1], len(self._y)), "m", "Vertical mesh (start, end, points)"     ) ),
+                    ("z_range"             ,( (self._z[0], self._z[-1], len(self._z)), "m", "Longitudinal mesh (start, end, points)" ) ),
+                    ("interpolation"       ,( self._interpolation                    , "" , "Interpolation (linear, cubic)"          ) )]
+        return(OrderedDict(mytuple))
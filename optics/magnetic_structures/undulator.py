@@ -1,5 +1,8 @@
 """
 Implement an undulator with vertical and horizontal magnetic fields.
+
+The resonance methods broadcast over NumPy arrays of gamma, angles, harmonics and deflection parameters. With scalar
+arguments they return scalars as before.
 """
 from __future__ import absolute_import, division, print_function, unicode_literals
 
@@ -8,29 +11,100 @@ import scipy.constants.codata
 
 from optics.magnetic_structures.insertion_device import InsertionDevice
 
+codata = scipy.constants.codata.physical_constants
+_SPEED_OF_LIGHT = codata["speed of light in vacuum"][0]
+_PLANCK_CONSTANT = codata["Planck constant"][0]
+_ELEMENTARY_CHARGE = codata["elementary charge"][0]
+
 
 class Undulator(InsertionDevice):
 
     def __init__(self, K_vertical, K_horizontal, period_length, periods_number):
         InsertionDevice.__init__(self, K_vertical, K_horizontal, period_length, periods_number)
 
-    def resonanceWavelength(self, gamma, theta_x, theta_z):
+    def _deflectionTerm(self, K_vertical, K_horizontal):
+        # 1 + K^2/2 with K^2 = K_vertical^2 + K_horizontal^2. Deflection parameters not given are the undulator's.
+        if K_vertical is None:
+            K_vertical = self.K_vertical()
+        if K_horizontal is None:
+            K_horizontal = self.K_horizontal()
+
+        return 1.0 + np.square(K_vertical) / 2.0 + np.square(K_horizontal) / 2.0
+
+    def resonanceWavelength(self, gamma, theta_x, theta_z, K_vertical=None, K_horizontal=None):
+        """
+        Wavelength of the first harmonic.
+        All arguments broadcast against each other.
+        :param gamma: Lorentz factor of the electrons.
+        :param theta_x: Horizontal observation angle in rad.
+        :param theta_z: Vertical observation angle in rad.
+        :param K_vertical: Vertical deflection parameter. Defaults to the undulator's.
+        :param K_horizontal: Horizontal deflection parameter. Defaults to the undulator's.
+        :return: Wavelength in m.
+        """
+        gamma = np.asarray(gamma, dtype=float)
         wavelength = (self.periodLength() / (2.0*gamma **2)) * \
-                     (1 + self.K_vertical()**2 / 2.0 + self.K_horizontal()**2 / 2.0 + \
-                      gamma**2 * (theta_x**2 + theta_z ** 2))
+                     (self._deflectionTerm(K_vertical, K_horizontal) + \
+                      gamma**2 * (np.square(theta_x) + np.square(theta_z)))
         return wavelength
 
-    def resonanceFrequency(self, gamma, theta_x, theta_z):
-        codata = scipy.constants.codata.physical_constants
-        codata_c = codata["speed of light in vacuum"][0]
-
-        frequency = codata_c / self.resonanceWavelength(gamma, theta_x, theta_z)
+    def resonanceFrequency(self, gamma, theta_x, theta_z, K_vertical=None, K_horizontal=None):
+        """
+        Frequency of the first harmonic in Hz. Arguments as for resonanceWavelength.
+        """
+        frequency = _SPEED_OF_LIGHT / self.resonanceWavelength(gamma, theta_x, theta_z, K_vertical, K_horizontal)
         return frequency
 
-    def resonanceEnergy(self, gamma, theta_x, theta_y, harmonic=1):
-        codata = scipy.constants.codata.physical_constants
-        energy_in_ev = codata["Planck constant"][0] * self.resonanceFrequency(gamma, theta_x, theta_y) / codata["elementary charge"][0]
-        return energy_in_ev*harmonic
+    def resonanceEnergy(self, gamma, theta_x, theta_y, harmonic=1, K_vertical=None, K_horizontal=None):
+        """
+        Photon energy of a harmonic in eV. Arguments as for resonanceWavelength, harmonic broadcasts as well.
+        """
+        energy_in_ev = _PLANCK_CONSTANT * self.resonanceFrequency(gamma, theta_x, theta_y, K_vertical, K_horizontal) / _ELEMENTARY_CHARGE
+        return energy_in_ev*np.asarray(harmonic)
+
+    def gaussianCentralConeDivergence(self, gamma, n=1, K_vertical=None, K_horizontal=None):
+        """
+        Divergence in rad of the central cone of harmonic n in Gaussian approximation. Arguments broadcast.
+        """
+        return (1/np.asarray(gamma, dtype=float))*np.sqrt((1.0/(2.0*np.asarray(n)*self.periodNumber())) * self._deflectionTerm(K_vertical, K_horizontal))
+
+    def resonanceEnergyGrid(self, gamma, theta_x, theta_y, harmonics=(1,)):
+        """
+        Resonance energies on a grid of observation angles.
+        :param gamma: Lorentz factor of the electrons (scalar).
+        :param theta_x: 1D array of horizontal angles in rad.
+        :param theta_y: 1D array of vertical angles in rad.
+        :param harmonics: 1D array of harmonics.
+        :return: Energies in eV, array (n_harmonics, n_theta_x, n_theta_y).
+        """
+        harmonics = np.asarray(harmonics)[:, np.newaxis, np.newaxis]
+        theta_x = np.asarray(theta_x, dtype=float)[np.newaxis, :, np.newaxis]
+        theta_y = np.asarray(theta_y, dtype=float)[np.newaxis, np.newaxis, :]
+
+        return self.resonanceEnergy(gamma, theta_x, theta_y, harmonics)
+
+    def tuningEnergyGrid(self, gamma, K_values, harmonics=(1,), theta_x=0.0, theta_y=0.0):
+        """
+        Resonance energies over a range of vertical deflection parameters, i.e. the tuning curves of the harmonics.
+        The horizontal deflection parameter is the undulator's.
+        :param gamma: Lorentz factor of the electrons (scalar).
+        :param K_values: 1D array of vertical deflection parameters.
+        :param harmonics: 1D array of harmonics.
+        :param theta_x: Horizontal observation angle in rad.
+        :param theta_y: Vertical observation angle in rad.
+        :return: Energies in eV, array (n_harmonics, n_K).
+        """
+        harmonics = np.asarray(harmonics)[:, np.newaxis]
+        K_values = np.asarray(K_values, dtype=float)[np.newaxis, :]
+
+        return self.resonanceEnergy(gamma, theta_x, theta_y, harmonics, K_vertical=K_values)
+
+    def centralConeDivergenceGrid(self, gamma, K_values, harmonics=(1,)):
+        """
+        Central cone divergences over a range of vertical deflection parameters.
+        :return: Divergences in rad, array (n_harmonics, n_K).
+        """
+        harmonics = np.asarray(harmonics)[:, np.newaxis]
+        K_values = np.asarray(K_values, dtype=float)[np.newaxis, :]
 
-    def gaussianCentralConeDivergence(self, gamma, n=1):
-        return (1/gamma)*np.sqrt((1.0/(2.0*n*self.periodNumber())) * (1.0 + self.K_horizontal()**2/2.0 + self.K_vertical()**2/2.0))
+        return self.gaussianCentralConeDivergence(gamma, harmonics, K_vertical=K_values)
@@ -0,0 +1,79 @@
+"""
+Tests ordering and lookups of the beamline container.
+"""
+import numpy as np
+
+from optics.beamline.beamline import Beamline
+from optics.beamline.beamline_position import BeamlinePosition
+from optics.beamline.optical_elements.image_plane import ImagePlane
+
+
+def test_beamline_order():
+    beamline = Beamline()
+    positions = [5.0, 1.0, 3.0, 3.0, 0.5, 10.0]
+    components = [ImagePlane("plane_%d" % index) for index in range(len(positions))]
+
+    for component, z in zip(components, positions):
+        beamline.attach_component_at(component, BeamlinePosition(z))
+
+    # Sorted by z, equal positions in order of attachment.
+    assert [component.name() for component in beamline] == ["plane_4", "plane_1", "plane_2", "plane_3",
+                                                             "plane_0", "plane_5"]
+    assert len(beamline) == 6
+
+    for component, z in zip(components, positions):
+        assert beamline.position_of(component).z() == z
+
+    assert beamline.previous_component(components[4]) is None
+    assert beamline.next_component(components[5]) is None
+    assert beamline.next_component(components[2]) is components[3]
+    assert beamline.previous_component(components[0]) is components[3]
+    assert beamline.component_by_index(0) is components[4]
+    assert beamline.component_by_index(6) is None
+
+    # Insertions in front shift the lookups.
+    front = ImagePlane("front")
+    beamline.attach_component_at(front, BeamlinePosition(0.0))
+    assert beamline.next_component(front) is components[4]
+    assert beamline.previous_component(components[4]) is front
+    assert beamline.position_of(components[5]).z() == 10.0
+
+
+def test_beamline_lookups():
+    beamline = Beamline()
+    first = ImagePlane("screen")
+    second = ImagePlane("screen")
+    beamline.attach_component_at(second, BeamlinePosition(2.0))
+    beamline.attach_component_at(first, BeamlinePosition(1.0))
+
+    assert beamline.component_by_name("screen") is first
+    assert beamline.component_by_name("missing") is None
+
+    try:
+        beamline.position_of(ImagePlane("detached"))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Detached components must raise ValueError.")
+
+
+def test_beamline_random_insertion():
+    random_state = np.random.RandomState(0)
+    positions = random_state.uniform(0.0, 100.0, 500)
+
+    beamline = Beamline()
+    components = [ImagePlane("plane_%d" % index) for index in range(len(positions))]
+    for component, z in zip(components, positions):
+        beamline.attach_component_at(component, BeamlinePosition(z))
+
+    order = np.argsort(positions, kind="stable")
+    assert [component for component in beamline] == [components[index] for index in order]
+
+    for rank, index in enumerate(order[:-1]):
+        assert beamline.next_component(components[index]) is components[order[rank + 1]]
+
+
+if __name__ == "__main__":
+    test_beamline_order()
+    test_beamline_lookups()
+    test_beamline_random_insertion()
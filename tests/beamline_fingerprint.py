@@ -0,0 +1,132 @@
+"""
+Tests fingerprints and structural diffs of beamlines.
+"""
+from optics.beamline.beamline import Beamline
+from optics.beamline.beamline_position import BeamlinePosition
+from optics.beamline.optical_elements.image_plane import ImagePlane
+from optics.beamline.optical_elements.lens.lens_ideal import LensIdeal
+
+from code_drivers.fourier_optics.fourier_optics_beamline_component_setting import FourierOpticsBeamlineComponentSetting
+
+
+def create_beamline(n_lenses=20):
+    beamline = Beamline()
+    for index in range(n_lenses):
+        beamline.attach_component_at(LensIdeal("lens_%d" % index, 1.0 + index, 2.0 + index),
+                                     BeamlinePosition(2.0 * index))
+    beamline.attach_component_at(ImagePlane("screen"), BeamlinePosition(2.0 * n_lenses))
+
+    return beamline
+
+
+def test_beamline_fingerprint_stable():
+    first = create_beamline()
+    second = create_beamline()
+
+    assert first.fingerprint() == second.fingerprint()
+    assert first.component_fingerprints() == second.component_fingerprints()
+    assert first.diff(second) is None
+
+    # Different names, parameters or positions.
+    assert Beamline().fingerprint() != first.fingerprint()
+    assert create_beamline(19).diff(first) == 19
+
+    second.component_by_index(7)._focal_x = 100.0
+    assert first.diff(second) == 7
+    assert second.diff(first) == 7
+    second.component_by_index(7)._focal_x = 8.0
+    assert first.diff(second) is None
+
+    second.position_of(second.component_by_index(12))._x = 1e-3
+    assert first.diff(second) == 12
+
+
+def test_beamline_fingerprint_settings():
+    first = create_beamline()
+    second = create_beamline()
+
+    settings = FourierOpticsBeamlineComponentSetting()
+    second.component_by_index(5).add_settings(settings)
+    assert first.diff(second) == 5
+
+    first_settings = FourierOpticsBeamlineComponentSetting()
+    first.component_by_index(5).add_settings(first_settings)
+    assert first.diff(second) is None
+
+    settings.set_resize_factor_horizontal(2.0)
+    assert first.diff(second) == 5
+
+    first_settings.set_resize_factor_horizontal(2.0)
+    first_settings.set_drift_space_settings(FourierOpticsBeamlineComponentSetting())
+    assert first.diff(second) == 5
+    settings.set_drift_space_settings(FourierOpticsBeamlineComponentSetting())
+    assert first.diff(second) is None
+
+    second.component_by_index(5).remove_settings(settings.driver())
+    assert first.diff(second) == 5
+
+
+def test_beamline_fingerprint_nested_settings():
+    first = create_beamline()
+    second = create_beamline()
+
+    for beamline in (first, second):
+        settings = FourierOpticsBeamlineComponentSetting()
+        settings.set_drift_space_settings(FourierOpticsBeamlineComponentSetting())
+        beamline.component_by_index(5).add_settings(settings)
+    assert first.diff(second) is None
+
+    # Modifying the nested drift space settings after fingerprinting.
+    drift_space_settings = second.component_by_index(5).settings(settings.driver()).drift_space_settings()
+    drift_space_settings.set_resize_factor_horizontal(3.0)
+    assert first.diff(second) == 5
+    assert second.diff(first) == 5
+
+    drift_space_settings.set_resize_factor_horizontal(1.0)
+    assert first.diff(second) is None
+
+
+def test_beamline_fingerprint_insertion():
+    first = create_beamline()
+    second = create_beamline()
+    first.fingerprint()
+    second.fingerprint()
+
+    second.attach_component_at(ImagePlane("intermediate"), BeamlinePosition(9.0))
+    assert first.diff(second) == 5
+    assert len(second.component_fingerprints()) == len(first) + 1
+    assert second.component_fingerprints()[6:] == first.component_fingerprints()[5:]
+
+
+def test_beamline_fingerprint_cached():
+    beamline = create_beamline(200)
+    beamline.fingerprint()
+
+    # Unmodified beamlines are not fingerprinted again.
+    counts = []
+    import optics.beamline.beamline as beamline_module
+    original = beamline_module.component_fingerprint
+
+    def counting(component, position):
+        counts.append(component.name())
+        return original(component, position)
+
+    beamline_module.component_fingerprint = counting
+    try:
+        beamline.fingerprint()
+        assert counts == []
+
+        beamline.component_by_index(150)._focal_y = 0.5
+        beamline.component_by_index(3)._focal_y = 0.5
+        beamline.fingerprint()
+        assert sorted(counts) == ["lens_150", "lens_3"]
+    finally:
+        beamline_module.component_fingerprint = original
+
+
+if __name__ == "__main__":
+    test_beamline_fingerprint_stable()
+    test_beamline_fingerprint_settings()
+    test_beamline_fingerprint_nested_settings()
+    test_beamline_fingerprint_insertion()
+    test_beamline_fingerprint_cached()
@@ -0,0 +1,83 @@
+"""
+Tests the placement transforms of beamline positions.
+"""
+import time
+
+import numpy as np
+
+from optics.beamline.beamline_position import BeamlinePosition
+
+
+def test_placement_transform():
+    position = BeamlinePosition(10.0)
+    assert np.allclose(position.to_component_frame([0.0, 0.0, 10.0]), 0.0)
+
+    # Shifted and inclined in the x-z plane.
+    position = BeamlinePosition(10.0, x=1e-3, angle_radial=0.01)
+    transform = position.transform()
+    assert np.allclose(transform[:3, 2], [np.sin(0.01), 0.0, np.cos(0.01)])
+    assert np.allclose(transform[:3, 1], [0.0, 1.0, 0.0])
+
+    # Inclined towards y.
+    position = BeamlinePosition(10.0, angle_radial=0.01, angle_azimuthal=0.5 * np.pi)
+    assert np.allclose(position.transform()[:3, 2], [0.0, np.sin(0.01), np.cos(0.01)])
+    assert np.allclose(position.transform()[:3, 0], [1.0, 0.0, 0.0])
+
+    # Rigid: inverse, orthonormal.
+    position = BeamlinePosition(3.0, x=0.1, y=-0.2, angle_radial=0.3, angle_azimuthal=1.1)
+    assert np.allclose(position.transform().dot(position.inverse_transform()), np.identity(4))
+    assert np.allclose(position.transform()[:3, :3].T.dot(position.transform()[:3, :3]), np.identity(3))
+
+
+def test_transform_cache():
+    position = BeamlinePosition(10.0)
+    transform = position.transform()
+    assert position.transform() is transform
+
+    revision = position.revision()
+    position.inverse_transform()
+    assert position.revision() == revision
+
+    position._x = 0.5
+    assert position.transform() is not transform
+    assert position.transform()[0, 3] == 0.5
+
+
+def test_transform_rays():
+    random_state = np.random.RandomState(0)
+    n_rays = 10**6
+    points = random_state.normal(size=(n_rays, 3))
+    directions = random_state.normal(size=(n_rays, 3))
+    directions /= np.linalg.norm(directions, axis=1)[:, np.newaxis]
+
+    position = BeamlinePosition(20.0, x=1e-3, y=2e-3, angle_radial=2e-3, angle_azimuthal=0.7)
+
+    start = time.time()
+    local_points, local_directions = position.to_component_frame(points, directions)
+    print("Transformed %d rays in %.3f s" % (n_rays, time.time() - start))
+
+    global_points, global_directions = position.to_global_frame(local_points, local_directions)
+    assert np.allclose(global_points, points)
+    assert np.allclose(global_directions, directions)
+    assert np.allclose(np.linalg.norm(local_directions, axis=1), 1.0)
+
+    # Per ray homogeneous product.
+    homogeneous = np.concatenate((points[:5], np.ones((5, 1))), axis=1)
+    expected = np.array([position.inverse_transform().dot(point) for point in homogeneous])
+    assert np.allclose(local_points[:5], expected[:, :3])
+
+    # Mesh points lie in the component plane.
+    x = np.linspace(-1e-3, 1e-3, 11)
+    y = np.linspace(-2e-3, 2e-3, 21)
+    mesh = position.mesh_points(x, y)
+    assert mesh.shape == (11, 21, 3)
+    local_mesh = position.to_component_frame(mesh)
+    assert np.allclose(local_mesh[:, :, 2], 0.0)
+    assert np.allclose(local_mesh[:, 3, 0], x)
+    assert np.allclose(local_mesh[4, :, 1], y)
+
+
+if __name__ == "__main__":
+    test_placement_transform()
+    test_transform_cache()
+    test_transform_rays()
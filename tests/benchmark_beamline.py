@@ -0,0 +1,52 @@
+"""
+Measures attaching 10^4 components to a beamline and one driver-like pass over it, i.e. asking for the position and
+the neighbours of every component.
+"""
+import time
+
+import numpy as np
+
+from optics.beamline.beamline import Beamline
+from optics.beamline.beamline_position import BeamlinePosition
+from optics.beamline.optical_elements.image_plane import ImagePlane
+
+
+def benchmark_beamline(n_components=10000):
+    random_state = np.random.RandomState(0)
+    positions = random_state.uniform(0.0, 1000.0, n_components)
+    components = [ImagePlane("segment_%d" % index) for index in range(n_components)]
+
+    beamline = Beamline()
+    t0 = time.time()
+    for component, z in zip(components, positions):
+        beamline.attach_component_at(component, BeamlinePosition(z))
+    time_attach = time.time() - t0
+
+    t0 = time.time()
+    total_length = 0.0
+    for component in beamline:
+        position = beamline.position_of(component)
+        previous_component = beamline.previous_component(component)
+        next_component = beamline.next_component(component)
+
+        if next_component is not None:
+            total_length += beamline.position_of(next_component).z() - position.z()
+    time_pass = time.time() - t0
+
+    t0 = time.time()
+    for index in range(0, n_components, 10):
+        assert beamline.component_by_name("segment_%d" % index) is components[index]
+    time_names = time.time() - t0
+
+    assert np.isclose(total_length, positions.max() - positions.min())
+
+    print("components      : %d" % n_components)
+    print("attach          : %10.4f s" % time_attach)
+    print("driver pass     : %10.4f s" % time_pass)
+    print("name lookups    : %10.4f s" % time_names)
+
+    return time_attach, time_pass
+
+
+if __name__ == "__main__":
+    benchmark_beamline()
@@ -0,0 +1,65 @@
+"""
+Measures settings lookups of a driver-like pass: 10^3 components with settings for 8 drivers each, every component
+asked 100 times for the settings of each driver, by driver instance and by driver class. Also measures creating
+settings, which no longer creates driver instances.
+"""
+import time
+
+from optics.driver.abstract_driver import AbstractDriver
+from optics.driver.abstract_driver_setting import AbstractDriverSetting
+from optics.driver.driver_setting_manager import DriverSettingManager
+from code_drivers.fourier_optics.fourier_optics_driver_setting import FourierOpticsDriverSetting
+
+
+def benchmark_driver_settings(n_components=1000, n_drivers=8, n_lookups=100):
+    driver_classes = [type("BenchmarkDriver%d" % index, (AbstractDriver,), {}) for index in range(n_drivers)]
+    drivers = [driver_class() for driver_class in driver_classes]
+
+    managers = [DriverSettingManager() for _ in range(n_components)]
+    t0 = time.time()
+    for manager in managers:
+        for driver_class in driver_classes:
+            manager.add_settings(AbstractDriverSetting(driver_class))
+    time_add = time.time() - t0
+
+    t0 = time.time()
+    for manager in managers:
+        for _ in range(n_lookups):
+            for driver in drivers:
+                manager.settings(driver)
+    time_instances = time.time() - t0
+
+    t0 = time.time()
+    for manager in managers:
+        for _ in range(n_lookups):
+            for driver_class in driver_classes:
+                manager.settings(driver_class)
+    time_classes = time.time() - t0
+
+    # Only the last driver is missing settings: worst case of the former linear search.
+    for manager in managers:
+        manager.remove_settings(driver_classes[-1])
+    t0 = time.time()
+    for manager in managers:
+        for _ in range(n_lookups):
+            assert not manager.has_settings(drivers[-1])
+    time_missing = time.time() - t0
+
+    t0 = time.time()
+    for _ in range(n_components * n_drivers):
+        FourierOpticsDriverSetting()
+    time_create = time.time() - t0
+
+    n_total = n_components * n_lookups * n_drivers
+    print("components      : %d, drivers: %d" % (n_components, n_drivers))
+    print("add settings    : %10.4f s" % time_add)
+    print("by instance     : %10.4f s (%.0f ns per lookup)" % (time_instances, 1e9 * time_instances / n_total))
+    print("by class        : %10.4f s (%.0f ns per lookup)" % (time_classes, 1e9 * time_classes / n_total))
+    print("missing         : %10.4f s" % time_missing)
+    print("create settings : %10.4f s" % time_create)
+
+    return time_instances, time_classes
+
+
+if __name__ == "__main__":
+    benchmark_driver_settings()
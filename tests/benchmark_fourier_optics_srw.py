@@ -0,0 +1,98 @@
+"""
+Compares the propagation time of the Fourier optics driver with SRW for the infrared bending magnet example.
+
+Only example 0 (infrared) of tests/bending_magnet_srw is covered, the X-ray example 1 is not benchmarked.
+
+SRW calculates the source wavefront once. The horizontal electric field is then propagated through the same beamline
+by SRW and by the Fourier optics driver.
+
+The meshes differ. The source mesh is (3500, 120). The automatic resizing of SRW coarsens it to (750, 64) at the
+screen. The Fourier optics driver refines where needed but never coarsens. The benchmark caps its automatic resizing
+at max_points (default 1024) per axis, which gives (3500, 865) with the flux within a few percent. Since the drivers
+end on different meshes, the times are compared per point of the final mesh. The total times and meshes are printed
+as well. max_points=None runs the driver unlimited.
+"""
+import time
+from copy import deepcopy
+
+import numpy as np
+
+from code_drivers.SRW.SRW_driver import SRWDriver
+from code_drivers.fourier_optics.fourier_optics_driver import FourierOpticsDriver
+from code_drivers.fourier_optics.fourier_optics_wavefront import FourierOpticsWavefront
+from code_drivers.fourier_optics.fourier_optics_beamline_component_setting import FourierOpticsBeamlineComponentSetting
+
+from tests.bending_magnet_srw import define_bending_magnet_srw
+
+
+def fourier_optics_wavefront_from_srw(srw_wavefront):
+    """
+    Converts the horizontal electric field of a SRW wavefront.
+    SRW stores the field interleaved (real, imaginary) with the energy index running fastest, then x, then y.
+    """
+    mesh = srw_wavefront.mesh
+
+    e_x = np.array(srw_wavefront.arEx, dtype=float).reshape(mesh.ny, mesh.nx, mesh.ne, 2)
+    field = (e_x[..., 0] + 1j * e_x[..., 1]).transpose(2, 1, 0)
+
+    return FourierOpticsWavefront(field,
+                                  np.linspace(mesh.xStart, mesh.xFin, mesh.nx),
+                                  np.linspace(mesh.yStart, mesh.yFin, mesh.ny),
+                                  np.linspace(mesh.eStart, mesh.eFin, mesh.ne),
+                                  mesh.zStart)
+
+
+def capped_settings(max_points):
+    settings = FourierOpticsBeamlineComponentSetting()
+    settings.set_max_points(max_points)
+
+    drift_space_settings = FourierOpticsBeamlineComponentSetting()
+    drift_space_settings.set_max_points(max_points)
+    settings.set_drift_space_settings(drift_space_settings)
+
+    return settings
+
+
+def benchmark_fourier_optics_srw(max_points=1024):
+    electron_beam, bending_magnet, beamline, energy = define_bending_magnet_srw(0)
+
+    if max_points is not None:
+        for component in beamline:
+            component.add_settings(capped_settings(max_points))
+
+    srw_driver = SRWDriver()
+    source_wavefront = srw_driver.calculate_source_wavefront(electron_beam, bending_magnet, beamline,
+                                                             energy, energy)
+    fourier_optics_wavefront = fourier_optics_wavefront_from_srw(source_wavefront)
+
+    t0 = time.time()
+    srw_wavefront = srw_driver.propagate(deepcopy(source_wavefront), beamline)
+    time_srw = time.time() - t0
+
+    t0 = time.time()
+    fourier_optics_wavefront = FourierOpticsDriver().propagate(fourier_optics_wavefront, beamline)
+    time_fourier_optics = time.time() - t0
+
+    flux_srw = np.sum(fourier_optics_wavefront_from_srw(srw_wavefront).intensity()) * \
+               (srw_wavefront.mesh.xFin - srw_wavefront.mesh.xStart) / max(1, srw_wavefront.mesh.nx - 1) * \
+               (srw_wavefront.mesh.yFin - srw_wavefront.mesh.yStart) / max(1, srw_wavefront.mesh.ny - 1)
+    flux_fourier_optics = np.sum(fourier_optics_wavefront.intensity()) * \
+                          fourier_optics_wavefront.dx() * fourier_optics_wavefront.dy()
+
+    srw_mesh = (srw_wavefront.mesh.nx, srw_wavefront.mesh.ny)
+    fourier_optics_mesh = fourier_optics_wavefront.field().shape[1:]
+    time_per_point_srw = time_srw / np.prod(srw_mesh)
+    time_per_point_fourier_optics = time_fourier_optics / np.prod(fourier_optics_mesh)
+
+    print("Source        :                        mesh %s" % str((source_wavefront.mesh.nx, source_wavefront.mesh.ny)))
+    print("SRW           : %8.3f s, %8.3f us/point, mesh %s" % (time_srw, 1e6 * time_per_point_srw, str(srw_mesh)))
+    print("Fourier optics: %8.3f s, %8.3f us/point, mesh %s, max_points %s" %
+          (time_fourier_optics, 1e6 * time_per_point_fourier_optics, str(fourier_optics_mesh), str(max_points)))
+    print("Time per point (Fourier optics / SRW): %8.3f" % (time_per_point_fourier_optics / time_per_point_srw))
+    print("Flux ratio (Fourier optics / SRW): %8.4f" % (flux_fourier_optics / flux_srw))
+
+    return time_per_point_srw, time_per_point_fourier_optics
+
+
+if __name__ == "__main__":
+    benchmark_fourier_optics_srw()
@@ -0,0 +1,56 @@
+"""
+Measures the per call overhead of the SRW driver result compared to the former deepcopy decoration of the wavefront.
+"""
+import pickle
+import time
+from copy import deepcopy
+
+from srwlib import SRWLRadMesh
+
+from optics.beam.electron_beam import ElectronBeam
+from optics.magnetic_structures.bending_magnet import BendingMagnet
+
+from code_drivers.SRW.SRW_result import SRWInputSnapshot, SRWMeshDescription
+
+
+def _inputs():
+    electron_beam = ElectronBeam(energy_in_GeV=6.0,
+                                 energy_spread=0.89e-03,
+                                 current=0.2,
+                                 electrons_per_bunch=500,
+                                 moment_xx   = (77.9e-06)**2 ,
+                                 moment_xxp  = 0.            ,
+                                 moment_xpxp = (110.9e-06)**2,
+                                 moment_yy   = (12.9e-06)**2 ,
+                                 moment_yyp  = 0             ,
+                                 moment_ypyp = (0.5e-06)**2  )
+    bending_magnet = BendingMagnet(radius=23.2655, magnetic_field=0.86, length=0.5)
+    mesh = SRWLRadMesh(15000.0, 15000.0, 1, -0.006, 0.006, 1000, -0.002, 0.002, 1000, 25.0)
+
+    return electron_beam, bending_magnet, mesh
+
+
+def benchmark_srw_result(iterations=10000):
+    electron_beam, bending_magnet, mesh = _inputs()
+
+    t0 = time.time()
+    for i in range(iterations):
+        # One deepcopy of the electron beam in calculate_radiation, one of the mesh in calculate_intensity.
+        decoration = (deepcopy(electron_beam), deepcopy(mesh))
+    time_deepcopy = (time.time() - t0) / iterations
+
+    t0 = time.time()
+    for i in range(iterations):
+        snapshot = (SRWInputSnapshot.from_inputs(electron_beam, bending_magnet, 15000.0, 15000.0),
+                    SRWMeshDescription.from_srw_mesh(mesh))
+    time_snapshot = (time.time() - t0) / iterations
+
+    print("deepcopy decoration: %8.2f us/call, %6d bytes pickled" % (1e6*time_deepcopy, len(pickle.dumps(decoration))))
+    print("snapshot           : %8.2f us/call, %6d bytes pickled" % (1e6*time_snapshot, len(pickle.dumps(snapshot))))
+    print("saved              : %8.2f us/call" % (1e6*(time_deepcopy - time_snapshot)))
+
+    return time_deepcopy, time_snapshot
+
+
+if __name__ == "__main__":
+    benchmark_srw_result()
@@ -0,0 +1,62 @@
+"""
+Measures the resonance energies of a tuning table computed point by point with the former scalar implementation
+against one broadcast call.
+"""
+import time
+
+import numpy as np
+import scipy.constants.codata
+
+from optics.magnetic_structures.undulator import Undulator
+
+
+def scalar_resonance_energy(undulator, K_vertical, gamma, theta_x, theta_y, harmonic=1):
+    # Undulator.resonanceEnergy before it broadcast, with K_vertical passed in: codata looked up on every call.
+    codata = scipy.constants.codata.physical_constants
+    codata_c = codata["speed of light in vacuum"][0]
+
+    wavelength = (undulator.periodLength() / (2.0*gamma **2)) * \
+                 (1 + K_vertical**2 / 2.0 + undulator.K_horizontal()**2 / 2.0 + \
+                  gamma**2 * (theta_x**2 + theta_y ** 2))
+    frequency = codata_c / wavelength
+
+    codata = scipy.constants.codata.physical_constants
+    energy_in_ev = codata["Planck constant"][0] * frequency / codata["elementary charge"][0]
+    return energy_in_ev*harmonic
+
+
+def benchmark_undulator_resonance(n_K=200, n_harmonics=15, n_angles=100):
+    undulator = Undulator(K_vertical=1.5, K_horizontal=0.0, period_length=0.02, periods_number=100)
+    gamma = 6000.0 / 0.51099895
+
+    K_values = np.linspace(0.1, 3.0, n_K)
+    harmonics = np.arange(1, 2 * n_harmonics, 2)
+    theta = np.linspace(0.0, 50e-6, n_angles)
+    n_points = n_K * n_harmonics * n_angles
+
+    t0 = time.time()
+    energies_loop = np.empty((n_harmonics, n_K, n_angles))
+    for i_h, harmonic in enumerate(harmonics):
+        for i_K, K in enumerate(K_values):
+            for i_theta, angle in enumerate(theta):
+                energies_loop[i_h, i_K, i_theta] = scalar_resonance_energy(undulator, K, gamma, angle, 0.0, harmonic)
+    time_loop = time.time() - t0
+
+    t0 = time.time()
+    energies = undulator.resonanceEnergy(gamma, theta[np.newaxis, np.newaxis, :], 0.0,
+                                         harmonics[:, np.newaxis, np.newaxis],
+                                         K_vertical=K_values[np.newaxis, :, np.newaxis])
+    time_broadcast = time.time() - t0
+
+    assert np.allclose(energies, energies_loop)
+
+    print("points          : %d" % n_points)
+    print("scalar loop     : %10.4f s" % time_loop)
+    print("broadcast       : %10.4f s" % time_broadcast)
+    print("speedup         : %10.1f" % (time_loop / time_broadcast))
+
+    return time_loop, time_broadcast
+
+
+if __name__ == "__main__":
+    benchmark_undulator_resonance()
@@ -0,0 +1,86 @@
+"""
+Tests the analytic bending magnet spectrum against direct Bessel function evaluation and tabulated values.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy.special import kv
+
+from optics.beam.electron_beam_pencil import ElectronBeamPencil
+from optics.magnetic_structures.bending_magnet import BendingMagnet
+
+from code_drivers.analytic import bending_magnet_spectrum
+from code_drivers.analytic.bending_magnet_spectrum import BendingMagnetSpectrum
+
+
+def define_bending_magnet_spectrum():
+    electron_beam = ElectronBeamPencil(energy_in_GeV=6.0, energy_spread=0.89e-3, current=0.2)
+    bending_magnet = BendingMagnet(radius=23.2655, magnetic_field=0.86, length=0.5)
+
+    return BendingMagnetSpectrum(electron_beam, bending_magnet)
+
+
+def test_bessel_lookup_tables():
+    x = np.logspace(-5, 1.5, 200)
+    assert np.allclose(bending_magnet_spectrum.bessel_k13(x), kv(1.0/3.0, x), rtol=1e-5)
+    assert np.allclose(bending_magnet_spectrum.bessel_k23(x), kv(2.0/3.0, x), rtol=1e-5)
+
+    # G1 (X-ray Data Booklet, table 2-1 and its asymptote 2.15 y^1/3).
+    assert np.isclose(bending_magnet_spectrum.universal_function_G1(1.0), 0.6514, rtol=1e-3)
+    assert np.isclose(bending_magnet_spectrum.universal_function_G1(1e-8), 2.1495 * 1e-8**(1.0/3.0), rtol=1e-3)
+    assert bending_magnet_spectrum.universal_function_G1(100.0) == 0.0
+
+
+def test_bending_magnet_spectrum():
+    spectrum = define_bending_magnet_spectrum()
+
+    # 0.665 E^2[GeV] B[T] keV.
+    assert np.isclose(spectrum.critical_energy(), 665.0 * 6.0**2 * 0.86, rtol=2e-3)
+
+    # The angular distribution integrated over psi gives the flux per horizontal angle.
+    energies = spectrum.critical_energy() * np.array([0.1, 1.0, 3.0])
+    psi = np.linspace(-10.0, 10.0, 20001) / spectrum.gamma()
+    sigma, pi = spectrum.angular_distribution(energies, psi)
+    integrated = (sigma + pi).sum(axis=1) * (psi[1] - psi[0]) * 1e3
+    assert np.allclose(integrated, spectrum.photon_flux(energies), rtol=1e-3)
+
+    # 2.457e13 E[GeV] I[A] G1(y) photons/s/mrad/0.1%bw.
+    assert np.isclose(spectrum.photon_flux(spectrum.critical_energy()), 2.457e13 * 6.0 * 0.2 * 0.6514, rtol=2e-3)
+
+    t0 = time.time()
+    spectrum.angular_distribution(np.linspace(100.0, 50000.0, 100), np.linspace(-1e-4, 1e-4, 100))
+    print("Angular distribution on 100x100 grid: %.3f ms" % (1e3 * (time.time() - t0)))
+
+
+def test_bending_magnet_sampling():
+    spectrum = define_bending_magnet_spectrum()
+
+    energies = np.linspace(1000.0, 50000.0, 50)
+    psi = np.linspace(-2e-4, 2e-4, 81)
+    energy, angle, sigma_fraction = spectrum.sample(200000, energies, psi, random_state=0)
+
+    assert np.all((energy > 1000.0 - energies[1] + energies[0]) & (energy < 50000.0 + energies[1] - energies[0]))
+    assert np.all((sigma_fraction >= 0.0) & (sigma_fraction <= 1.0))
+
+    # Higher energies are emitted into smaller vertical angles.
+    low = energy < 5000.0
+    high = energy > 30000.0
+    assert np.std(angle[low]) > 2.0 * np.std(angle[high])
+
+
+def test_bessel_lookup_tables_threads():
+    # Threads that find the tables missing at the same time all see complete tables.
+    bending_magnet_spectrum._TABLES = None
+    x = np.logspace(-5, 1.5, 200)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        values = list(executor.map(lambda _: bending_magnet_spectrum.universal_function_G1(x), range(32)))
+
+    assert all(np.array_equal(value, values[0]) for value in values)
+
+
+if __name__ == "__main__":
+    test_bessel_lookup_tables()
+    test_bending_magnet_spectrum()
+    test_bending_magnet_sampling()
+    test_bessel_lookup_tables_threads()
@@ -16,6 +16,8 @@ from optics.beamline.beamline_position import BeamlinePosition
 
 #import SRW driver and particular settings of the glossary elements used
 from code_drivers.SRW.SRW_driver import SRWDriver
+from code_drivers.SRW.SRW_result import SRWResult
+from code_drivers.SRW.SRW_wavefront_pool import SRWWavefrontPool
 from code_drivers.SRW.SRW_bending_magnet_setting import SRWBendingMagnetSetting
 from code_drivers.SRW.SRW_beamline_component_setting import SRWBeamlineComponentSetting
 
@@ -23,7 +25,7 @@ from code_drivers.SRW.SRW_beamline_component_setting import SRWBeamlineComponent
 
 
 
-def run_bending_magnet_srw(example_index): #  example_index=0 is infrared example, example_index=1 is xrays example
+def define_bending_magnet_srw(example_index): #  example_index=0 is infrared example, example_index=1 is xrays example
     ###################################################################################################
     # Main idea: abstract definition of the setting (electron beam, radiation source, beamline)
     # We want to put everything in generic classes that is independent of a specific implementation.
@@ -218,11 +220,16 @@ def run_bending_magnet_srw(example_index): #  example_index=0 is infrared exampl
 
     beamline.attach_component_at(plane, plane_position)
 
+    return electron_beam, bending_magnet, beamline, energy
+
+
+def run_bending_magnet_srw(example_index, by_component=False): #  example_index=0 is infrared example, example_index=1 is xrays example
+    electron_beam, bending_magnet, beamline, energy = define_bending_magnet_srw(example_index)
 
     #
     #  Print a summary of the elements used
     #
-    components = [electron_beam,bending_magnet,lens]
+    components = [electron_beam,bending_magnet,beamline.component_by_index(0)]
     print("===========================================================================================================")
     for component_index,component in enumerate(components):
         tmp = component.to_dictionary()
@@ -235,22 +242,40 @@ def run_bending_magnet_srw(example_index): #  example_index=0 is infrared exampl
 
 
     #
-    #  Calculate the radiation (i.e., run the codes). It returns a native SRWLWfr()
+    #  Calculate the radiation (i.e., run the codes). It returns a SRWResult wrapping a native SRWLWfr()
     #
 
     # Specify to use SRW.
     driver = SRWDriver()
 
-    srw_wavefront = driver.calculate_radiation(electron_beam=electron_beam,
-                                               magnetic_structure=bending_magnet,
-                                               beamline=beamline,
-                                               energy_min=energy,
-                                               energy_max=energy)
+    if by_component:
+        # Propagate component by component and look at the intermediate planes.
+        snapshots = driver.calculate_radiation_by_component(electron_beam=electron_beam,
+                                                            magnetic_structure=bending_magnet,
+                                                            beamline=beamline,
+                                                            energy_min=energy,
+                                                            energy_max=energy,
+                                                            intensity_sampling=4)
+        for snapshot in snapshots:
+            if isinstance(snapshot, SRWResult):
+                # The result of the full propagation comes last.
+                srw_result = snapshot
+                continue
+            print("%20s at z=%6.2f m: nx=%d ny=%d, max intensity (sampled) = %10.5e"%
+                  (snapshot.component_name, snapshot.position.z(),
+                   snapshot.summary.mesh.nx, snapshot.summary.mesh.ny, snapshot.summary.intensity.max()))
+    else:
+        srw_result = driver.calculate_radiation(electron_beam=electron_beam,
+                                                magnetic_structure=bending_magnet,
+                                                beamline=beamline,
+                                                energy_min=energy,
+                                                energy_max=energy)
+    srw_wavefront = srw_result.wavefront()
 
     #
     # extract the intensity
     #
-    intensity, dim_x, dim_y = driver.calculate_intensity(srw_wavefront)
+    intensity, dim_x, dim_y = driver.calculate_intensity(srw_result)
 
 
     # # Do some tests.
@@ -266,7 +291,7 @@ def run_bending_magnet_srw(example_index): #  example_index=0 is infrared exampl
     #         'Quick verification of intensity value'
 
     # Calculate phases.
-    #phase = driver.calculate_phase(srw_wavefront)
+    #phase = driver.calculate_phase(srw_result)
 
 
     # # Do some tests.
@@ -294,6 +319,35 @@ def test_bending_magnet_infrared_srw():
 
     return srw_wavefront, dim_x, dim_y, intensity
 
+def test_bending_magnet_infrared_srw_by_component():
+    srw_wavefront, dim_x, dim_y, intensity = run_bending_magnet_srw(0, by_component=True)
+    _, full_dim_x, full_dim_y, full_intensity = run_bending_magnet_srw(0)
+
+    flux = intensity.sum() * (dim_x[1]-dim_x[0]) * (dim_y[1]-dim_y[0])
+    print("Total flux = %10.5e photons/s/.1%%bw"%flux)
+    assert intensity.shape == full_intensity.shape and np.allclose(dim_x, full_dim_x) and np.allclose(dim_y, full_dim_y), \
+        'Component by component propagation must give the same mesh as full propagation'
+    assert np.allclose(intensity, full_intensity, rtol=1e-6, atol=1e-6*np.abs(full_intensity).max()), \
+        'Component by component propagation must give the same result as full propagation'
+
+    return srw_wavefront, dim_x, dim_y, intensity
+
+def test_bending_magnet_srw_by_component_stopped():
+    electron_beam, bending_magnet, beamline, energy = define_bending_magnet_srw(0)
+
+    # Stopping after the first component gives the wavefront back to the pool.
+    driver = SRWDriver()
+    driver.set_wavefront_pool(SRWWavefrontPool())
+    snapshots = driver.calculate_radiation_by_component(electron_beam=electron_beam,
+                                                        magnetic_structure=bending_magnet,
+                                                        beamline=beamline,
+                                                        energy_min=energy,
+                                                        energy_max=energy)
+    assert not isinstance(next(snapshots), SRWResult)
+    assert driver.wavefront_pool().idle_count() == 0
+    snapshots.close()
+    assert driver.wavefront_pool().idle_count() == 1
+
 def test_bending_magnet_xrays_srw():
     srw_wavefront, dim_x, dim_y, intensity = run_bending_magnet_srw(1)
 
@@ -88,17 +88,17 @@ def run_bending_magnet():
     plane_position = BeamlinePosition(4*lens_focal_length)
     beamline.attach_component_at(plane, plane_position)
     driver = SRWDriver()
-    wavefront = driver.calculate_radiation(
+    result = driver.calculate_radiation(
         electron_beam=electron_beam,
         magnetic_structure=bending_magnet,
         beamline=beamline,
         energy_min=energy,
         energy_max=energy,
     )
-    res = driver.calculate_intensity(wavefront)
+    res = driver.calculate_intensity(result)
     res = pkcollections.OrderedMapping(
         dict(zip(('intensity', 'dim_x', 'dim_y'), res)))
-    res.wavefront = wavefront
+    res.wavefront = result.wavefront()
     return res
 
 
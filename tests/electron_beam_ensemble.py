@@ -0,0 +1,78 @@
+"""
+Tests sampling of macro-electron ensembles from electron beam moments.
+"""
+import numpy as np
+
+from optics.beam.electron_beam import ElectronBeam
+from optics.beam.electron_beam_pencil import ElectronBeamPencil
+from optics.beam.electron_beam_ensemble import ElectronBeamEnsemble
+
+
+def create_electron_beam():
+    return ElectronBeam(energy_in_GeV=6.0, energy_spread=0.89e-3, current=0.2, electrons_per_bunch=500,
+                        moment_xx=(77.9e-6)**2, moment_xxp=-0.6 * 77.9e-6 * 110.9e-6, moment_xpxp=(110.9e-6)**2,
+                        moment_yy=(12.9e-6)**2, moment_yyp=0.3 * 12.9e-6 * 0.5e-6, moment_ypyp=(0.5e-6)**2)
+
+
+def test_ensemble_moments():
+    electron_beam = create_electron_beam()
+    ensemble = ElectronBeamEnsemble.from_electron_beam(electron_beam, 10**6, seed=1, chunk_size=300000)
+
+    assert len(ensemble) == 10**6
+    assert ensemble.data().flags.c_contiguous
+    assert ensemble.x().flags.c_contiguous
+
+    expected = (electron_beam._moment_xx, electron_beam._moment_xxp, electron_beam._moment_xpxp,
+                electron_beam._moment_yy, electron_beam._moment_yyp, electron_beam._moment_ypyp,
+                electron_beam._energy_spread)
+    # Sampling errors ~ 1/sqrt(N) of the diagonal moments.
+    scales = (expected[0], np.sqrt(expected[0] * expected[2]), expected[2],
+              expected[3], np.sqrt(expected[3] * expected[5]), expected[5], expected[6])
+    for moment, value, scale in zip(ensemble.moments(), expected, scales):
+        assert abs(moment - value) < 5e-3 * scale, (moment, value)
+
+    assert np.isclose(ensemble.gamma().mean(), electron_beam.gamma(), rtol=1e-5)
+
+
+def test_ensemble_chunks():
+    electron_beam = create_electron_beam()
+    ensemble = ElectronBeamEnsemble.from_electron_beam(electron_beam, 2500, seed=7, chunk_size=1000)
+
+    # Reproducible, and lazily sampled chunks concatenate to the ensemble.
+    again = ElectronBeamEnsemble.from_electron_beam(electron_beam, 2500, seed=7, chunk_size=1000)
+    assert np.array_equal(ensemble.data(), again.data())
+
+    chunks = list(ElectronBeamEnsemble.iterate_chunks(electron_beam, 2500, seed=7, chunk_size=1000))
+    assert [len(chunk) for chunk in chunks] == [1000, 1000, 500]
+    assert np.array_equal(np.concatenate([chunk.data() for chunk in chunks], axis=1), ensemble.data())
+
+    other = ElectronBeamEnsemble.from_electron_beam(electron_beam, 2500, seed=8, chunk_size=1000)
+    assert not np.array_equal(other.data(), ensemble.data())
+
+    # Views without copies.
+    views = list(ensemble.chunks(800))
+    assert [len(view) for view in views] == [800, 800, 800, 100]
+    assert np.shares_memory(views[1].x(), ensemble.x())
+    assert np.array_equal(views[1].yp(), ensemble.yp()[800:1600])
+
+
+def test_ensemble_pencil():
+    ensemble = ElectronBeamEnsemble.from_electron_beam(ElectronBeamPencil(3.0, 1e-3, 0.5), 1000)
+
+    assert np.all(ensemble.x() == 0.0) and np.all(ensemble.yp() == 0.0)
+    assert ensemble.delta().std() > 0.0
+
+    invalid = create_electron_beam()
+    invalid._moment_xxp = 2.0 * np.sqrt(invalid._moment_xx * invalid._moment_xpxp)
+    try:
+        ElectronBeamEnsemble.from_electron_beam(invalid, 10)
+    except Exception:
+        pass
+    else:
+        raise AssertionError("Moments that are no covariance matrix must raise.")
+
+
+if __name__ == "__main__":
+    test_ensemble_moments()
+    test_ensemble_chunks()
+    test_ensemble_pencil()
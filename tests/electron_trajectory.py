@@ -0,0 +1,90 @@
+"""
+Tests the vectorized electron trajectories against the analytic undulator motion.
+"""
+import numpy as np
+
+from optics.beam.electron_beam import ElectronBeam
+from optics.beam.electron_beam_pencil import ElectronBeamPencil
+from optics.beam.electron_beam_ensemble import ElectronBeamEnsemble
+from optics.magnetic_structures.undulator import Undulator
+from optics.magnetic_structures.magnetic_field_map import MagneticFieldMap
+
+from code_drivers.analytic.electron_trajectory import TrajectoryIntegrator
+
+
+def define_undulator():
+    return Undulator(K_vertical=1.5, K_horizontal=0.0, period_length=0.02, periods_number=50)
+
+
+def test_reference_trajectory_undulator():
+    undulator = define_undulator()
+    electron_beam = ElectronBeamPencil(energy_in_GeV=6.0, energy_spread=0.0, current=0.2)
+    gamma = electron_beam.gamma()
+
+    integrator = TrajectoryIntegrator(undulator)
+    trajectory = integrator.reference_trajectory(electron_beam)
+
+    # x' = K/gamma sin(k z) inside the device.
+    inside = np.abs(trajectory.z) < 0.5 * undulator.length()
+    expected = undulator.K_vertical() / gamma * np.sin(2.0 * np.pi * trajectory.z / undulator.periodLength())
+    assert np.allclose(trajectory.beta_x[0, inside] / trajectory.beta_z[0, inside], expected[inside],
+                       atol=1e-4 * undulator.K_vertical() / gamma)
+
+    # The electron lags behind the light by one resonance wavelength per period.
+    slip = trajectory.ct[0, -1] - trajectory.ct[0, 0] - (trajectory.z[-1] - trajectory.z[0])
+    periods = (trajectory.z[-1] - trajectory.z[0]) / undulator.periodLength()
+    field_free = (periods - undulator.periodNumber()) * undulator.periodLength() / (2.0 * gamma**2)
+    assert np.isclose((slip - field_free) / undulator.periodNumber(), undulator.resonanceWavelength(gamma, 0.0, 0.0),
+                      rtol=1e-3)
+
+    assert integrator.reference_trajectory(electron_beam) is trajectory, "Trajectories are cached"
+
+
+def test_ensemble_trajectory():
+    undulator = Undulator(K_vertical=0.0, K_horizontal=0.0, period_length=0.02, periods_number=50)
+    electron_beam = ElectronBeam(energy_in_GeV=6.0, energy_spread=1e-3, current=0.2, electrons_per_bunch=500,
+                                 moment_xx=(77.9e-6)**2, moment_xxp=0.0, moment_xpxp=(110.9e-6)**2,
+                                 moment_yy=(12.9e-6)**2, moment_yyp=0.0, moment_ypyp=(5e-6)**2)
+
+    integrator = TrajectoryIntegrator(undulator, n_steps=100)
+    trajectory = integrator.ensemble_trajectory(electron_beam, 20000, seed=1)
+    assert trajectory.x.shape == (20000, 101)
+
+    # Without field the electrons drift. At the center their moments are the beam moments.
+    center = 50
+    assert trajectory.z[center] == 0.0
+    assert np.isclose(np.std(trajectory.x[:, center]), 77.9e-6, rtol=0.02)
+    assert np.isclose(np.std(trajectory.beta_x[:, center] / trajectory.beta_z[:, center]), 110.9e-6, rtol=0.02)
+    drift = trajectory.x[:, -1] - trajectory.x[:, 0]
+    assert np.allclose(drift, trajectory.beta_x[:, 0] / trajectory.beta_z[:, 0] * (trajectory.z[-1] - trajectory.z[0]))
+
+    # The electrons are those of the ensemble with the same seed.
+    ensemble = ElectronBeamEnsemble.from_electron_beam(electron_beam, 20000, seed=1)
+    assert np.allclose(trajectory.gamma, ensemble.gamma())
+    assert np.allclose(trajectory.x[:, center], ensemble.x(), rtol=0.0, atol=1e-12)
+
+    assert integrator.ensemble_trajectory(electron_beam, 20000, seed=1) is trajectory
+    assert integrator.ensemble_trajectory(electron_beam, 20000, seed=2) is not trajectory
+
+
+def test_trajectory_field_map():
+    undulator = define_undulator()
+    electron_beam = ElectronBeamPencil(energy_in_GeV=6.0, energy_spread=0.0, current=0.2)
+
+    # Tabulate the ideal field on axis with eight points per integration step. The integration points keep a
+    # distance from the field jumps at the device ends, such that both integrators see the same field.
+    z = np.linspace(-0.52, 0.52, 8 * 2600 + 1)
+    analytic = TrajectoryIntegrator(undulator, z_start=-0.5201, z_end=0.5199, n_steps=2600)
+    field_table = np.stack(analytic.magnetic_field(0.0, 0.0, z), axis=-1)[:, np.newaxis, np.newaxis, :]
+    field_map = MagneticFieldMap(field_table, [0.0], [0.0], z)
+
+    expected = analytic.reference_trajectory(electron_beam)
+    trajectory = TrajectoryIntegrator(field_map, z_start=-0.5201, z_end=0.5199,
+                                      n_steps=2600).reference_trajectory(electron_beam)
+    assert np.allclose(trajectory.x, expected.x, atol=1e-3 * np.abs(expected.x).max())
+
+
+if __name__ == "__main__":
+    test_reference_trajectory_undulator()
+    test_ensemble_trajectory()
+    test_trajectory_field_map()
@@ -0,0 +1,209 @@
+"""
+Tests of the Fourier optics driver against analytic Gaussian beam propagation.
+"""
+import tracemalloc
+
+import numpy as np
+
+from optics.beam.electron_beam_pencil import ElectronBeamPencil
+from optics.magnetic_structures.bending_magnet import BendingMagnet
+
+from optics.beamline.optical_elements.lens.lens_ideal import LensIdeal
+from optics.beamline.optical_elements.image_plane import ImagePlane
+
+from optics.beamline.beamline import Beamline
+from optics.beamline.beamline_position import BeamlinePosition
+
+from code_drivers.fourier_optics import fourier_optics_propagators as propagators
+from code_drivers.fourier_optics.fourier_optics_driver import FourierOpticsDriver
+from code_drivers.fourier_optics.fourier_optics_source_setting import FourierOpticsSourceSetting
+from code_drivers.fourier_optics.fourier_optics_beamline_component_setting import FourierOpticsBeamlineComponentSetting
+from code_drivers.fourier_optics.fourier_optics_wavefront import FourierOpticsWavefront
+
+
+def gaussian_wavefront(waist, energy, half_width, n_points, z=0.0):
+    x = np.linspace(-half_width, half_width, n_points)
+    y = np.linspace(-half_width, half_width, n_points)
+    field = np.exp(-(x[:, np.newaxis]**2 + y[np.newaxis, :]**2) / waist**2)
+
+    return FourierOpticsWavefront(field.astype(complex), x, y, energy, z)
+
+
+def rms_width(intensity, coordinates):
+    profile = intensity.sum(axis=1)
+    mean = (profile * coordinates).sum() / profile.sum()
+    return np.sqrt((profile * (coordinates - mean)**2).sum() / profile.sum())
+
+
+def gaussian_rms_width(waist, wavelength, distance):
+    rayleigh_length = np.pi * waist**2 / wavelength
+    return 0.5 * waist * np.sqrt(1.0 + (distance / rayleigh_length)**2)
+
+
+def gaussian_profile_error(intensity, x, y, waist, wavelength, distance):
+    # Largest deviation from the analytic Gaussian beam of the same power, relative to the peak.
+    width = 2.0 * gaussian_rms_width(waist, wavelength, distance)
+    expected = np.exp(-2.0 * (x[:, np.newaxis]**2 + y[np.newaxis, :]**2) / width**2)
+    expected *= intensity.sum() / expected.sum()
+
+    return np.abs(intensity - expected).max() / expected.max()
+
+
+def test_fourier_optics_propagation_modes():
+    waist = 50e-6
+    energy = 1000.0
+    wavelength = propagators.wavelength_from_energy(energy)
+    wavefront = gaussian_wavefront(waist, energy, 1e-3, 512)
+
+    # Fresnel number of the mesh: 3.2 at 1 m, i.e. the transfer function chirp is sampled for all frequencies up to
+    # 6.3 m, the impulse response beyond. The Gaussian occupies only part of the spectrum.
+    for mode, distance in ((propagators.TRANSFER_FUNCTION, 0.5),
+                           (propagators.ANGULAR_SPECTRUM, 0.5),
+                           (propagators.IMPULSE_RESPONSE, 20.0),
+                           (propagators.AUTO, 5.0),
+                           (propagators.AUTO, 20.0)):
+        field = propagators.propagate(wavefront.field(), wavefront.dx(), wavefront.dy(), wavelength, distance, mode)
+        intensity = np.abs(field[0])**2
+
+        assert abs(intensity.sum() / wavefront.intensity().sum() - 1.0) < 0.01, "Energy conservation (%s)" % mode
+        assert gaussian_profile_error(intensity, wavefront.x(), wavefront.y(), waist, wavelength, distance) < 0.01, \
+            "Gaussian beam profile (%s)" % mode
+
+
+def test_fourier_optics_mode_choice():
+    wavelength = 1e-9
+
+    # Fresnel number 1e-6/(1e-9*1e-3) = 1e6 >= 1000 points: short distance.
+    assert propagators.choose_propagation_mode(1e-3, 1000, 1e-3, 1000, wavelength, 1e-3) == propagators.ANGULAR_SPECTRUM
+    assert propagators.choose_propagation_mode(1e-3, 1000, 1e-3, 1000, wavelength, 0.1) == propagators.TRANSFER_FUNCTION
+    # Fresnel number 1e-6/(1e-9*100) = 10 < 1000 points: long distance.
+    assert propagators.choose_propagation_mode(1e-3, 1000, 1e-3, 1000, wavelength, 100.0) == propagators.IMPULSE_RESPONSE
+
+
+def test_fourier_optics_driver_focus():
+    # Image a Gaussian waist with a lens at 2f.
+    waist = 30e-6
+    energy = 100.0
+    focal_length = 1.0
+    wavelength = propagators.wavelength_from_energy(energy)
+
+    source = BendingMagnet(radius=25.0, magnetic_field=0.4, length=1.0)
+    source.add_settings(FourierOpticsSourceSetting(gaussian_wavefront(waist, energy, 100e-6, 256)))
+
+    beamline = Beamline()
+    beamline.attach_component_at(LensIdeal("focus lens", focal_x=focal_length, focal_y=focal_length),
+                                 BeamlinePosition(2*focal_length))
+    beamline.attach_component_at(ImagePlane("Image screen"), BeamlinePosition(4*focal_length))
+
+    driver = FourierOpticsDriver()
+    wavefront = driver.calculate_radiation(electron_beam=ElectronBeamPencil(energy_in_GeV=3.0,energy_spread=0.89e-3,current=0.5),
+                                           magnetic_structure=source,
+                                           beamline=beamline,
+                                           energy_min=energy,
+                                           energy_max=energy)
+    intensity, dim_x, dim_y = driver.calculate_intensity(wavefront)
+
+    # Gaussian beam optics with the complex beam parameter q.
+    q = 1j * np.pi * waist**2 / wavelength + 2*focal_length
+    q = 1.0 / (1.0 / q - 1.0 / focal_length) + 2*focal_length
+    expected_width = 0.5 * np.sqrt(-wavelength / (np.pi * np.imag(1.0 / q)))
+
+    assert wavefront.z() == 4*focal_length
+    assert abs(rms_width(intensity, dim_x) / expected_width - 1.0) < 0.01, "Gaussian beam width at the image plane"
+    assert abs(rms_width(intensity.transpose(), dim_y) / expected_width - 1.0) < 0.01, "Gaussian beam width at the image plane"
+
+
+def test_fourier_optics_resize():
+    wavefront = gaussian_wavefront(10e-6, 1000.0, 0.1e-3, 100)
+
+    field, x, y = propagators.resize_range(wavefront.field(), wavefront.x(), wavefront.y(), 2.0, 0.5)
+    assert field.shape == (1, 200, 50)
+    assert np.allclose(x[1] - x[0], wavefront.dx())
+    assert np.isclose(np.abs(field).max(), np.abs(wavefront.field()).max())
+
+    field, x, y = propagators.resize_resolution(wavefront.field(), wavefront.x(), wavefront.y(), 3.0, 1.0)
+    assert field.shape == (1, 300, 100)
+    assert np.allclose(3.0 * (x[1] - x[0]), wavefront.dx())
+    assert np.isclose(np.sum(np.abs(field)**2) * (x[1] - x[0]), np.sum(wavefront.intensity()) * wavefront.dx())
+
+    # Fourier resampling keeps the intensity of a field whose phase changes by almost pi between points.
+    tilted = wavefront.field() * np.exp(0.9j * np.pi * np.arange(100))[:, np.newaxis]
+    field, x, y = propagators.resize_resolution(tilted, wavefront.x(), wavefront.y(), 3.0, 1.0)
+    assert np.isclose(np.sum(np.abs(field)**2) / 3.0, np.sum(np.abs(tilted)**2))
+
+
+def test_fourier_optics_batched_propagation():
+    energies = np.linspace(900.0, 1100.0, 7)
+    wavefront = gaussian_wavefront(50e-6, 1000.0, 1e-3, 128)
+    field = np.repeat(wavefront.field(), len(energies), axis=0)
+    field *= np.arange(1, len(energies) + 1)[:, np.newaxis, np.newaxis]
+    wavelengths = propagators.wavelength_from_energy(energies)
+
+    expected = np.array([propagators.propagate(field[i], wavefront.dx(), wavefront.dy(), wavelengths[i], 2.0,
+                                               propagators.TRANSFER_FUNCTION) for i in range(len(energies))])
+
+    # Memory for two slices per chunk, i.e. the last chunk is incomplete.
+    max_memory = 2 * 4 * 128 * 128 * 16
+    assert list(propagators.energy_chunks(len(energies), 128, 128, max_memory)) == \
+           [slice(0, 2), slice(2, 4), slice(4, 6), slice(6, 7)]
+
+    batched = propagators.propagate_batched(field, wavefront.dx(), wavefront.dy(), wavelengths, 2.0,
+                                            propagators.TRANSFER_FUNCTION, max_memory)
+    assert np.allclose(batched, expected)
+
+    propagators.propagate_batched(field, wavefront.dx(), wavefront.dy(), wavelengths, 2.0,
+                                  propagators.TRANSFER_FUNCTION, max_memory, out=field)
+    assert np.allclose(field, expected), "Propagation in place"
+
+    assert np.allclose(propagators.intensity_batched(field, max_memory), (np.abs(expected)**2).sum(axis=0))
+
+
+def peak_memory(function):
+    # Peak of the memory allocated by function beyond what is allocated at the start, and its result.
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        result = function()
+        peak = tracemalloc.get_traced_memory()[1] - start
+    finally:
+        tracemalloc.stop()
+
+    return peak, result
+
+
+def test_fourier_optics_peak_memory():
+    energies = np.linspace(900.0, 1100.0, 32)
+    wavefront = gaussian_wavefront(50e-6, 1000.0, 0.5e-3, 128)
+    wavefront = FourierOpticsWavefront(np.repeat(wavefront.field(), len(energies), axis=0),
+                                       wavefront.x(), wavefront.y(), energies, 0.0)
+    wavelengths = wavefront.wavelengths()
+    x, y = wavefront.x(), wavefront.y()
+
+    # Chunked estimates and resizing give the results of the whole stack at once.
+    max_memory = 6 * 4 * 128 * 128 * 16
+    assert propagators.required_range_factors(wavefront.field(), x, y, wavelengths, 50.0, max_memory=max_memory) == \
+           propagators.required_range_factors(wavefront.field(), x, y, wavelengths, 50.0)
+    assert propagators.required_resolution_factors(wavefront.field(), x, y, wavelengths, 0.5, 0.5,
+                                                   max_memory=max_memory) == \
+           propagators.required_resolution_factors(wavefront.field(), x, y, wavelengths, 0.5, 0.5)
+    assert np.allclose(propagators.resize_resolution_batched(wavefront.field(), x, y, 1.5, 0.5, max_memory)[0],
+                       propagators.resize_resolution(wavefront.field(), x, y, 1.5, 0.5)[0])
+
+    # Beyond the resized field that is returned, the temporaries stay below the cap. The padded and the refined
+    # stacks hold 32 slices of about 300 x 300 points, the cap 4 slices with their temporaries.
+    max_memory = 4 * 4 * 300 * 300 * 16
+    driver = FourierOpticsDriver(max_memory)
+    settings = FourierOpticsBeamlineComponentSetting().snapshot()
+    for step in (lambda: driver.propagate_drift(wavefront, 50.0, settings),
+                 lambda: driver.apply_lens(wavefront, 2.0, 2.0, settings)):
+        peak, result = peak_memory(step)
+        assert result.field().shape[1:] != wavefront.field().shape[1:], "The mesh is resized"
+        assert peak < result.field().nbytes + 1.05 * max_memory
+
+if __name__ == "__main__":
+    test_fourier_optics_propagation_modes()
+    test_fourier_optics_mode_choice()
+    test_fourier_optics_driver_focus()
+    test_fourier_optics_resize()
+    test_fourier_optics_batched_propagation()
+    test_fourier_optics_peak_memory()
@@ -0,0 +1,86 @@
+"""
+Tests interpolation of memory mapped magnetic field maps against an analytic undulator field.
+"""
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from optics.magnetic_structures import magnetic_field_map
+from optics.magnetic_structures.magnetic_field_map import MagneticFieldMap
+
+
+PERIOD_LENGTH = 0.02
+PEAK_FIELD = 0.8
+
+
+def analytic_field(x, y, z):
+    # Planar undulator field satisfying Maxwell's equations in vacuum.
+    k = 2.0 * np.pi / PERIOD_LENGTH
+    return (np.zeros(np.broadcast(x, y, z).shape),
+            PEAK_FIELD * np.cos(k * z) * np.cosh(k * y) + 0.0 * x,
+            -PEAK_FIELD * np.sin(k * z) * np.sinh(k * y) + 0.0 * x)
+
+
+def define_field_table(n_x=11, n_y=9, n_z=401):
+    x = np.linspace(-5e-3, 5e-3, n_x)
+    y = np.linspace(-4e-3, 4e-3, n_y)
+    z = np.linspace(-0.1, 0.1, n_z)
+
+    Z, Y, X = np.meshgrid(z, y, x, indexing="ij")
+    field_table = np.stack(analytic_field(X, Y, Z), axis=-1)
+
+    return field_table, x, y, z
+
+
+def test_magnetic_field_map_interpolation():
+    directory = tempfile.mkdtemp()
+    try:
+        field_table, x, y, z = define_field_table()
+        filename = os.path.join(directory, "field_map.npy")
+        magnetic_field_map.save_magnetic_field_map(filename, field_table)
+
+        field_map = magnetic_field_map.open_magnetic_field_map(filename, x, y, z)
+        assert isinstance(field_map.field_table(), np.memmap)
+
+        # Mesh points are reproduced exactly.
+        B_x, B_y, B_z = field_map.field_at(x[3], y[2], z[17])
+        assert np.allclose([B_x, B_y, B_z], field_table[17, 2, 3])
+
+        random = np.random.RandomState(0)
+        points = (random.uniform(-4e-3, 4e-3, 1000), random.uniform(-3e-3, 3e-3, 1000), random.uniform(-0.09, 0.09, 1000))
+        expected = analytic_field(*points)
+
+        errors = {}
+        for interpolation in (magnetic_field_map.LINEAR, magnetic_field_map.CUBIC):
+            field_map = magnetic_field_map.open_magnetic_field_map(filename, x, y, z, interpolation)
+            B_y = field_map.field_at(*points)[1]
+            errors[interpolation] = np.abs(B_y - expected[1]).max() / PEAK_FIELD
+
+        assert errors[magnetic_field_map.LINEAR] < 0.03
+        assert errors[magnetic_field_map.CUBIC] < 0.1 * errors[magnetic_field_map.LINEAR]
+
+        # Outside of the mesh there is no field.
+        assert field_map.field_at(0.0, 0.0, 0.2)[1] == 0.0
+    finally:
+        shutil.rmtree(directory)
+
+
+def test_magnetic_field_map_slab():
+    field_table, x, y, z = define_field_table()
+    field_map = MagneticFieldMap(field_table, x, y, z, magnetic_field_map.CUBIC)
+
+    slab = field_map.slab((-1e-3, 1e-3), (-0.5e-3, 0.5e-3))
+    assert slab.field_table().shape[1] < field_table.shape[1] and slab.field_table().shape[2] < field_table.shape[2]
+
+    trajectory_z = np.linspace(-0.09, 0.09, 501)
+    trajectory_x = 1e-4 * np.sin(2.0 * np.pi * trajectory_z / PERIOD_LENGTH)
+    for component_map, component_slab in zip(field_map.field_at(trajectory_x, 0.0, trajectory_z),
+                                             slab.field_at(trajectory_x, 0.0, trajectory_z)):
+        assert np.allclose(component_map, component_slab)
+
+
+if __name__ == "__main__":
+    test_magnetic_field_map_interpolation()
+    test_magnetic_field_map_slab()
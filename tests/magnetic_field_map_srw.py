@@ -0,0 +1,33 @@
+"""
+Tests the translation of magnetic field maps to SRW arbitrary 3D fields.
+"""
+import numpy as np
+
+from optics.magnetic_structures.magnetic_field_map import MagneticFieldMap, CUBIC
+
+from code_drivers.SRW.SRW_adapter import SRWAdapter
+
+from tests.magnetic_field_map import define_field_table
+
+
+def test_magnetic_field_map_srw():
+    field_table, x, y, z = define_field_table()
+    field_map = MagneticFieldMap(field_table, x + 1e-3, y, z, CUBIC)
+
+    magnetic_fields = SRWAdapter().magnetic_field_from_magnetic_field_map(field_map)
+    srw_field_map = magnetic_fields.arMagFld[0]
+
+    assert (srw_field_map.nx, srw_field_map.ny, srw_field_map.nz) == (len(x), len(y), len(z))
+    assert np.isclose(srw_field_map.rz, z[-1] - z[0])
+    assert srw_field_map.interp == 3
+    assert np.isclose(magnetic_fields.arXc[0], 1e-3)
+
+    # x runs fastest.
+    assert np.allclose(np.array(srw_field_map.arBy).reshape(len(z), len(y), len(x)), field_table[..., 1])
+
+    srw_slab = SRWAdapter().magnetic_field_from_magnetic_field_map(field_map, (0.0, 2e-3), (-1e-3, 1e-3)).arMagFld[0]
+    assert srw_slab.nx < len(x) and srw_slab.ny < len(y)
+
+
+if __name__ == "__main__":
+    test_magnetic_field_map_srw()
@@ -0,0 +1,66 @@
+"""
+Tests the near field emission of an undulator against the analytic on-axis flux density.
+"""
+import numpy as np
+from scipy.special import jv
+
+from optics.beam.electron_beam_pencil import ElectronBeamPencil
+from optics.magnetic_structures.undulator_vertical import UndulatorVertical
+from optics.beamline.beamline_position import BeamlinePosition
+
+from code_drivers.analytic.near_field_emission import NearFieldEmission
+
+
+def define_undulator():
+    return UndulatorVertical(K=1.5, period_length=0.02, periods_number=50)
+
+
+def define_electron_beam():
+    return ElectronBeamPencil(energy_in_GeV=6.0, energy_spread=0.0, current=0.2)
+
+
+def test_near_field_emission_on_axis():
+    undulator = define_undulator()
+    electron_beam = define_electron_beam()
+    resonance_energy = undulator.resonanceEnergy(electron_beam.gamma(), 0.0, 0.0)
+
+    distance = 30.0
+    emission = NearFieldEmission(electron_beam, undulator)
+    intensity = emission.intensity(BeamlinePosition(distance), [resonance_energy], [0.0], [0.0])
+
+    # X-ray Data Booklet, eq. 2.12: 1.744e14 N^2 E^2[GeV] I[A] F_1(K) photons/s/0.1%bw/mrad^2.
+    K = undulator.K_vertical()
+    Y = K**2 / (4.0 + 2.0 * K**2)
+    F_1 = K**2 / (1.0 + K**2 / 2.0)**2 * (jv(0, Y) - jv(1, Y))**2
+    expected = 1.744e14 * undulator.periodNumber()**2 * 6.0**2 * 0.2 * F_1 / distance**2
+
+    assert np.isclose(intensity[0, 0, 0], expected, rtol=0.01)
+
+
+def test_near_field_emission_blocks():
+    undulator = define_undulator()
+    electron_beam = define_electron_beam()
+    resonance_energy = undulator.resonanceEnergy(electron_beam.gamma(), 0.0, 0.0)
+
+    position = BeamlinePosition(10.0, x=1e-4)
+    energies = resonance_energy * np.array([0.99, 1.0])
+    x = np.linspace(-1e-3, 1e-3, 9)
+    y = np.linspace(-1e-3, 1e-3, 7)
+
+    reference = NearFieldEmission(electron_beam, undulator).electric_field(position, energies, x, y)
+
+    # Blocks of a few points, distributed over two processes.
+    emission = NearFieldEmission(electron_beam, undulator, max_memory=10 * 16 * 8 * 2700, n_workers=2)
+    E_x, E_y = emission.electric_field(position, energies, x, y)
+
+    assert E_x.shape == (2, 9, 7)
+    assert np.allclose(E_x, reference[0])
+    assert np.allclose(E_y, reference[1])
+
+    # The screen center is shifted by the position.
+    unshifted = NearFieldEmission(electron_beam, undulator).intensity(BeamlinePosition(10.0), energies, x + 1e-4, y)
+    assert np.allclose(np.abs(E_x)**2 + np.abs(E_y)**2, unshifted)
+
+if __name__ == "__main__":
+    test_near_field_emission_on_axis()
+    test_near_field_emission_blocks()
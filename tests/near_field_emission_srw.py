@@ -0,0 +1,77 @@
+"""
+Validates the near field emission against SRW for a vertical undulator.
+
+SRW adds field terminations to its ideal periodic undulator, which change the flux by a few percent. The
+undulator field is therefore tabulated with tapered ends and the same field map is given to both codes.
+"""
+import time
+
+import numpy as np
+from srwlib import *
+
+from optics.magnetic_structures.magnetic_field_map import MagneticFieldMap, CUBIC
+from optics.beamline.beamline_position import BeamlinePosition
+
+from code_drivers.SRW.SRW_adapter import SRWAdapter
+from code_drivers.analytic.near_field_emission import NearFieldEmission
+
+from tests.near_field_emission import define_undulator, define_electron_beam
+
+
+def define_field_map(undulator):
+    # Vertical field of the undulator, ramped up with sin^2 over the first and down over the last two periods.
+    half_length = 0.5 * undulator.length() + undulator.periodLength()
+    z = np.linspace(-half_length, half_length, 40 * (undulator.periodNumber() + 2) + 1)
+    ramp = np.clip((half_length - np.abs(z)) / (2.0 * undulator.periodLength()), 0.0, 1.0)
+
+    field_table = np.zeros((len(z), 1, 1, 3))
+    field_table[:, 0, 0, 1] = undulator.B_vertical() * np.cos(2.0 * np.pi * z / undulator.periodLength()) * \
+                              np.sin(0.5 * np.pi * ramp)**2
+
+    return MagneticFieldMap(field_table, [0.0], [0.0], z, CUBIC)
+
+
+def srw_intensity(electron_beam, field_map, distance, energy, x):
+    srw_adapter = SRWAdapter()
+    wavefront = srw_adapter.create_quadratic_SRW_wavefront_single_energy(grid_size=len(x),
+                                                                         grid_length=x[-1],
+                                                                         z_start=distance,
+                                                                         srw_electron_beam=srw_adapter.SRW_electron_beam(electron_beam),
+                                                                         energy=energy)
+
+    srwl.CalcElecFieldSR(wavefront, 0, srw_adapter.magnetic_field_from_magnetic_field_map(field_map),
+                         [1, 0.001, 0, 0, 20000, 1, 0])
+
+    intensity = array('f', [0] * len(x)**2)
+    srwl.CalcIntFromElecField(intensity, wavefront, 6, 0, 3, wavefront.mesh.eStart, 0, 0)
+
+    # SRW runs x fastest.
+    return np.array(intensity).reshape(len(x), len(x)).T
+
+
+def test_near_field_emission_srw():
+    undulator = define_undulator()
+    electron_beam = define_electron_beam()
+    field_map = define_field_map(undulator)
+    resonance_energy = float(undulator.resonanceEnergy(electron_beam.gamma(), 0.0, 0.0))
+
+    # Far field at resonance, below resonance (rings) and near field.
+    for distance, half_width, energy, tolerance in ((30.0, 1e-3, resonance_energy, 0.01),
+                                                    (10.0, 1e-3, 0.99 * resonance_energy, 0.02),
+                                                    (3.0, 0.5e-3, resonance_energy, 0.01)):
+        x = np.linspace(-half_width, half_width, 11)
+
+        t0 = time.time()
+        expected = srw_intensity(electron_beam, field_map, distance, energy, x)
+        time_srw = time.time() - t0
+
+        t0 = time.time()
+        intensity = NearFieldEmission(electron_beam, field_map).intensity(BeamlinePosition(distance), [energy], x, x)[0]
+        time_numpy = time.time() - t0
+
+        print("distance %4.1f m: SRW %.3f s, NumPy %.3f s" % (distance, time_srw, time_numpy))
+        assert np.abs(intensity - expected).max() < tolerance * expected.max()
+
+
+if __name__ == "__main__":
+    test_near_field_emission_srw()
@@ -0,0 +1,188 @@
+"""
+Tests parameter sweeps over simulation configurations.
+"""
+import threading
+
+import numpy as np
+
+from optics.driver.abstract_driver import AbstractDriver
+from optics.beamline.optical_elements.lens.lens_ideal import LensIdeal
+from optics.configuration.simulation_configuration import ConfigurationSchema
+from optics.configuration.parameter_sweep import ParameterSweep, set_parameter, calculate_intensity
+
+from code_drivers.analytic.paraxial_transfer import ParaxialTransfer
+from code_drivers.fourier_optics.fourier_optics_driver import FourierOpticsDriver
+from code_drivers.fourier_optics.fourier_optics_source_setting import FourierOpticsSourceSetting
+
+from tests.fourier_optics_propagation import gaussian_wavefront, rms_width
+
+BASE_CONFIGURATION = {
+    "electron_beam": {"type": "ElectronBeam",
+                      "parameters": {"energy_in_GeV": 6.0, "energy_spread": 0.89e-3, "current": 0.2,
+                                     "electrons_per_bunch": 500,
+                                     "moment_xx": 6.0684e-9, "moment_xxp": 0.0, "moment_xpxp": 1.229881e-8,
+                                     "moment_yy": 1.6641e-10, "moment_yyp": 0.0, "moment_ypyp": 2.5e-13}},
+    "magnetic_structure": {"type": "BendingMagnet",
+                           "parameters": {"radius": 23.2655, "magnetic_field": 0.86, "length": 0.5}},
+    "beamline": [{"type": "LensIdeal", "name": "focus lens", "parameters": {"focal_x": 12.5, "focal_y": 12.5},
+                  "position": {"z": 25.0}},
+                 {"type": "ImagePlane", "name": "Image screen", "position": {"z": 50.0},
+                  "settings": [{"type": "FourierOpticsBeamlineComponentSetting"}]}],
+    "calculation": {"energy_min": 15000.0, "energy_max": 15000.0}}
+
+
+class BeamSizeDriver(AbstractDriver):
+    """
+    Paraxial estimate of the electron beam size at the last component.
+    """
+    def calculate_radiation(self, electron_beam, magnetic_structure, beamline, energy_min, energy_max):
+        moments_x, _ = ParaxialTransfer(beamline).electron_beam_moments(electron_beam)
+        return moments_x[-1]
+
+    def calculate_intensity(self, radiation):
+        return np.sqrt(radiation[0])
+
+
+class CountingBeamSizeDriver(BeamSizeDriver):
+    def __init__(self):
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def calculate_radiation(self, electron_beam, magnetic_structure, beamline, energy_min, energy_max):
+        with self._lock:
+            self.calls += 1
+        return BeamSizeDriver.calculate_radiation(self, electron_beam, magnetic_structure, beamline, energy_min,
+                                                  energy_max)
+
+
+class SweepLens(LensIdeal):
+    """
+    Lens type known only to a custom schema.
+    """
+
+
+FOURIER_OPTICS_CONFIGURATION = {
+    "electron_beam": BASE_CONFIGURATION["electron_beam"],
+    "magnetic_structure": BASE_CONFIGURATION["magnetic_structure"],
+    "beamline": [{"type": "SweepLens", "name": "focus lens", "parameters": {"focal_x": 0.5, "focal_y": 0.5},
+                  "position": {"z": 0.5},
+                  "settings": [{"type": "FourierOpticsBeamlineComponentSetting", "parameters": {"max_points": 256}}]},
+                 {"type": "ImagePlane", "name": "Image screen", "position": {"z": 1.0},
+                  "settings": [{"type": "FourierOpticsBeamlineComponentSetting", "parameters": {"max_points": 256}}]}],
+    "calculation": {"energy_min": 1000.0, "energy_max": 1000.0}}
+
+
+def gaussian_beam_width(driver, simulation):
+    """
+    Propagates a Gaussian beam with the Fourier optics driver, returns its rms width on the screen.
+    """
+    wavefront = gaussian_wavefront(50e-6, 1000.0, 1e-3, 128)
+    simulation.magnetic_structure.add_settings(FourierOpticsSourceSetting(wavefront))
+
+    intensity, x, y = calculate_intensity(driver, simulation)
+    return rms_width(intensity, x)
+
+
+def test_set_parameter():
+    configuration = {"beamline": [{"type": "ImagePlane", "name": "screen", "position": {"z": 1.0},
+                                   "settings": [{"type": "FourierOpticsBeamlineComponentSetting"}]}],
+                     "electron_beam": {"type": "ElectronBeamPencil"}}
+
+    set_parameter(configuration, "beamline[screen].position.z", 2.0)
+    set_parameter(configuration, "beamline[screen].settings[FourierOpticsBeamlineComponentSetting].max_points", 64)
+    set_parameter(configuration, "electron_beam.current", 0.5)
+    set_parameter(configuration, "calculation.energy_min", 100.0)
+
+    assert configuration["beamline"][0]["position"]["z"] == 2.0
+    assert configuration["beamline"][0]["settings"][0]["parameters"]["max_points"] == 64
+    assert configuration["electron_beam"]["parameters"]["current"] == 0.5
+    assert configuration["calculation"]["energy_min"] == 100.0
+
+    try:
+        set_parameter(configuration, "beamline[lens].focal_x", 1.0)
+    except Exception:
+        pass
+    else:
+        raise AssertionError("Unknown components must raise.")
+
+
+def test_sweep_modes():
+    sweep = ParameterSweep.cartesian(BASE_CONFIGURATION, {"electron_beam.energy_in_GeV": [5.0, 6.0, 7.0],
+                                                          "beamline[focus lens].focal_x": [10.0, 12.5]})
+    assert len(sweep) == 6
+    assert sweep.row(1) == {"electron_beam.energy_in_GeV": 5.0, "beamline[focus lens].focal_x": 12.5}
+
+    simulation = sweep.simulation(5)
+    assert simulation.electron_beam._energy_in_GeV == 7.0
+    assert simulation.beamline.component_by_name("focus lens").focalX() == 12.5
+    # The base configuration is unchanged.
+    assert BASE_CONFIGURATION["electron_beam"]["parameters"]["energy_in_GeV"] == 6.0
+
+    sweep = ParameterSweep.latin_hypercube(BASE_CONFIGURATION, {"beamline[focus lens].focal_x": (10.0, 15.0),
+                                                                "beamline[Image screen].position.z": (40.0, 60.0)},
+                                           n_rows=50, seed=3)
+    focal = sweep.column("beamline[focus lens].focal_x")
+    assert len(sweep) == 50
+    # One value per stratum.
+    assert np.array_equal(np.sort(np.floor((focal - 10.0) / 5.0 * 50).astype(int)), np.arange(50))
+
+    sweep = ParameterSweep.from_rows(BASE_CONFIGURATION, [{"magnetic_structure.radius": 20.0},
+                                                          {"magnetic_structure.radius": 25.0}])
+    assert [simulation.magnetic_structure.radius() for simulation in sweep.simulations()] == [20.0, 25.0]
+
+
+def test_sweep_run():
+    focal_lengths = [10.0, 12.5, 10.0, 15.0, 12.5, 10.0]
+    sweep = ParameterSweep(BASE_CONFIGURATION, {"beamline[focus lens].focal_x": focal_lengths})
+
+    indices, inverse = sweep.unique_rows()
+    assert list(indices) == [0, 1, 3]
+    assert list(inverse) == [0, 1, 0, 2, 1, 0]
+
+    driver = CountingBeamSizeDriver()
+    results = sweep.run(driver, n_workers=3)
+    assert driver.calls == 3
+    assert sweep.column("result") is results
+
+    # 1:1 imaging at 12.5 m focal length.
+    assert np.isclose(results[1], np.sqrt(6.0684e-9), rtol=1e-10, atol=0.0)
+    assert results[0] == results[2] == results[5]
+
+    serial = sweep.run(BeamSizeDriver(), result_name="serial")
+    assert serial == results
+    assert sweep.result_names() == ["result", "serial"]
+
+
+def test_sweep_run_processes():
+    sweep = ParameterSweep(BASE_CONFIGURATION, {"beamline[focus lens].focal_x": [10.0, 12.5, 10.0]})
+    results = sweep.run(BeamSizeDriver(), n_workers=2, use_processes=True)
+
+    assert np.allclose(results, sweep.run(BeamSizeDriver(), result_name="threads"), rtol=1e-12, atol=0.0)
+
+
+def test_sweep_run_fourier_optics():
+    schema = ConfigurationSchema(types={"SweepLens": "tests.parameter_sweep"})
+    sweep = ParameterSweep.cartesian(FOURIER_OPTICS_CONFIGURATION,
+                                     {"beamline[focus lens].focal_x": [0.4, 0.5, 0.6],
+                                      "beamline[Image screen].position.z": [0.9, 1.0]}, schema=schema)
+    assert isinstance(sweep.simulation(0).beamline.component_by_name("focus lens"), SweepLens)
+
+    driver = FourierOpticsDriver()
+    serial = sweep.run(driver, evaluate=gaussian_beam_width, result_name="serial")
+    threads = sweep.run(driver, evaluate=gaussian_beam_width, result_name="threads", n_workers=3)
+    # The process workers load the rows with the schema of the sweep, i.e. know SweepLens.
+    processes = sweep.run(driver, evaluate=gaussian_beam_width, result_name="processes", n_workers=2,
+                          use_processes=True)
+
+    assert threads == serial
+    assert np.allclose(processes, serial, rtol=1e-12, atol=0.0)
+    # Every row propagates its own beamline.
+    assert len(set(serial)) == len(sweep)
+
+
+if __name__ == "__main__":
+    test_set_parameter()
+    test_sweep_modes()
+    test_sweep_run()
+    test_sweep_run_processes()
+    test_sweep_run_fourier_optics()
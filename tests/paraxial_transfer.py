@@ -0,0 +1,101 @@
+"""
+Tests the paraxial transfer matrices of a beamline and the Gaussian beam estimates.
+"""
+import time
+
+import numpy as np
+
+from optics.beam.electron_beam import ElectronBeam
+from optics.beamline.beamline import Beamline
+from optics.beamline.beamline_position import BeamlinePosition
+from optics.beamline.optical_elements.image_plane import ImagePlane
+from optics.beamline.optical_elements.lens.lens_ideal import LensIdeal
+
+from code_drivers.analytic.paraxial_transfer import ParaxialTransfer, drift_matrix, thin_lens_matrix, \
+    propagate_moments, gaussian_beam_q, gaussian_beam_moments, undulator_photon_waist
+
+
+def create_beamline(focal_length=12.5):
+    # 1:1 imaging of the source.
+    beamline = Beamline()
+    beamline.attach_component_at(LensIdeal("focus lens", focal_length, focal_length), BeamlinePosition(2 * focal_length))
+    beamline.attach_component_at(ImagePlane("screen"), BeamlinePosition(4 * focal_length))
+    return beamline
+
+
+def create_electron_beam():
+    return ElectronBeam(energy_in_GeV=6.0, energy_spread=0.89e-3, current=0.2, electrons_per_bunch=500,
+                        moment_xx=(77.9e-6)**2, moment_xxp=1e-11, moment_xpxp=(110.9e-6)**2,
+                        moment_yy=(12.9e-6)**2, moment_yyp=0.0, moment_ypyp=(0.5e-6)**2)
+
+
+def test_transfer_matrices():
+    transfer = ParaxialTransfer(create_beamline())
+    M_x, M_y = transfer.transfer_matrices()
+
+    expected = thin_lens_matrix(12.5).dot(drift_matrix(25.0))
+    assert np.allclose(M_x[0], expected)
+    assert np.allclose(M_x[1], drift_matrix(25.0).dot(expected))
+    assert np.allclose(M_x[1], [[-1.0, 0.0], [-0.08, -1.0]])
+    assert np.allclose(M_y, M_x)
+
+    # Imaging: the electron beam size at the screen is the source size.
+    electron_beam = create_electron_beam()
+    moments_x, moments_y = transfer.electron_beam_moments(electron_beam)
+    assert np.isclose(moments_x[1, 0], electron_beam._moment_xx)
+    assert np.isclose(moments_y[1, 0], electron_beam._moment_yy)
+
+    sigma = np.array([[electron_beam._moment_xx, electron_beam._moment_xxp],
+                      [electron_beam._moment_xxp, electron_beam._moment_xpxp]])
+    for index in range(2):
+        explicit = M_x[index].dot(sigma).dot(M_x[index].T)
+        assert np.allclose(moments_x[index], [explicit[0, 0], explicit[0, 1], explicit[1, 1]])
+
+
+def test_gaussian_beam():
+    wavelength = 1e-10
+    waist = undulator_photon_waist(wavelength, 2.0)
+    transfer = ParaxialTransfer(create_beamline())
+
+    # Moments of a Gaussian beam propagate like electron beam moments.
+    q = gaussian_beam_q(wavelength, waist)
+    M_x, _ = transfer.transfer_matrices()
+    q_x, q_y = transfer.gaussian_beam(wavelength, waist)
+    assert np.allclose(gaussian_beam_moments(q_x, wavelength),
+                       propagate_moments(M_x, gaussian_beam_moments(q, wavelength)), rtol=1e-8, atol=0.0)
+
+    # Far field divergence lambda/(4 pi sigma).
+    far = gaussian_beam_moments(q + 1000.0, wavelength)
+    assert np.isclose(np.sqrt(far[2]), wavelength / (4.0 * np.pi * waist))
+
+    size_x, size_y = transfer.beam_sizes(create_electron_beam(), wavelength, waist)
+    assert np.isclose(size_x[1], np.sqrt((77.9e-6)**2 + waist**2))
+
+
+def test_variants():
+    n_variants = 10**6
+    transfer = ParaxialTransfer(create_beamline())
+    focal_lengths = np.linspace(10.0, 15.0, n_variants)
+    focal = np.stack((focal_lengths, np.full(n_variants, np.inf)), axis=-1)
+    wavelengths = np.linspace(0.5e-10, 2e-10, n_variants)
+
+    start = time.time()
+    size_x, size_y = transfer.beam_sizes(create_electron_beam(), wavelengths, undulator_photon_waist(wavelengths, 2.0),
+                                         focal_x=focal, focal_y=focal)
+    print("Screened %d variants in %.2f s" % (n_variants, time.time() - start))
+
+    assert size_x.shape == (n_variants, 2)
+    for index in (0, n_variants // 3, n_variants - 1):
+        beamline = Beamline()
+        beamline.attach_component_at(LensIdeal("focus lens", focal_lengths[index], focal_lengths[index]),
+                                     BeamlinePosition(25.0))
+        beamline.attach_component_at(ImagePlane("screen"), BeamlinePosition(50.0))
+
+        expected_x, _ = ParaxialTransfer(beamline).beam_sizes(create_electron_beam(), wavelengths[index],
+                                                              undulator_photon_waist(wavelengths[index], 2.0))
+        assert np.allclose(size_x[index], expected_x, rtol=1e-10)
+
+if __name__ == "__main__":
+    test_transfer_matrices()
+    test_gaussian_beam()
+    test_variants()
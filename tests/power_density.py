@@ -0,0 +1,99 @@
+"""
+Tests total power and power density of bending magnet, undulator and wiggler sources.
+"""
+import time
+import tracemalloc
+
+import numpy as np
+
+from optics.beam.electron_beam_pencil import ElectronBeamPencil
+from optics.magnetic_structures.bending_magnet import BendingMagnet
+from optics.magnetic_structures.undulator import Undulator
+from optics.magnetic_structures.wiggler import Wiggler
+from optics.beamline.beamline_position import BeamlinePosition
+
+from code_drivers.analytic.power_density import PowerDensity
+
+
+def define_electron_beam():
+    return ElectronBeamPencil(energy_in_GeV=6.0, energy_spread=0.89e-3, current=0.2)
+
+
+def test_power_density_bending_magnet():
+    bending_magnet = BendingMagnet(radius=23.2655, magnetic_field=0.86, length=0.5)
+    power_density = PowerDensity(define_electron_beam(), bending_magnet)
+
+    # 14.08 E^4[GeV] I[A] / rho[m] W/mrad.
+    assert np.isclose(power_density.bending_magnet_power_per_angle() * 1e-3, 14.08 * 6.0**4 * 0.2 / 23.2655, rtol=1e-3)
+
+    theta_x = np.linspace(-1e-3, 1e-3, 5)
+    theta_y = np.linspace(-20.0, 20.0, 4001) / define_electron_beam().gamma()
+    density = power_density.angular_power_density(theta_x, theta_y)
+    assert np.allclose(density.sum(axis=1) * (theta_y[1] - theta_y[0]) * 1e3,
+                       power_density.bending_magnet_power_per_angle() * 1e-3, rtol=1e-3)
+
+
+def test_power_density_insertion_devices():
+    for insertion_device in (Undulator(K_vertical=1.5, K_horizontal=0.0, period_length=0.02, periods_number=100),
+                             Wiggler(K=15.0, period_length=0.15, periods_number=10)):
+        power_density = PowerDensity(define_electron_beam(), insertion_device)
+
+        # 0.633 E^2[GeV] B0^2[T] L[m] I[A] kW.
+        assert np.isclose(power_density.total_power() * 1e-3,
+                          0.633 * 6.0**2 * insertion_device.B_vertical()**2 * insertion_device.length() * 0.2,
+                          rtol=2e-3)
+
+        half_angle = (insertion_device.K_vertical() + 10.0) / define_electron_beam().gamma()
+        theta_x = np.linspace(-half_angle, half_angle, 401)
+        theta_y = np.linspace(-10.0, 10.0, 201) / define_electron_beam().gamma()
+        density = power_density.angular_power_density(theta_x, theta_y)
+        integrated = density.sum() * (theta_x[1] - theta_x[0]) * (theta_y[1] - theta_y[0]) * 1e6
+        assert abs(integrated / power_density.total_power() - 1.0) < 0.01
+
+
+def test_power_density_screen_chunks():
+    undulator = Undulator(K_vertical=1.5, K_horizontal=0.0, period_length=0.02, periods_number=100)
+    position = BeamlinePosition(30.0)
+    x = np.linspace(-5e-3, 5e-3, 201)
+    y = np.linspace(-2e-3, 2e-3, 101)
+
+    t0 = time.time()
+    reference = PowerDensity(define_electron_beam(), undulator).power_density(position, x, y)
+    t1 = time.time()
+    chunked = PowerDensity(define_electron_beam(), undulator, max_memory=1024**2, n_workers=4).power_density(position, x, y)
+    t2 = time.time()
+    print("One chunk: %.3f s, 1 MB chunks on 4 threads: %.3f s" % (t1 - t0, t2 - t1))
+
+    assert np.allclose(chunked, reference)
+    assert reference.shape == (201, 101)
+    assert np.unravel_index(np.argmax(reference), reference.shape) == (100, 50), "Peak on axis"
+
+
+def test_power_density_peak_memory():
+    position = BeamlinePosition(20.0)
+    x = np.linspace(-2e-2, 2e-2, 400)
+    y = np.linspace(-1e-2, 1e-2, 400)
+    max_memory = 4 * 1024**2
+
+    # Beyond the returned screen, the temporaries of all workers together stay below the budget.
+    for magnetic_structure in (BendingMagnet(radius=23.2655, magnetic_field=0.86, length=0.5),
+                               Undulator(K_vertical=1.5, K_horizontal=0.0, period_length=0.02, periods_number=100)):
+        for n_workers in (1, 4):
+            power_density = PowerDensity(define_electron_beam(), magnetic_structure, max_memory, n_workers)
+
+            tracemalloc.start()
+            try:
+                start = tracemalloc.get_traced_memory()[0]
+                density = power_density.power_density(position, x, y)
+                peak = tracemalloc.get_traced_memory()[1] - start
+            finally:
+                tracemalloc.stop()
+
+            assert peak < density.nbytes + max_memory
+
+
+if __name__ == "__main__":
+    test_power_density_bending_magnet()
+    test_power_density_insertion_devices()
+    test_power_density_screen_chunks()
+    test_power_density_peak_memory()
@@ -0,0 +1,161 @@
+"""
+Tests immutable snapshots of driver settings.
+"""
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+
+from optics.magnetic_structures.bending_magnet import BendingMagnet
+from optics.beamline.beamline import Beamline
+from optics.beamline.beamline_position import BeamlinePosition
+from optics.beamline.optical_elements.lens.lens_ideal import LensIdeal
+from optics.beamline.optical_elements.image_plane import ImagePlane
+from optics.driver.settings_snapshot import SettingsSnapshot
+
+from code_drivers.SRW.SRW_driver import SRWDriver
+from code_drivers.SRW.SRW_bending_magnet_setting import SRWBendingMagnetSetting
+from code_drivers.SRW.SRW_undulator_setting import SRWUndulatorSetting
+from code_drivers.SRW.SRW_beamline_component_setting import SRWBeamlineComponentSetting
+from code_drivers.fourier_optics.fourier_optics_driver import FourierOpticsDriver
+from code_drivers.fourier_optics.fourier_optics_beamline_component_setting import FourierOpticsBeamlineComponentSetting
+
+from tests.fourier_optics_propagation import gaussian_wavefront
+
+
+def raises(function):
+    try:
+        function()
+    except Exception:
+        return True
+    return False
+
+
+def test_settings_snapshot_equality():
+    settings = SRWBendingMagnetSetting()
+    snapshot = settings.snapshot()
+
+    assert snapshot == SRWBendingMagnetSetting().snapshot()
+    assert hash(snapshot) == hash(SRWBendingMagnetSetting().snapshot())
+    assert snapshot != SRWUndulatorSetting().snapshot()
+
+    # Modifying the settings leaves the snapshot alone.
+    settings.set_relPrec(0.001)
+    assert snapshot._relPrec == 0.01
+    assert settings.snapshot() != snapshot
+    settings.set_relPrec(0.01)
+    assert settings.snapshot() == snapshot
+
+    # Snapshots as cache keys.
+    cache = {snapshot: "default"}
+    assert cache[SRWBendingMagnetSetting().snapshot()] == "default"
+
+    # Attribute names are shared by snapshots of the same layout.
+    assert snapshot._layout is SRWBendingMagnetSetting().snapshot()._layout
+
+
+def test_settings_snapshot_reads_like_settings():
+    settings = SRWBendingMagnetSetting()
+    settings.set_acceptance_angle(0.2, 0.02)
+    snapshot = settings.snapshot()
+
+    assert snapshot.to_list() == settings.to_list()
+    assert snapshot.horizontal_acceptance_angle() == 0.2
+    assert snapshot.use_precomputed_trajectory()
+    assert snapshot.driver_class() is SRWDriver
+    assert snapshot.is_driver(SRWDriver)
+    assert snapshot.snapshot() is snapshot
+
+    assert SRWUndulatorSetting().snapshot().toList() == SRWUndulatorSetting().toList()
+
+    # Assignments raise, also through setters.
+    assert raises(lambda: setattr(snapshot, "_relPrec", 0.1))
+    assert raises(lambda: snapshot.set_relPrec(0.1))
+    assert snapshot._relPrec == 0.01
+
+
+def test_settings_snapshot_nested():
+    drift_space_settings = SRWBeamlineComponentSetting()
+    drift_space_settings.set_resize_factor_horizontal(2.0)
+    settings = SRWBeamlineComponentSetting()
+    settings.set_drift_space_settings(drift_space_settings)
+
+    snapshot = settings.snapshot()
+    assert snapshot.has_drift_space_settings()
+    assert snapshot._drift_space_settings == drift_space_settings.snapshot()
+    assert snapshot._drift_space_settings.to_list()[5] == 2.0
+
+    drift_space_settings.set_resize_factor_horizontal(3.0)
+    assert snapshot._drift_space_settings.to_list()[5] == 2.0
+    assert settings.snapshot() != snapshot
+
+    # Pickled (process pools) and thawed snapshots keep their values.
+    assert pickle.loads(pickle.dumps(snapshot)) == snapshot
+
+    thawed = snapshot.thaw()
+    assert isinstance(thawed, SRWBeamlineComponentSetting)
+    assert thawed.to_list() == settings.to_list()
+    assert thawed._drift_space_settings.to_list()[5] == 2.0
+    thawed.set_resize_factor_vertical(4.0)
+    assert thawed.snapshot() != snapshot
+
+
+def test_settings_snapshot_driver():
+    driver = SRWDriver()
+
+    bending_magnet = BendingMagnet(radius=23.2655, magnetic_field=0.86, length=0.5)
+    assert driver._settings_snapshot(bending_magnet, SRWBendingMagnetSetting) == SRWBendingMagnetSetting().snapshot()
+
+    settings = SRWBendingMagnetSetting()
+    settings.set_npTraj(1000)
+    bending_magnet.add_settings(settings)
+    snapshot = driver._settings_snapshot(bending_magnet, SRWBendingMagnetSetting)
+    assert snapshot.to_list()[4] == 1000
+
+    # Snapshots are shared between threads without copies.
+    lens = LensIdeal("lens", 1.0, 1.0)
+    lens.add_settings(SRWBeamlineComponentSetting())
+    snapshot = driver._settings_snapshot(lens, SRWBeamlineComponentSetting)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        lists = list(executor.map(lambda _: snapshot.to_list(), range(100)))
+    assert all(srw_list == lens.settings(driver).to_list() for srw_list in lists)
+
+
+class ModifyingFourierOpticsDriver(FourierOpticsDriver):
+    """
+    Modifies the settings of the beamline during the run after the first drift.
+    """
+    def __init__(self, settings):
+        FourierOpticsDriver.__init__(self)
+        self._settings = settings
+        self.drift_settings = []
+
+    def propagate_drift(self, wavefront, distance, settings):
+        self.drift_settings.append(settings)
+        self._settings.drift_space_settings().set_resize_factor_horizontal(2.0)
+        return FourierOpticsDriver.propagate_drift(self, wavefront, distance, settings)
+
+
+def test_settings_snapshot_fourier_optics_driver():
+    settings = FourierOpticsBeamlineComponentSetting()
+    settings.set_drift_space_settings(FourierOpticsBeamlineComponentSetting())
+
+    beamline = Beamline()
+    beamline.attach_component_at(LensIdeal("lens", 1.0, 1.0), BeamlinePosition(0.1))
+    screen = ImagePlane("screen")
+    screen.add_settings(settings)
+    beamline.attach_component_at(screen, BeamlinePosition(0.2))
+
+    driver = ModifyingFourierOpticsDriver(settings)
+    driver.propagate(gaussian_wavefront(50e-6, 1000.0, 1e-3, 64), beamline)
+
+    # The second drift runs with the settings from the start of the run.
+    assert all(isinstance(drift_settings, SettingsSnapshot) for drift_settings in driver.drift_settings)
+    assert driver.drift_settings[1].resize_factors() == (1.0, 1.0)
+    assert settings.drift_space_settings().resize_factors() == (2.0, 1.0)
+
+
+if __name__ == "__main__":
+    test_settings_snapshot_equality()
+    test_settings_snapshot_reads_like_settings()
+    test_settings_snapshot_nested()
+    test_settings_snapshot_driver()
+    test_settings_snapshot_fourier_optics_driver()
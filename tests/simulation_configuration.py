@@ -0,0 +1,124 @@
+"""
+Tests loading and saving declarative simulation configurations.
+"""
+import json
+import time
+
+from optics.beam.electron_beam import ElectronBeam
+from optics.beamline.optical_elements.lens.lens_ideal import LensIdeal
+from optics.beamline.optical_elements.image_plane import ImagePlane
+from optics.magnetic_structures.bending_magnet import BendingMagnet
+from optics.magnetic_structures.wiggler import Wiggler
+
+from optics.configuration.simulation_configuration import ConfigurationSchema, ConfigurationError, Simulation, \
+    loads, dumps
+
+from code_drivers.fourier_optics.fourier_optics_driver import FourierOpticsDriver
+from code_drivers.fourier_optics.fourier_optics_beamline_component_setting import FourierOpticsBeamlineComponentSetting
+
+# The x-ray example of bending_magnet_srw with Fourier optics settings instead of SRW settings.
+CONFIGURATION = """
+{"electron_beam": {"type": "ElectronBeam",
+                   "parameters": {"energy_in_GeV": 6.0, "energy_spread": 0.89e-3, "current": 0.2,
+                                  "electrons_per_bunch": 500,
+                                  "moment_xx": 6.0684e-9, "moment_xxp": 0.0, "moment_xpxp": 1.229881e-8,
+                                  "moment_yy": 1.6641e-10, "moment_yyp": 0.0, "moment_ypyp": 2.5e-13}},
+ "magnetic_structure": {"type": "BendingMagnet",
+                        "parameters": {"radius": 23.2655, "magnetic_field": 0.86, "length": 0.5}},
+ "beamline": [{"type": "ImagePlane", "name": "Image screen", "position": {"z": 50.0},
+               "settings": [{"type": "FourierOpticsBeamlineComponentSetting",
+                             "parameters": {"resize_factor_horizontal": 4.0, "resize_factor_vertical": 1.5,
+                                            "drift_space_settings": {"type": "FourierOpticsBeamlineComponentSetting",
+                                                                     "parameters": {"auto_resize": false}}}}]},
+              {"type": "LensIdeal", "name": "focus lens", "parameters": {"focal_x": 12.5, "focal_y": 12.5},
+               "position": {"z": 25.0, "x": 1e-3}}],
+ "calculation": {"energy_min": 15000.0, "energy_max": 15000.0}}
+"""
+
+
+def test_load_configuration():
+    simulation = loads(CONFIGURATION)
+
+    assert isinstance(simulation.electron_beam, ElectronBeam)
+    assert simulation.electron_beam.gamma() > 1e4
+    assert isinstance(simulation.magnetic_structure, BendingMagnet)
+    assert simulation.magnetic_structure.radius() == 23.2655
+
+    lens, plane = list(simulation.beamline)
+    assert isinstance(lens, LensIdeal) and isinstance(plane, ImagePlane)
+    assert lens.focalX() == 12.5
+    assert simulation.beamline.position_of(lens).x() == 1e-3
+
+    settings = plane.settings(FourierOpticsDriver())
+    assert settings.resize_factors() == (4.0, 1.5)
+    assert not settings.drift_space_settings().auto_resize()
+    assert simulation.calculation["energy_min"] == 15000.0
+
+
+def test_save_configuration():
+    simulation = loads(CONFIGURATION)
+    text = dumps(simulation)
+
+    # Defaults are not written.
+    assert "max_points" not in text
+
+    reloaded = loads(text)
+    assert reloaded.beamline.diff(simulation.beamline) is None
+    assert json.loads(dumps(reloaded)) == json.loads(text)
+
+    wiggler = Wiggler(K=10.0, period_length=0.1, periods_number=20)
+    reloaded = loads(dumps(Simulation(None, wiggler, None, None)))
+    assert reloaded.magnetic_structure.K_vertical() == 10.0
+
+    toml = ("[magnetic_structure]\n"
+            "type = \"Wiggler\"\n"
+            "parameters = {K = 10.0, period_length = 0.1, periods_number = 20}\n")
+    assert loads(toml, format="toml").magnetic_structure.periodNumber() == 20
+
+
+def test_configuration_errors():
+    for configuration in ({"beam": {}},
+                          {"magnetic_structure": {"type": "BendingMagnet", "parameters": {"radius": 1.0}}},
+                          {"magnetic_structure": {"type": "Magnet"}},
+                          {"beamline": [{"type": "ImagePlane", "name": "screen"}]},
+                          {"beamline": [{"type": "ImagePlane", "name": "screen", "position": {"z": 1.0},
+                                         "settings": [{"type": "FourierOpticsBeamlineComponentSetting",
+                                                       "parameters": {"propagation_mode": "unknown"}}]}]},
+                          {"beamline": [{"type": "ImagePlane", "name": "screen", "position": {"z": 1.0},
+                                         "settings": [{"type": "FourierOpticsBeamlineComponentSetting",
+                                                       "parameters": {"focal": 1.0}}]}]}):
+        try:
+            ConfigurationSchema().load(configuration)
+        except Exception:
+            pass
+        else:
+            raise AssertionError("Invalid configuration loaded: %s" % configuration)
+
+    try:
+        dumps(Simulation(None, None, None, None), format="xml")
+    except ConfigurationError:
+        pass
+    else:
+        raise AssertionError("Unknown format accepted.")
+
+
+def test_load_many_configurations():
+    configurations = []
+    for index in range(1000):
+        configuration = json.loads(CONFIGURATION)
+        configuration["beamline"][1]["parameters"]["focal_x"] = 10.0 + 0.01 * index
+        configurations.append(json.dumps(configuration))
+
+    schema = ConfigurationSchema()
+    start = time.time()
+    simulations = [loads(text, schema=schema) for text in configurations]
+    print("Loaded %d configurations in %.3f s" % (len(simulations), time.time() - start))
+
+    assert simulations[-1].beamline.component_by_name("focus lens").focalX() == 10.0 + 0.01 * 999
+
+
+if __name__ == "__main__":
+    test_load_configuration()
+    test_save_configuration()
+    test_configuration_errors()
+    test_load_many_configurations()
@@ -0,0 +1,74 @@
+"""
+Tests the cached translation of glossary objects to SRW objects.
+"""
+from optics.beam.electron_beam_pencil import ElectronBeamPencil
+from optics.magnetic_structures.undulator import Undulator
+from optics.magnetic_structures.bending_magnet import BendingMagnet
+
+from code_drivers.SRW.SRW_adapter import SRWAdapter
+from code_drivers.SRW.SRW_driver import SRWDriver
+
+
+def test_srw_adapter_cache():
+    srw_adapter = SRWAdapter()
+    electron_beam = ElectronBeamPencil(energy_in_GeV=6.0, energy_spread=0.89e-3, current=0.2)
+    undulator = Undulator(K_vertical=1.5, K_horizontal=0.0, period_length=0.02, periods_number=100)
+    bending_magnet = BendingMagnet(radius=23.2655, magnetic_field=0.86, length=0.5)
+
+    # Equal parameters give the same translation, also for a different but equal glossary object.
+    srw_electron_beam = srw_adapter.SRW_electron_beam(electron_beam)
+    assert srw_adapter.SRW_electron_beam(electron_beam) is srw_electron_beam
+    assert srw_adapter.SRW_electron_beam(ElectronBeamPencil(6.0, 0.89e-3, 0.2)) is srw_electron_beam
+
+    srw_undulator = srw_adapter.magnetic_field_from_undulator(undulator)
+    assert srw_adapter.magnetic_field_from_undulator(undulator) is srw_undulator
+    srw_bending_magnet = srw_adapter.magnetic_field_from_bending_magnet(bending_magnet)
+    assert srw_adapter.magnetic_field_from_bending_magnet(bending_magnet) is srw_bending_magnet
+
+    # Changed parameters translate again.
+    electron_beam._current = 0.1
+    assert srw_adapter.SRW_electron_beam(electron_beam) is not srw_electron_beam
+    assert srw_adapter.SRW_electron_beam(electron_beam).Iavg == 0.1
+
+    undulator._K_vertical = 2.0
+    assert srw_adapter.magnetic_field_from_undulator(undulator) is not srw_undulator
+    assert srw_adapter.magnetic_field_from_undulator(undulator).arMagFld[0].arHarm[0].B == undulator.B_vertical()
+
+    srw_adapter.clear_cache()
+    assert srw_adapter.magnetic_field_from_bending_magnet(bending_magnet) is not srw_bending_magnet
+
+
+def test_srw_adapter_wavefront_electron_beam():
+    srw_adapter = SRWAdapter()
+    electron_beam = ElectronBeamPencil(energy_in_GeV=6.0, energy_spread=0.89e-3, current=0.2)
+    srw_electron_beam = srw_adapter.SRW_electron_beam(electron_beam)
+
+    # SRW writes to the electron beam of a wavefront: the cached translation is not attached.
+    wavefront = srw_adapter.create_quadratic_SRW_wavefront_single_energy(10, 1e-3, 20.0, srw_electron_beam, 1000.0)
+    assert wavefront.partBeam is not srw_electron_beam
+    assert wavefront.partBeam.Iavg == srw_electron_beam.Iavg
+
+    wavefront.partBeam.Iavg = 0.1
+    wavefront.partBeam.partStatMom1.x = 1e-3
+    assert srw_adapter.SRW_electron_beam(electron_beam).Iavg == 0.2
+    assert srw_adapter.SRW_electron_beam(electron_beam).partStatMom1.x == 0.0
+
+
+def test_srw_adapter_cache_size():
+    srw_adapter = SRWAdapter(cache_size=2)
+    electron_beams = [ElectronBeamPencil(energy_in_GeV=energy, energy_spread=0.0, current=0.2)
+                      for energy in (2.0, 4.0, 6.0)]
+    translations = [srw_adapter.SRW_electron_beam(electron_beam) for electron_beam in electron_beams]
+
+    assert srw_adapter.SRW_electron_beam(electron_beams[2]) is translations[2]
+    assert srw_adapter.SRW_electron_beam(electron_beams[0]) is not translations[0]
+
+    # The driver keeps its adapter between calculations.
+    driver = SRWDriver()
+    assert driver.srw_adapter() is driver.srw_adapter()
+
+
+if __name__ == "__main__":
+    test_srw_adapter_cache()
+    test_srw_adapter_wavefront_electron_beam()
+    test_srw_adapter_cache_size()
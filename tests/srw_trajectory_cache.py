@@ -0,0 +1,76 @@
+"""
+Tests the reuse of precomputed electron trajectories in SRW field calculations.
+"""
+import numpy as np
+from srwlib import *
+
+from optics.beam.electron_beam_pencil import ElectronBeamPencil
+from optics.magnetic_structures.undulator_vertical import UndulatorVertical
+
+from code_drivers.SRW.SRW_adapter import SRWAdapter
+from code_drivers.SRW.SRW_driver import SRWDriver
+
+from tests.bending_magnet_srw import define_bending_magnet_srw
+
+
+def srw_intensity(srw_adapter, electron_beam, magnetic_fields, trajectory, energy):
+    wavefront = srw_adapter.create_quadratic_SRW_wavefront_single_energy(grid_size=21,
+                                                                         grid_length=1e-3,
+                                                                         z_start=20.0,
+                                                                         srw_electron_beam=srw_adapter.SRW_electron_beam(electron_beam),
+                                                                         energy=energy)
+    srwl.CalcElecFieldSR(wavefront, trajectory, magnetic_fields, [1, 0.01, 0, 0, 20000, 1, 0])
+
+    intensity = array('f', [0] * 21 * 21)
+    srwl.CalcIntFromElecField(intensity, wavefront, 6, 0, 3, energy, 0, 0)
+
+    return np.array(intensity)
+
+
+def test_srw_trajectory_undulator():
+    srw_adapter = SRWAdapter()
+    electron_beam = ElectronBeamPencil(energy_in_GeV=6.0, energy_spread=0.89e-3, current=0.2)
+    undulator = UndulatorVertical(K=1.5, period_length=0.02, periods_number=100)
+    magnetic_fields = srw_adapter.magnetic_field_from_undulator(undulator)
+
+    half_range = 0.5 * undulator.length() + 10 * undulator.periodLength()
+    trajectory = srw_adapter.SRW_trajectory(electron_beam, magnetic_fields, -half_range, half_range, 20000)
+    assert srw_adapter.SRW_trajectory(electron_beam, magnetic_fields, -half_range, half_range, 20000) is trajectory
+    assert srw_adapter.SRW_trajectory(electron_beam, magnetic_fields, -half_range, half_range, 10000) is not trajectory
+
+    # x' = K/gamma sin(k z) in the undulator.
+    x_prime = np.array(trajectory.arXp)
+    assert np.isclose(np.abs(x_prime).max(), undulator.K_vertical() / electron_beam.gamma(), rtol=0.01)
+
+    # The trajectory serves every energy of a scan.
+    for energy in (7900.0, 8040.0):
+        expected = srw_intensity(srw_adapter, electron_beam, magnetic_fields, 0, energy)
+        intensity = srw_intensity(srw_adapter, electron_beam, magnetic_fields, trajectory, energy)
+        assert np.abs(intensity - expected).max() < 0.01 * expected.max()
+
+
+def test_srw_trajectory_driver():
+    electron_beam, bending_magnet, beamline, energy = define_bending_magnet_srw(0)
+
+    driver = SRWDriver()
+    driver.calculate_source_wavefront(electron_beam, bending_magnet, beamline, energy, energy)
+    number_of_translations = len(driver.srw_adapter()._cache)
+    assert any(key[0] == "trajectory" for key in driver.srw_adapter()._cache)
+
+    # A second energy reuses the electron beam, field and trajectory translations.
+    wavefront = driver.calculate_source_wavefront(electron_beam, bending_magnet, beamline, 1.01 * energy, 1.01 * energy)
+    assert len(driver.srw_adapter()._cache) == number_of_translations
+
+    bending_magnet.settings(driver).set_use_precomputed_trajectory(False)
+    expected = SRWDriver().calculate_source_wavefront(electron_beam, bending_magnet, beamline,
+                                                      1.01 * energy, 1.01 * energy)
+
+    intensity = np.array(wavefront.arEx, dtype=float)**2
+    expected_intensity = np.array(expected.arEx, dtype=float)**2
+    assert intensity.shape == expected_intensity.shape
+    assert np.abs(intensity.sum() - expected_intensity.sum()) < 0.05 * expected_intensity.sum()
+
+
+if __name__ == "__main__":
+    test_srw_trajectory_undulator()
+    test_srw_trajectory_driver()
@@ -0,0 +1,49 @@
+"""
+Tests reuse and in place reset of pooled SRW wavefronts.
+"""
+from code_drivers.SRW.SRW_wavefront_pool import SRWWavefrontPool
+
+
+def test_wavefront_pool_reuses_wavefronts():
+    pool = SRWWavefrontPool()
+
+    wavefront = pool.acquire(1, 100, 50)
+    assert pool.idle_count() == 0
+
+    pool.release(wavefront)
+    assert pool.idle_count(1, 100, 50) == 1
+
+    assert pool.acquire(1, 100, 50) is wavefront, "Same dimensions must reuse the idle wavefront"
+    assert pool.acquire(1, 100, 50) is not wavefront, "Wavefronts in use must not be handed out twice"
+    assert pool.acquire(1, 50, 100) is not wavefront, "Different dimensions must not reuse the wavefront"
+
+
+def test_wavefront_pool_resets_wavefronts():
+    pool = SRWWavefrontPool()
+
+    wavefront = pool.acquire(1, 20, 20)
+    wavefront.arEx[7] = 1.0
+    wavefront.arEy[11] = 2.0
+    wavefront.Rx = 25.0
+    pool.release(wavefront)
+
+    wavefront = pool.acquire(1, 20, 20)
+    assert max(wavefront.arEx) == 0.0
+    assert max(wavefront.arEy) == 0.0
+    assert wavefront.Rx == 0
+
+
+def test_wavefront_pool_bounds_idle_wavefronts():
+    pool = SRWWavefrontPool(max_wavefronts_per_key=2)
+
+    wavefronts = [pool.acquire(1, 10, 10) for i in range(5)]
+    for wavefront in wavefronts:
+        pool.release(wavefront)
+
+    assert pool.idle_count() == 2
+
+
+if __name__ == "__main__":
+    test_wavefront_pool_reuses_wavefronts()
+    test_wavefront_pool_resets_wavefronts()
+    test_wavefront_pool_bounds_idle_wavefronts()
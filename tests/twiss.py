@@ -0,0 +1,63 @@
+"""
+Tests emittance, Twiss parameters and drifts of electron beam moments.
+"""
+import numpy as np
+
+from optics.beam.electron_beam import ElectronBeam
+from optics.beam.twiss import beam_moments, emittance, twiss_parameters, moments_from_twiss, drift_moments, \
+    beam_size, waist, source_length_moments
+
+
+def create_electron_beam():
+    # Beam 2 m downstream of a waist of 10 um size and 20 urad divergence.
+    size, divergence, distance = 10e-6, 20e-6, 2.0
+    return ElectronBeam(energy_in_GeV=6.0, energy_spread=1e-3, current=0.2, electrons_per_bunch=500,
+                        moment_xx=size**2 + (distance * divergence)**2, moment_xxp=distance * divergence**2,
+                        moment_xpxp=divergence**2,
+                        moment_yy=(5e-6)**2, moment_yyp=0.0, moment_ypyp=(2e-6)**2)
+
+
+def test_emittance():
+    electron_beam = create_electron_beam()
+    moments_x, moments_y = beam_moments(electron_beam)
+
+    # The correlation does not change the emittance; sqrt(<x x> <x' x'>) would.
+    assert np.isclose(emittance(moments_x), 10e-6 * 20e-6, atol=0.0)
+    assert np.isclose(electron_beam.horizontal_emittance(), 10e-6 * 20e-6, atol=0.0)
+    assert not np.isclose(np.sqrt(moments_x[0] * moments_x[2]), 10e-6 * 20e-6, atol=0.0)
+    assert np.isclose(electron_beam.vertical_emittance(), 5e-6 * 2e-6, atol=0.0)
+
+    epsilon, beta, alpha, gamma = twiss_parameters(moments_x)
+    assert np.isclose(beta * gamma - alpha**2, 1.0)
+    assert alpha < 0.0
+    assert np.allclose(moments_from_twiss(epsilon, beta, alpha), moments_x, atol=0.0)
+
+    distance, size = waist(moments_x)
+    assert np.isclose(distance, -2.0)
+    assert np.isclose(size, 10e-6, atol=0.0)
+    assert emittance(np.zeros(3)) == 0.0
+
+
+def test_drift_moments():
+    moments_x, _ = beam_moments(create_electron_beam())
+    distances = np.linspace(-5.0, 5.0, 101)
+
+    drifted = drift_moments(moments_x, distances)
+    assert drifted.shape == (101, 3)
+    assert np.allclose(emittance(drifted), emittance(moments_x), atol=0.0)
+    assert np.allclose(beam_size(moments_x, distances),
+                       np.sqrt(10e-6**2 + ((distances + 2.0) * 20e-6)**2), atol=0.0)
+
+    # Variants of beams times positions.
+    variants = moments_x * np.linspace(0.5, 2.0, 7)[:, np.newaxis]
+    assert drift_moments(variants[:, np.newaxis, :], distances).shape == (7, 101, 3)
+
+    # Average over the source length equals the mean of the sizes squared along it.
+    length = 4.0
+    along = drift_moments(moments_x, np.linspace(-0.5 * length, 0.5 * length, 20001))[:, 0].mean()
+    assert np.isclose(source_length_moments(moments_x, length)[0], along, rtol=1e-4, atol=0.0)
+
+
+if __name__ == "__main__":
+    test_emittance()
+    test_drift_moments()
@@ -0,0 +1,37 @@
+"""
+Tests that the undulator resonance methods broadcast like the scalar calls.
+"""
+import numpy as np
+
+from optics.magnetic_structures.undulator import Undulator
+
+
+def test_undulator_resonance_broadcasting():
+    undulator = Undulator(K_vertical=1.5, K_horizontal=0.3, period_length=0.02, periods_number=100)
+    gamma = 6000.0 / 0.51099895
+
+    theta_x = np.linspace(-50e-6, 50e-6, 5)
+    theta_y = np.linspace(-20e-6, 20e-6, 3)
+    harmonics = np.array([1, 3, 5])
+
+    energies = undulator.resonanceEnergyGrid(gamma, theta_x, theta_y, harmonics)
+    assert energies.shape == (3, 5, 3)
+    for i_h, harmonic in enumerate(harmonics):
+        for i_x, angle_x in enumerate(theta_x):
+            for i_y, angle_y in enumerate(theta_y):
+                assert np.isclose(energies[i_h, i_x, i_y],
+                                  undulator.resonanceEnergy(gamma, angle_x, angle_y, harmonic))
+
+    K_values = np.linspace(0.5, 2.5, 4)
+    energies = undulator.tuningEnergyGrid(gamma, K_values, harmonics)
+    divergences = undulator.centralConeDivergenceGrid(gamma, K_values, harmonics)
+    for i_K, K in enumerate(K_values):
+        tuned = Undulator(K_vertical=K, K_horizontal=0.3, period_length=0.02, periods_number=100)
+        assert np.allclose(energies[:, i_K], [tuned.resonanceEnergy(gamma, 0.0, 0.0, n) for n in harmonics])
+        assert np.allclose(divergences[:, i_K], [tuned.gaussianCentralConeDivergence(gamma, n) for n in harmonics])
+
+    assert np.ndim(undulator.resonanceEnergy(gamma, 0.0, 0.0)) == 0, "Scalar arguments give a scalar"
+
+
+if __name__ == "__main__":
+    test_undulator_resonance_broadcasting()
@@ -0,0 +1,78 @@
+"""
+Tests the analytic undulator tuning curves and their disk cache.
+"""
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from optics.beam.electron_beam import ElectronBeam
+from optics.beam.electron_beam_pencil import ElectronBeamPencil
+from optics.magnetic_structures.undulator import Undulator
+
+from code_drivers.analytic import undulator_tuning_curves
+from code_drivers.analytic.undulator_tuning_curves import UndulatorTuningCurves
+
+
+def test_flux_function_Q():
+    # X-ray Data Booklet, figure 2-5: Q_1(K=1) = 0.55, even harmonics vanish on axis.
+    assert abs(undulator_tuning_curves.flux_function_Q(1.0, 1) - 0.552) < 0.001
+    assert undulator_tuning_curves.flux_function_Q(1.0, 2) == 0.0
+    assert np.allclose(undulator_tuning_curves.flux_function_Q(np.array([1.0, 2.0]), np.array([[1], [3]])),
+                       [[undulator_tuning_curves.flux_function_Q(K, n) for K in (1.0, 2.0)] for n in (1, 3)])
+
+
+def test_undulator_tuning_curves_brilliance():
+    undulator = Undulator(K_vertical=1.0, K_horizontal=0.0, period_length=0.02, periods_number=100)
+    K_values = np.linspace(0.5, 2.0, 16)
+
+    # Zero emittance and energy spread: sigma_r sigma_r' = lambda / (4 pi), i.e. B = 4 F / lambda^2.
+    pencil = ElectronBeamPencil(energy_in_GeV=6.0, energy_spread=0.0, current=0.2)
+    table = UndulatorTuningCurves(pencil, undulator).table(K_values, harmonics=(1, 3))
+    wavelength = 1.23984193e-6 / table.energy
+    assert np.allclose(table.brilliance, 4.0 * table.flux / wavelength**2 * 1e-12, rtol=1e-6)
+
+    electron_beam = ElectronBeam(energy_in_GeV=6.0, energy_spread=1e-3, current=0.2, electrons_per_bunch=500,
+                                 moment_xx=(77.9e-6)**2, moment_xxp=0.0, moment_xpxp=(110.9e-6)**2,
+                                 moment_yy=(12.9e-6)**2, moment_yyp=0.0, moment_ypyp=(0.5e-6)**2)
+    table_emittance = UndulatorTuningCurves(electron_beam, undulator).table(K_values, harmonics=(1, 3))
+    assert np.allclose(table_emittance.flux, table.flux)
+    assert np.all(table_emittance.brilliance < table.brilliance)
+
+    brilliance, harmonic, K = undulator_tuning_curves.lookup(table, table.energy[0, 5:7])
+    assert np.allclose(K, K_values[5:7])
+    assert np.all(harmonic == 1)
+
+
+def test_undulator_tuning_curves_cache():
+    cache_directory = tempfile.mkdtemp()
+    try:
+        undulator = Undulator(K_vertical=1.0, K_horizontal=0.0, period_length=0.02, periods_number=100)
+        electron_beam = ElectronBeamPencil(energy_in_GeV=6.0, energy_spread=1e-3, current=0.2)
+        K_values = np.linspace(0.5, 2.0, 16)
+
+        tuning_curves = UndulatorTuningCurves(electron_beam, undulator, cache_directory)
+        table = tuning_curves.table(K_values)
+        assert os.path.exists(tuning_curves.cache_filename(K_values, (1, 3, 5)))
+
+        cached = UndulatorTuningCurves(electron_beam, undulator, cache_directory).table(K_values)
+        for field in table._fields:
+            assert np.array_equal(getattr(cached, field), getattr(table, field))
+
+        other_beam = ElectronBeamPencil(energy_in_GeV=6.0, energy_spread=1e-3, current=0.1)
+        assert UndulatorTuningCurves(other_beam, undulator, cache_directory).cache_filename(K_values, (1, 3, 5)) != \
+               tuning_curves.cache_filename(K_values, (1, 3, 5)), "The fingerprint must depend on the beam"
+
+        # K is the variable of the table.
+        other_K = Undulator(K_vertical=1.7, K_horizontal=0.0, period_length=0.02, periods_number=100)
+        assert UndulatorTuningCurves(electron_beam, other_K, cache_directory).cache_filename(K_values, (1, 3, 5)) == \
+               tuning_curves.cache_filename(K_values, (1, 3, 5)), "Undulators differing in K share the table"
+    finally:
+        shutil.rmtree(cache_directory)
+
+
+if __name__ == "__main__":
+    test_flux_function_Q()
+    test_undulator_tuning_curves_brilliance()
+    test_undulator_tuning_curves_cache()
@@ -0,0 +1,78 @@
+"""
+Tests the wiggler spectrum as sum over bending magnet like poles.
+"""
+import numpy as np
+
+from optics.beam.electron_beam_pencil import ElectronBeamPencil
+from optics.magnetic_structures.wiggler import Wiggler
+from optics.beamline.beamline_position import BeamlinePosition
+
+from code_drivers.analytic.bending_magnet_spectrum import BendingMagnetSpectrum
+from code_drivers.analytic.wiggler_spectrum import WigglerSpectrum
+
+
+def define_wiggler_spectrum(n_workers=1):
+    electron_beam = ElectronBeamPencil(energy_in_GeV=6.0, energy_spread=0.89e-3, current=0.2)
+    wiggler = Wiggler(K=15.0, period_length=0.15, periods_number=10)
+
+    return WigglerSpectrum(electron_beam, wiggler, n_workers=n_workers)
+
+
+def test_wiggler_photon_flux():
+    wiggler_spectrum = define_wiggler_spectrum()
+    energies = np.array([1e3, 1e4, 5e4])
+
+    # On axis all poles emit like a bending magnet of the peak field.
+    peak_spectrum = BendingMagnetSpectrum(wiggler_spectrum._electron_beam, wiggler_spectrum.peak_bending_magnet())
+    flux = wiggler_spectrum.photon_flux(energies, [0.0])
+    assert np.allclose(flux[:, 0], 20 * peak_spectrum.photon_flux(energies))
+
+    # E_c[keV] = 0.665 E^2[GeV] B[T].
+    assert np.isclose(wiggler_spectrum.critical_energy(), 665.0 * 6.0**2 * wiggler_spectrum._wiggler.B_vertical(),
+                      rtol=1e-3)
+
+    # The critical energy falls towards the edges of the fan, where the hard part of the spectrum vanishes.
+    theta_x = np.array([0.0, 0.9, 1.1]) * wiggler_spectrum.maximal_angle()
+    flux = wiggler_spectrum.photon_flux(energies, theta_x)
+    assert flux[2, 1] < 0.2 * flux[2, 0]
+    assert np.all(flux[:, 2] == 0.0)
+
+    assert wiggler_spectrum.total_flux(energies).shape == energies.shape
+
+
+def test_wiggler_flux_density():
+    wiggler_spectrum = define_wiggler_spectrum()
+    energies = np.array([1e4, 3e4])
+    distance = 1000.0
+
+    theta_x = np.array([-0.5, 0.0, 0.3]) * wiggler_spectrum.maximal_angle()
+    psi = np.linspace(-10.0, 10.0, 801) / wiggler_spectrum.gamma()
+    density = wiggler_spectrum.flux_density(BeamlinePosition(distance), energies, theta_x * distance, psi * distance)
+
+    # Far away the density integrated over the screen height gives the flux per horizontal angle.
+    flux = density.sum(axis=2) * (psi[1] - psi[0]) * distance * 1e3 * distance
+    assert np.allclose(flux, wiggler_spectrum.photon_flux(energies, theta_x), rtol=0.01)
+
+    # The pole table is calculated once.
+    assert len(wiggler_spectrum._cache) == 1
+    wiggler_spectrum.flux_density(BeamlinePosition(distance), energies, theta_x * distance, psi * distance)
+    assert len(wiggler_spectrum._cache) == 1
+
+
+def test_wiggler_flux_density_parallel():
+    position = BeamlinePosition(20.0, y=1e-4)
+    energies = [1e4]
+    x = np.linspace(-5e-3, 5e-3, 21)
+    y = np.linspace(-1e-3, 1e-3, 11)
+
+    density = define_wiggler_spectrum().flux_density(position, energies, x, y)
+    density_parallel = define_wiggler_spectrum(n_workers=4).flux_density(position, energies, x, y)
+
+    assert density.shape == (1, 21, 11)
+    assert np.allclose(density, density_parallel)
+
+
+if __name__ == "__main__":
+    test_wiggler_photon_flux()
+    test_wiggler_flux_density()
+    test_wiggler_flux_density_parallel()